@@ -3,6 +3,8 @@ import math
 import fsai.geometry as geometry
 import numpy as np
 
+from fsai.mapping.segment_index import SegmentIndex
+
 from fsai.visualisation.draw_opencv import render_area
 
 
@@ -31,7 +33,7 @@ class AI:
         self.kill()
 
     def kill(self):
-        if has_intersected(self.car, self.simulation.all_boundaries):
+        if has_intersected(self.car, self.simulation.boundary_index):
             self.alive = False
 
     def get_model_input_data(self):
@@ -60,7 +62,7 @@ class AI:
         return image, car_data
 
 
-def has_intersected(car, all_boundary_lines):
+def has_intersected(car, boundary_index: SegmentIndex):
     body_points = [
         (car.pos[0] + car.cg_to_front, car.pos[1] - (car.width + car.wheel_width) / 2),
         (car.pos[0] + car.cg_to_front, car.pos[1] + (car.width + car.wheel_width) / 2),
@@ -78,7 +80,11 @@ def has_intersected(car, all_boundary_lines):
         [body_points[3][0], body_points[3][1], body_points[0][0], body_points[0][1]],
     ])
 
-    filtered_lines = geometry.filter_lines_by_distance(car.pos, 8, all_boundary_lines)
+    # only lines overlapping the bounding box of the car body can intersect it
+    filtered_lines = boundary_index.filter_lines_by_bbox(
+        min(p[0] for p in body_points), min(p[1] for p in body_points),
+        max(p[0] for p in body_points), max(p[1] for p in body_points)
+    )
 
     intersections = geometry.segment_intersections(car_boundary[0], filtered_lines) + \
                     geometry.segment_intersections(car_boundary[1], filtered_lines) + \
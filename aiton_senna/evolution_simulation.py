@@ -5,6 +5,7 @@ from tensorflow_core.python.keras.layers import Dense, Flatten, Conv2D, MaxPooli
 
 from aiton_senna.ai import AI
 from fsai.car.car import Car
+from fsai.mapping.segment_index import SegmentIndex
 from fsai.objects.track import Track
 
 
@@ -12,6 +13,7 @@ class EvolutionarySimulation:
     def __init__(self):
         self.track = None
         self.blue_boundary, self.yellow_boundary, self.o, self.all_boundaries = [], [], [], []
+        self.boundary_index = SegmentIndex([])
 
         self.base_car = None
         self.furthest_distance = 0
@@ -57,6 +59,7 @@ class EvolutionarySimulation:
         self.track = track
         self.blue_boundary, self.yellow_boundary, self.o = track.get_boundary()
         self.all_boundaries = self.blue_boundary + self.yellow_boundary + self.o
+        self.boundary_index = SegmentIndex(self.all_boundaries)
         self.base_car = track.cars[0]
 
     def gen_model(self, new=False):
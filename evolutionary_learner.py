@@ -12,8 +12,11 @@ from typing import List
 import numpy as np
 
 from fsai import geometry
+from fsai.mapping.segment_index import SegmentIndex
 from fsai.objects.track import Track
-from fsai.path_planning.waypoints import gen_waypoints, encode
+from fsai.path_planning.waypoints import encode
+from fsai.path_planning.waypoint_cache import gen_waypoints_cached
+from fsai.simulation.clock import SimulationClock
 
 
 class EvolutionarySimulation:
@@ -25,6 +28,7 @@ class EvolutionarySimulation:
 
         self.tracks = tracks
         self.initial_car, self.left_boundary, self.right_boundary, self.o, self.all_boundary, self.blue_cones, self.yellow_cones, self.orange_cones, self.big_cones = self.gen_track()
+        self.boundary_index = SegmentIndex(self.all_boundary)
 
         self.episode_length = 0
         self.episode_number = 0
@@ -130,6 +134,7 @@ class EvolutionarySimulation:
                 self.fastest_points = furthest.pos_marks
 
             self.initial_car, self.left_boundary, self.right_boundary, self.o, self.all_boundary, self.blue_cones, self.yellow_cones, self.orange_cones, self.big_cones = self.gen_track()
+            self.boundary_index = SegmentIndex(self.all_boundary)
             print("Episode {} Complete in {}s with distance: {}. Best distance: {}. Step Size: {}".format(self.episode_number, self.episode_length, furthest.physics.distance_travelled, self.best_weights_distance, self.step_size))
 
             if self.episode_number % 10 == 0:
@@ -158,7 +163,11 @@ class EvolutionarySimulation:
             [body_points[3][0], body_points[3][1], body_points[0][0], body_points[0][1]],
         ])
 
-        filtered_lines = geometry.filter_lines_by_distance(car.pos, 8, self.all_boundary)
+        # only lines overlapping the bounding box of the car body can intersect it
+        filtered_lines = self.boundary_index.filter_lines_by_bbox(
+            min(p[0] for p in body_points), min(p[1] for p in body_points),
+            max(p[0] for p in body_points), max(p[1] for p in body_points)
+        )
 
         intersections = geometry.segment_intersections(car_boundary[0], filtered_lines) + \
                         geometry.segment_intersections(car_boundary[1], filtered_lines) + \
@@ -202,7 +211,7 @@ def get_max_track_radias(track):
     left_boundary, right_boundary, o = track.get_boundary()
 
     initial_car = track.cars[0]
-    waypoints = gen_waypoints(
+    waypoints = gen_waypoints_cached(
         car_pos=initial_car.pos,
         car_angle=initial_car.heading,
         blue_boundary=left_boundary,
@@ -254,6 +263,9 @@ if __name__ == "__main__":
                                          # "examples/data/tracks/laguna_seca.json"
                                          ], CAR_COUNT, 30007, [100, 30, 3])
 
+    # fixed steps so the evolution doesn't depend on how quickly each frame renders. 'do_step' runs the networks and
+    # steps the cars' own physics together, so it is called once per step and the physics isn't substepped
+    clock = SimulationClock(time_step=1 / 30, substeps=1)
     last_time = time.time()
     start = time.time()
     frames = 0
@@ -263,8 +275,7 @@ if __name__ == "__main__":
                 simulation.running = False
 
         now = time.time()
-        dt = now - last_time
-        simulation.do_step(dt)
+        clock.advance(now - last_time, simulation.do_step)
         frames += 1
         render(
             screen,
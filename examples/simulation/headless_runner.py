@@ -0,0 +1,54 @@
+import math
+
+import numpy as np
+
+from fsai.path_planning.waypoints import gen_waypoints
+from fsai.simulation.runner import HeadlessRunner
+
+
+# Drive a fleet of cars around a track without a display, each car steering towards the centre line a little way
+# ahead of it with its own gain and throttle, running episodes until the time budget is spent
+CAR_COUNT = 100
+LOOKAHEAD = 3  # waypoints ahead of the nearest to steer towards
+
+runner = HeadlessRunner("examples/data/tracks/azure_circuit.json", CAR_COUNT, episode_time=30, verbose=True)
+
+start = runner.track.cars[0]
+blue_lines, yellow_lines, orange_lines = runner.track.get_boundary()
+waypoints = gen_waypoints(
+    start.pos, start.heading, blue_lines, yellow_lines, orange_lines, full_track=True, spacing=1, radar_length=30,
+    radar_count=17, radar_span=math.pi / 1.1, margin=0, smooth=True
+)
+centre_line = np.array([waypoint.get_optimum_point() for waypoint in waypoints], dtype=np.float64)
+
+rng = np.random.default_rng(0)
+gains, throttles = np.ones(CAR_COUNT), np.full(CAR_COUNT, 0.5)
+
+
+def new_controls(runner: HeadlessRunner):
+    # each episode tries new gains and throttles for the cars
+    global gains, throttles
+    gains, throttles = rng.uniform(1, 4, CAR_COUNT), rng.uniform(0.05, 0.4, CAR_COUNT)
+
+
+def follow_centre_line(runner: HeadlessRunner):
+    fleet = runner.fleet
+    nearest = np.argmin(np.sum(np.square(fleet.pos[:, np.newaxis] - centre_line), axis=-1), axis=-1)
+    target = centre_line[(nearest + LOOKAHEAD) % len(centre_line)] - fleet.pos
+    error = np.arctan2(target[:, 1], target[:, 0]) - fleet.heading
+    error = (error + np.pi) % (2 * np.pi) - np.pi
+    fleet.steer[:] = np.clip(error * gains, -1, 1)
+    fleet.throttle[:] = throttles
+
+
+def report(runner: HeadlessRunner):
+    print("{:.0f}s: {} cars alive".format(runner.clock.time, np.sum(runner.alive)))
+
+
+runner.controller = follow_centre_line
+runner.render, runner.render_every = report, 500
+results = runner.run(time_budget=20, on_episode_start=new_controls)
+
+best = max(results, key=lambda result: np.max(result.distances))
+car = np.argmax(best.distances)
+print("Furthest: {:.1f}m in episode {}".format(best.distances[car], best.episode))
@@ -0,0 +1,51 @@
+import time
+
+import numpy as np
+
+from fsai.car.car import Car
+from fsai.car.physics.advanced import CarPhysics
+from fsai.car.physics.fleet import FleetPhysics
+
+
+# Step a fleet of cars with random controls at once, and the same cars one at a time through their own physics, then
+# check both end in exactly the same state
+CAR_COUNT = 500
+STEPS = 500
+DT = 0.02
+
+rng = np.random.default_rng(0)
+controls = [
+    (rng.uniform(-1, 1, CAR_COUNT), rng.choice([0, 0.5, 1], CAR_COUNT), rng.choice([0, 0, 0.3], CAR_COUNT))
+    for _ in range(STEPS // 50)
+]
+
+fleet = FleetPhysics(CAR_COUNT)
+single_cars = [Car(pos=np.zeros(2)) for _ in range(CAR_COUNT)]
+for car in single_cars:
+    car.physics = CarPhysics(car)
+
+fleet_time, single_time = 0, 0
+for step in range(STEPS):
+    steer, throttle, brake = controls[step // 50]
+    fleet.steer[:], fleet.throttle[:], fleet.brake[:] = steer, throttle, brake
+    for index, car in enumerate(single_cars):
+        car.steer, car.throttle, car.brake = steer[index], throttle[index], brake[index]
+
+    start = time.time()
+    fleet.step(DT)
+    fleet_time += time.time() - start
+
+    start = time.time()
+    for car in single_cars:
+        car.physics.update(DT)
+    single_time += time.time() - start
+
+single_pos = np.array([car.pos for car in single_cars])
+single_heading = np.array([car.heading for car in single_cars])
+print("Identical positions: {}, headings: {}".format(
+    np.array_equal(fleet.pos, single_pos), np.array_equal(fleet.heading, single_heading)
+))
+print("{} cars stopped by the low speed clamp".format(np.sum(fleet.abs_vel == 0)))
+print("Fleet step: {:.3f}ms, one car at a time: {:.3f}ms".format(
+    fleet_time / STEPS * 1000, single_time / STEPS * 1000
+))
@@ -0,0 +1,43 @@
+import math
+import time
+
+import numpy as np
+
+from fsai.car.physics.openVehicle import VehicleModel
+from fsai.objects.track import Track
+from fsai.path_planning.lap_time import evaluate_population
+from fsai.path_planning.ggv_lap_time import GGVLapTime
+from fsai.path_planning.waypoint_array import WaypointArray
+from fsai.path_planning.waypoints import gen_waypoints
+
+
+# Compare the lap time of the center line of a track from the vehicle's GGV map with the friction circle lap time
+track = Track("examples/data/tracks/brands_hatch.json")
+blue_lines, yellow_lines, orange_lines = track.get_boundary()
+waypoints = gen_waypoints(
+    track.cars[0].pos,
+    track.cars[0].heading,
+    blue_lines,
+    yellow_lines,
+    orange_lines,
+    full_track=True,
+    spacing=1,
+    radar_length=30,
+    radar_count=17,
+    radar_span=math.pi / 1.1,
+    margin=0,
+    smooth=True
+)
+lines = WaypointArray.from_waypoints(waypoints).lines
+optimums = np.full((100, len(lines)), 0.5)
+
+ggv = GGVLapTime(VehicleModel.from_json("examples/data/vehicles/formula_1.json"))
+velocities, ggv_time = ggv.solve_population(lines, optimums[0])
+friction_time = evaluate_population(lines, optimums[:1], 1.7 * 9.81 * 0.74, 104)[0]
+print("{} waypoints".format(len(lines)))
+print("GGV lap time: {:.3f}s, from {:.1f}m/s to {:.1f}m/s".format(ggv_time, velocities.min(), velocities.max()))
+print("Friction circle lap time: {:.3f}s".format(friction_time))
+
+start = time.time()
+ggv.evaluate_population(lines, optimums)
+print("{:.3f}ms per lap for a population of {}".format((time.time() - start) * 1000 / len(optimums), len(optimums)))
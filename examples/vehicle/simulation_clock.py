@@ -0,0 +1,51 @@
+import numpy as np
+
+from fsai.car.physics.fleet import FleetPhysics, SEMI_IMPLICIT_EULER, RK4
+from fsai.simulation.clock import SimulationClock
+
+
+# Run a fleet of cars through the clock at 10 steps a second with each integrator and number of substeps, comparing
+# where they end up to a run with tiny steps, then show the clock gives the same result however the frames are timed
+CAR_COUNT = 200
+STEPS = 50
+TIME_STEP = 0.1
+
+rng = np.random.default_rng(0)
+steer, throttle = rng.uniform(-1, 1, CAR_COUNT), rng.uniform(0.2, 1, CAR_COUNT)
+
+
+def create_fleet():
+    fleet = FleetPhysics(CAR_COUNT)
+    fleet.steer[:], fleet.throttle[:] = steer, throttle
+    return fleet
+
+
+def run(substeps: int, integrator: str) -> np.ndarray:
+    fleet = create_fleet()
+    clock = SimulationClock(fleet, time_step=TIME_STEP, substeps=substeps, integrator=integrator)
+    for _ in range(STEPS):
+        clock.step()
+    return fleet.pos
+
+
+reference = run(200, RK4)
+for integrator in [SEMI_IMPLICIT_EULER, RK4]:
+    for substeps in [1, 2, 4, 8]:
+        errors = np.hypot(*(run(substeps, integrator) - reference).T)
+        print("{} with {} substeps: median error {:.4f}m, max error {:.4f}m".format(
+            integrator, substeps, np.median(errors), np.max(errors)
+        ))
+
+# frames of random length, as from a render loop, give the same positions as stepping directly
+fleet = create_fleet()
+clock = SimulationClock(fleet, time_step=TIME_STEP)
+while clock.steps < STEPS:
+    clock.advance(rng.uniform(0, 0.3))
+    render_pos, render_heading = clock.get_render_state()
+steps = clock.steps
+
+direct = create_fleet()
+direct_clock = SimulationClock(direct, time_step=TIME_STEP)
+for _ in range(steps):
+    direct_clock.step()
+print("Same positions after {} steps: {}".format(steps, np.array_equal(fleet.pos, direct.pos)))
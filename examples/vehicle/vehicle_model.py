@@ -0,0 +1,33 @@
+import time
+
+import numpy as np
+
+from fsai.car.physics.openVehicle import VehicleModel
+
+
+# Build the vehicle model of a vehicle spec, print its gearing and GGV map, then save it and load it back
+start = time.time()
+vehicle = VehicleModel.from_json("examples/data/vehicles/formula_1.json")
+print("Built {} in {:.2f}ms".format(vehicle.name, (time.time() - start) * 1000))
+
+print("Top speed: {:.1f}m/s".format(vehicle.vehicle_speed[-1]))
+for gear, (shift, arrive, drop) in enumerate(zip(vehicle.shift_points, vehicle.arrive_points, vehicle.rev_drops)):
+    print("{}-{}: shift at {:.0f}rpm, arrive at {:.0f}rpm, rev drop {:.0f}rpm".format(
+        gear + 1, gear + 2, shift, arrive, drop
+    ))
+
+print("GGV map of {} speeds with {} points each".format(*vehicle.ggv.shape[:2]))
+for speed in [10, 30, 50, 70]:
+    print("{}m/s: lateral {:.1f}m/s^2, acceleration {:.1f}m/s^2, braking {:.1f}m/s^2".format(
+        speed,
+        vehicle.get_max_lateral_acceleration(speed),
+        vehicle.get_max_acceleration(speed),
+        vehicle.get_max_deceleration(speed)
+    ))
+
+vehicle.save("formula_1.npz")
+start = time.time()
+loaded = VehicleModel.load("formula_1.npz")
+print("Loaded in {:.2f}ms, same GGV map: {}".format(
+    (time.time() - start) * 1000, np.array_equal(loaded.ggv, vehicle.ggv)
+))
@@ -0,0 +1,63 @@
+import glob
+import math
+import time
+
+import numpy as np
+
+from fsai.objects.track import Track
+from fsai.path_planning.waypoint_array import WaypointArray
+from fsai.path_planning.waypoints import create_waypoint_lines, create_waypoint_array, create_waypoint_at_pos, \
+    YELLOW_ON_LEFT, BLUE_ON_LEFT
+
+
+# Check the compiled waypoint kernel (create_waypoint_array) gives the same waypoints as the python reference
+# (create_waypoint_lines) on every example track, for a full track and for waypoints ahead of and behind the car.
+configs = [
+    dict(count=10000, spacing=1, overlap=False, max_radar_length=30, radar_count=17, radar_angle_span=math.pi / 1.1),
+    dict(count=8, spacing=2, overlap=True, max_radar_length=12, radar_count=5, radar_angle_span=math.pi / 1.2,
+         bias=0.3, bias_strength=0.3),
+    dict(count=4, spacing=2, overlap=True, reverse=True, max_radar_length=12, radar_count=5,
+         radar_angle_span=math.pi / 1.2, left_boundary_colour=YELLOW_ON_LEFT),
+]
+
+python_time, kernel_time, failures, runs = 0, 0, 0, 0
+for track_path in sorted(glob.glob("examples/data/tracks/*.json")):
+    track = Track(track_path)
+    car = track.cars[0]
+    blue_lines, yellow_lines, orange_lines = track.get_boundary()
+
+    for config in configs:
+        initial_waypoint = create_waypoint_at_pos(
+            car.pos,
+            car.heading,
+            blue_lines,
+            yellow_lines,
+            orange_lines,
+            left_boundary_colour=config.get("left_boundary_colour", BLUE_ON_LEFT)
+        )
+        initial_angle = car.heading + (math.pi if config.get("reverse", False) else 0)
+        arguments = dict(
+            initial_point=initial_waypoint.get_optimum_point(),
+            initial_angle=initial_angle,
+            blue_boundary=blue_lines,
+            yellow_boundary=yellow_lines,
+            orange_boundary=orange_lines,
+            **config
+        )
+
+        start = time.time()
+        reference = WaypointArray.from_waypoints(create_waypoint_lines(**arguments))
+        python_time += time.time() - start
+
+        start = time.time()
+        waypoints = create_waypoint_array(**arguments)
+        kernel_time += time.time() - start
+
+        runs += 1
+        if len(reference) != len(waypoints) or not np.array_equal(reference.lines, waypoints.lines) or \
+                not np.array_equal(reference.optimum, waypoints.optimum) or \
+                not np.array_equal(reference.sticky, waypoints.sticky):
+            failures += 1
+            print("Mismatch: {} {}".format(track_path, config))
+
+print("{}/{} runs match. Python: {:.3f}s, kernel: {:.3f}s".format(runs - failures, runs, python_time, kernel_time))
@@ -0,0 +1,86 @@
+import math
+
+import numpy as np
+
+from fsai.objects.track import Track
+from fsai.path_planning.lap_time import IncrementalLapTime, evaluate_population
+from fsai.path_planning.multi_resolution import get_resolution_levels, optimise_multi_resolution
+from fsai.path_planning.waypoint_array import WaypointArray
+from fsai.path_planning.waypoints import gen_waypoints
+
+
+# Hill climb the racing line of each track as OptimalPathCreator does, once on every waypoint and once from coarse to
+# fine, giving both the same number of lap time evaluations, then compare the lap times at full resolution
+TRACKS = ["azure_circuit", "brands_hatch", "cota"]
+BUDGETS = [5000, 20000, 50000]  # lap time evaluations of each run
+MAX_FRICTIONAL_FORCE = 1.7 * 9.81 * 0.74
+MAX_SPEED = 104
+MAX_STEP_SIZE = 0.05
+DELTA_STEP_SIZE = 0.6
+STEP_SIZES = 20
+
+
+def hill_climb(array: WaypointArray, budget: int) -> (np.ndarray, int):
+    # step each waypoint in turn with shrinking step sizes, keeping the first step that improves the lap time, until
+    # the budget is spent or a pass over every waypoint gives no improvement
+    lap_time = IncrementalLapTime(array, array.optimum, MAX_FRICTIONAL_FORCE, MAX_SPEED)
+    best_time, evaluations, improved = lap_time.time, 0, True
+    while improved and evaluations < budget:
+        improved = False
+        for index in np.flatnonzero(~array.sticky):
+            for i in range(STEP_SIZES * 2):
+                step_size = MAX_STEP_SIZE * DELTA_STEP_SIZE ** (i // 2)
+                optimum = lap_time.optimums[index]
+                value = min(1.0, optimum + step_size) if i % 2 == 0 else max(0.0, optimum - step_size)
+                test_time = lap_time.evaluate(index, [value])
+                evaluations += 1
+                if test_time < best_time:
+                    lap_time.accept()
+                    best_time, improved = test_time, True
+                    break
+            if evaluations >= budget:
+                break
+    return lap_time.optimums, evaluations
+
+
+for name in TRACKS:
+    track = Track("examples/data/tracks/{}.json".format(name))
+    blue_lines, yellow_lines, orange_lines = track.get_boundary()
+    waypoints = gen_waypoints(
+        track.cars[0].pos,
+        track.cars[0].heading,
+        blue_lines,
+        yellow_lines,
+        orange_lines,
+        full_track=True,
+        spacing=1,
+        radar_length=30,
+        radar_count=17,
+        radar_span=math.pi / 1.1,
+        margin=0,
+        smooth=True
+    )[::3]
+    for waypoint in waypoints:
+        waypoint.optimum = 0.5
+    array = WaypointArray.from_waypoints(waypoints)
+    levels = get_resolution_levels(waypoints)
+    print("{}: levels of {} waypoints".format(name, [len(level) for level in levels]))
+
+    for budget in BUDGETS:
+        single, _ = hill_climb(array, budget)
+
+        # each level's share of the budget is in proportion to its size, any budget a level doesn't use is carried
+        # on to the next level
+        spent = [0]
+        shares = iter(np.cumsum([len(level) for level in levels]) / sum(len(level) for level in levels) * budget)
+
+        def optimise(level_array: WaypointArray) -> np.ndarray:
+            level_optimums, evaluations = hill_climb(level_array, int(next(shares)) - spent[0])
+            spent[0] += evaluations
+            return level_optimums
+
+        multi = optimise_multi_resolution(waypoints, optimise, levels)
+        single_time, multi_time = evaluate_population(array.lines, np.stack([single, multi]), MAX_FRICTIONAL_FORCE,
+                                                      MAX_SPEED)
+        print("  {} evaluations: single level {:.2f}s, multi resolution {:.2f}s".format(budget, single_time,
+                                                                                         multi_time))
@@ -1,30 +1,49 @@
 import numpy as np
 
 from fsai.car.physics.basic import CarPhysics
+from fsai.car.physics.fleet import FleetPhysics, row_property
 
 
 class Car:
+    # the pose, controls and dimensions used by the physics are stored in a row of a fleet
+    pos = row_property("pos")
+    heading = row_property("heading")
+    mass = row_property("mass")
+    max_steer = row_property("max_steer")
+    cg_to_front_axle = row_property("cg_to_front_axle")
+    cg_to_rear_axle = row_property("cg_to_rear_axle")
+    cg_height = row_property("cg_height")
+    throttle = row_property("throttle")
+    brake = row_property("brake")
+    steer = row_property("steer")
+
     def __init__(
             self,
             pos: np.ndarray=None,
-            heading=0,
+            heading: float=None,
+            fleet: FleetPhysics=None,
+            index: int=0
     ):
-        self.pos = pos if pos is not None else np.array([0, 0])
-        self.heading = heading
-        self.physics = CarPhysics(self)
+        """
+        A car, which is a view of a row of a fleet so that many cars can be stepped at once with
+        'FleetPhysics.step'. Without a fleet the car has a fleet of its own.
 
-        self.mass = 1000
+        :param pos: Position of the car, defaults to the position already in the fleet
+        :param heading: Heading of the car in radians, defaults to the heading already in the fleet
+        :param fleet: Fleet whose row stores the car
+        :param index: Row of the fleet
+        """
+        self.fleet: FleetPhysics = fleet if fleet is not None else FleetPhysics(1)
+        self.index: int = index
+
+        if pos is not None:
+            self.pos = pos
+        if heading is not None:
+            self.heading = heading
+        self.physics = CarPhysics(self)
 
         self.width = 0.8
-        self.max_steer = 0.6
         self.wheel_radius = 0.5
         self.wheel_width = 0.3
-        self.cg_to_front_axle = 0.75
-        self.cg_to_rear_axle = 0.75
-        self.cg_height = 0.55
         self.cg_to_front = 1.25
         self.cg_to_rear = 1.25
-
-        self.throttle = 0
-        self.brake = 0
-        self.steer = 0
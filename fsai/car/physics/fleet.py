@@ -0,0 +1,314 @@
+from typing import List, Tuple
+
+import numpy as np
+
+# attributes of each car and their default values, the pose and controls of the car followed by its dimensions
+CAR_DEFAULTS = {
+    "heading": 0.0,
+    "steer": 0.0,
+    "throttle": 0.0,
+    "brake": 0.0,
+    "mass": 1000.0,
+    "max_steer": 0.6,
+    "cg_to_front_axle": 0.75,
+    "cg_to_rear_axle": 0.75,
+    "cg_height": 0.55,
+}
+
+# tuning of the physics of each car, as in 'advanced.CarPhysics'
+PHYSICS_DEFAULTS = {
+    "ebrake": 0.0,
+    "weight_transfer": 0.2,
+    "gravity": 9.81,
+    "air_resist": 2.5,
+    "roll_resist": 4.0,
+    "engine_force": 10000.0,
+    "brake_force": 14000.0,
+    "inertia_scale": 1.0,
+    "corner_stiffness_front": 4.0,
+    "corner_stiffness_rear": 4.2,
+    "tire_grip": 5.0,
+    "lock_grip": 0.7,
+    "e_brake_force": 2000.0,
+}
+
+# state of each car's physics which starts at 0, as (N, 2) vectors and (N,) values
+PHYSICS_VECTORS = ["velocity", "accel", "vel_c", "accel_c"]
+PHYSICS_VALUES = ["abs_vel", "yaw_rate", "distance_travelled"]
+
+RECENT_DISTANCES = 100  # number of steps of distance travelled kept for each car
+STOP_SPEED = 0.5  # m/s below which a car without throttle is stopped
+
+SEMI_IMPLICIT_EULER = "semi_implicit_euler"
+RK4 = "rk4"
+INTEGRATORS = [SEMI_IMPLICIT_EULER, RK4]
+
+
+class FleetPhysics:
+    def __init__(self, count: int):
+        """
+        The physics of many cars stored as arrays, one row per car, so that every car is advanced by a single call to
+        'step'. Each row follows the equations of 'advanced.CarPhysics.update', including stopping cars
+        which are crawling without throttle, just computed for every car at once. The pose, controls and dimensions
+        of each car are (N,) arrays, apart from the position which is (N, 2), along with the velocity, acceleration
+        and yaw rate of each car and the tuning of its physics.
+
+        'Car' and 'advanced.CarPhysics' objects are views of a row, so reading or setting their attributes reads
+        or sets the fleet's arrays. A car made on its own has a fleet of one.
+
+        :param count: Number of cars in the fleet
+        """
+        self.count: int = count
+
+        self.pos: np.ndarray = np.zeros((count, 2))
+        for name, value in {**CAR_DEFAULTS, **PHYSICS_DEFAULTS}.items():
+            setattr(self, name, np.full(count, value))
+        for name in PHYSICS_VECTORS:
+            setattr(self, name, np.zeros((count, 2)))
+        for name in PHYSICS_VALUES:
+            setattr(self, name, np.zeros(count))
+
+        # the distance travelled in each of the last RECENT_DISTANCES steps of each car, as a ring buffer
+        self.recent_distances: np.ndarray = np.zeros((count, RECENT_DISTANCES))
+        self.recent_count: np.ndarray = np.zeros(count, dtype=np.int64)
+        self.recent_index: np.ndarray = np.zeros(count, dtype=np.int64)
+
+    @staticmethod
+    def from_cars(cars: List) -> "FleetPhysics":
+        """
+        Create a fleet from cars made separately, for example copies of a track's starting car. The state of each
+        car is copied into a row of the fleet and the car becomes a view of that row.
+
+        :param cars: List of cars
+        :return: Fleet with a row for each car, in the order given
+        """
+        fleet = FleetPhysics(len(cars))
+        for index, car in enumerate(cars):
+            fleet.copy_row(index, car.fleet, car.index)
+            car.fleet, car.index = fleet, index
+        return fleet
+
+    def copy_row(self, index: int, fleet: "FleetPhysics", fleet_index: int):
+        """
+        Copy the state of a car from a row of another fleet.
+
+        :param index: Row to copy into
+        :param fleet: Fleet to copy from, which can be this fleet
+        :param fleet_index: Row to copy from
+        """
+        for name in self.__get_array_names():
+            getattr(self, name)[index] = getattr(fleet, name)[fleet_index]
+
+    def get_recent_distances(self, index: int) -> List[float]:
+        """
+        :param index: Row of the car
+        :return: The distance travelled by the car in each of its last steps, oldest first
+        """
+        count = self.recent_count[index]
+        order = (self.recent_index[index] - count + np.arange(count)) % RECENT_DISTANCES
+        return self.recent_distances[index, order].tolist()
+
+    def step(self, dt: float, rows: slice = slice(None), integrator: str = SEMI_IMPLICIT_EULER) -> np.ndarray:
+        """
+        Advance every car in the fleet by a time step. Each car is a rear wheel drive bicycle model: the slip
+        angles of the front and rear wheels give the cornering forces on each axle, weighted by the load on the axle
+        after weight transfer, which with the throttle, brakes and drag give the acceleration and yaw of the car.
+
+        With SEMI_IMPLICIT_EULER, as in 'advanced.CarPhysics', the velocity and yaw rate are updated first and the
+        position and heading move with the updated values. RK4 integrates the same equations from four evaluations
+        through the step, with the controls held and the weight transfer of each evaluation taken from the
+        acceleration of the one before, so it stays accurate at larger time steps.
+
+        :param dt: Time step in seconds
+        :param rows: Slice of the cars to advance, defaults to every car
+        :param integrator: SEMI_IMPLICIT_EULER or RK4
+        :return: Array of the distance travelled by each car advanced, 0 for stopped cars
+        """
+        if integrator not in INTEGRATORS:
+            raise ValueError("Unknown integrator '{}', expected one of {}".format(integrator, INTEGRATORS))
+
+        pos, heading = self.pos[rows], self.heading[rows]
+        velocity, yaw_rate = self.velocity[rows], self.yaw_rate[rows]
+
+        vel_c, accel_c, accel, angular_accel = self.__get_accelerations(
+            rows, heading, velocity, yaw_rate, self.accel_c[rows, 0]
+        )
+
+        if integrator == SEMI_IMPLICIT_EULER:
+            velocity += accel * dt
+            stopped = self.__stop_crawling_cars(rows, velocity, dt)
+            angular_accel[stopped] = 0
+            yaw_rate[stopped] = 0
+
+            yaw_rate += angular_accel * dt
+            heading += yaw_rate * dt
+            pos += velocity * dt
+        else:
+            pos_rate, heading_rate, velocity_rate, yaw_rate_rate = self.__get_rk4_rates(
+                rows, heading, velocity, yaw_rate, accel_c[:, 0], accel, angular_accel, dt
+            )
+            velocity += velocity_rate * dt
+            stopped = self.__stop_crawling_cars(rows, velocity, dt)
+            yaw_rate += yaw_rate_rate * dt
+            yaw_rate[stopped] = 0
+
+            # stopped cars stay where they are, as with no velocity or yaw rate they would under Euler
+            moving = ~stopped
+            heading[moving] += heading_rate[moving] * dt
+            pos[moving] += pos_rate[moving] * dt
+
+        # the accelerations at the start of the step, the longitudinal one sets the weight transfer of the next step
+        self.vel_c[rows], self.accel_c[rows], self.accel[rows] = vel_c, accel_c, accel
+        return self.abs_vel[rows] * dt
+
+    def __get_accelerations(
+            self,
+            rows: slice,
+            heading: np.ndarray,
+            velocity: np.ndarray,
+            yaw_rate: np.ndarray,
+            forward_accel: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        mass = self.mass[rows]
+        cg_to_front_axle, cg_to_rear_axle = self.cg_to_front_axle[rows], self.cg_to_rear_axle[rows]
+
+        # shorthand
+        sn = np.sin(heading)
+        cs = np.cos(heading)
+        steer_angle = self.steer[rows] * self.max_steer[rows]
+
+        # velocity in local car coordinates
+        vel_c = np.empty(velocity.shape)
+        vel_c[:, 0] = cs * velocity[:, 0] + sn * velocity[:, 1]
+        vel_c[:, 1] = cs * velocity[:, 1] - sn * velocity[:, 0]
+        forward_speed = vel_c[:, 0]
+
+        # weight on axles based on centre of gravity and weight shift due to forward/reverse acceleration
+        wheel_base = cg_to_front_axle + cg_to_rear_axle
+        axle_weight_ratio_front = cg_to_rear_axle / wheel_base
+        axle_weight_ratio_rear = cg_to_front_axle / wheel_base
+        weight_shift = self.weight_transfer[rows] * forward_accel * self.cg_height[rows] / wheel_base
+        gravity = self.gravity[rows]
+        axle_weight_front = mass * (axle_weight_ratio_front * gravity - weight_shift)
+        axle_weight_rear = mass * (axle_weight_ratio_rear * gravity + weight_shift)
+
+        # velocity of the wheels from the yaw rate of the car body
+        yaw_speed_front = cg_to_front_axle * yaw_rate
+        yaw_speed_rear = -cg_to_rear_axle * yaw_rate
+
+        # slip angles of the front and rear wheels
+        direction = np.where(forward_speed < 0, -1.0, 1.0)
+        slip_angle_front = np.arctan2(vel_c[:, 1] + yaw_speed_front, np.abs(forward_speed)) - direction * steer_angle
+        slip_angle_rear = np.arctan2(vel_c[:, 1] + yaw_speed_rear, np.abs(forward_speed))
+
+        # the rear loses grip when the ebrake is on
+        ebrake, tire_grip = self.ebrake[rows], self.tire_grip[rows]
+        tire_grip_rear = tire_grip * (1.0 - ebrake * (1.0 - self.lock_grip[rows]))
+
+        friction_force_front_cy = np.minimum(np.maximum(
+            -self.corner_stiffness_front[rows] * slip_angle_front, -tire_grip
+        ), tire_grip) * axle_weight_front
+        friction_force_rear_cy = np.minimum(np.maximum(
+            -self.corner_stiffness_rear[rows] * slip_angle_rear, -tire_grip_rear
+        ), tire_grip_rear) * axle_weight_rear
+
+        # brake and throttle from the controls
+        brake_force = self.brake_force[rows]
+        brake = np.minimum(self.brake[rows] * brake_force + ebrake * self.e_brake_force[rows], brake_force)
+        throttle = self.throttle[rows] * self.engine_force[rows]
+
+        # resulting force in local car coordinates, rear wheel drive only so there is no lateral traction
+        traction_force_cx = throttle - brake * direction
+        traction_force_cy = 0
+
+        roll_resist, air_resist = self.roll_resist[rows], self.air_resist[rows]
+        drag_force_cx = -roll_resist * forward_speed - air_resist * forward_speed * np.abs(forward_speed)
+        drag_force_cy = -roll_resist * vel_c[:, 1] - air_resist * vel_c[:, 1] * np.abs(vel_c[:, 1])
+
+        total_force_cx = drag_force_cx + traction_force_cx
+        total_force_cy = drag_force_cy + traction_force_cy + np.cos(steer_angle) * friction_force_front_cy + \
+            friction_force_rear_cy
+
+        # acceleration along the car's axes and in world coordinates
+        accel_c = np.empty(velocity.shape)
+        accel_c[:, 0] = total_force_cx / mass
+        accel_c[:, 1] = total_force_cy / mass
+        accel = np.empty(velocity.shape)
+        accel[:, 0] = cs * accel_c[:, 0] - sn * accel_c[:, 1]
+        accel[:, 1] = sn * accel_c[:, 0] + cs * accel_c[:, 1]
+
+        # rotational forces
+        angular_torque = (friction_force_front_cy + traction_force_cy) * cg_to_front_axle - \
+            friction_force_rear_cy * cg_to_rear_axle
+        angular_accel = angular_torque / (mass * self.inertia_scale[rows])
+        return vel_c, accel_c, accel, angular_accel
+
+    def __get_rk4_rates(
+            self,
+            rows: slice,
+            heading: np.ndarray,
+            velocity: np.ndarray,
+            yaw_rate: np.ndarray,
+            forward_accel: np.ndarray,
+            accel: np.ndarray,
+            angular_accel: np.ndarray,
+            dt: float
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        # rates of change of the position, heading, velocity and yaw rate, starting from those at the start of the
+        # step, then evaluated twice at the middle of the step and once at the end, each from the last
+        rates = [velocity.copy(), yaw_rate.copy(), accel, angular_accel]
+        stage_rates = rates
+        for stage, weight in [(0.5, 2), (0.5, 2), (1, 1)]:
+            stage_heading = heading + stage_rates[1] * (dt * stage)
+            stage_velocity = velocity + stage_rates[2] * (dt * stage)
+            stage_yaw_rate = yaw_rate + stage_rates[3] * (dt * stage)
+            _, stage_accel_c, stage_accel, stage_angular_accel = self.__get_accelerations(
+                rows, stage_heading, stage_velocity, stage_yaw_rate, forward_accel
+            )
+            forward_accel = stage_accel_c[:, 0]
+            stage_rates = [stage_velocity, stage_yaw_rate, stage_accel, stage_angular_accel]
+            rates = [rate + weight * stage_rate for rate, stage_rate in zip(rates, stage_rates)]
+        return tuple(rate / 6 for rate in rates)
+
+    def __stop_crawling_cars(self, rows: slice, velocity: np.ndarray, dt: float) -> np.ndarray:
+        abs_vel = np.hypot(velocity[:, 0], velocity[:, 1])
+        distances = abs_vel * dt
+        self.distance_travelled[rows] += distances
+        self.__record_distances(rows, distances)
+
+        # the sim gets unstable at very slow speeds, so cars crawling without throttle are stopped
+        throttle = self.throttle[rows] * self.engine_force[rows]
+        stopped = (np.abs(abs_vel) < STOP_SPEED) & (throttle == 0)
+        velocity[stopped] = 0
+        abs_vel[stopped] = 0
+        self.abs_vel[rows] = abs_vel
+        return stopped
+
+    def __record_distances(self, rows: slice, distances: np.ndarray):
+        index = self.recent_index[rows]
+        self.recent_distances[rows][np.arange(len(index)), index] = distances
+        self.recent_index[rows] = (index + 1) % RECENT_DISTANCES
+        self.recent_count[rows] = np.minimum(self.recent_count[rows] + 1, RECENT_DISTANCES)
+
+    def __get_array_names(self) -> List[str]:
+        return ["pos"] + list(CAR_DEFAULTS) + list(PHYSICS_DEFAULTS) + PHYSICS_VECTORS + PHYSICS_VALUES + [
+            "recent_distances", "recent_count", "recent_index"
+        ]
+
+
+def row_property(name: str) -> property:
+    """
+    Create a property of a view of a fleet row, which reads and writes the row of one of the fleet's arrays. The
+    object with the property must have 'fleet' and 'index' attributes. Vectors such as the position are returned as
+    views, so setting an element of the vector sets it in the fleet.
+
+    :param name: Name of the fleet's array
+    :return: The property
+    """
+    def get(self):
+        return getattr(self.fleet, name)[self.index]
+
+    def set(self, value):
+        getattr(self.fleet, name)[self.index] = value
+
+    return property(get, set)
@@ -1,472 +1,378 @@
-
-# %% OpenLAP Laptime Simulation Project
-# %
-# % OpenVEHICLE
-# %
-# % Racing vehicle model file creation for use in OpenLAP and OpenDRAG.
-# % Instructions:
-# % 1) Select a vehicle excel file containing the vehicles information by
-# %    assigning the full path to the variable "filename". Use the
-# %    "OpenVEHICLE tmp.xlsx" file to create a new vehicle excel file.
-# % 2) Run the script.
-# % 3) The results will appear on the command window and inside the folder
-# %    "OpenVEHICLE Vehicles".
-# %
-# % More information can be found in the "OpenLAP Laptime Simulator"
-# % videos on YouTube.
-# %
-# % This software is licensed under the GPL V3 Open Source License.
-# %
-# % Open Source MATLAB project created by:
-# %
-# % Michael Chalkiopoulos
-# % Cranfield University Advanced Motorsport MSc Engineer
-# % National Technical University of Athens MEng Mechanical Engineer
-# %
-# % LinkedIn: https://www.linkedin.com/in/michael-chalkiopoulos/
-# % email: halkiopoulos_michalis@hotmail.com
-# % MATLAB file exchange: https://uk.mathworks.com/matlabcentral/fileexchange/
-# % GitHub: https://github.com/mc12027
-# %
-# % April 2020.
+# OpenVEHICLE, from the OpenLAP Laptime Simulation Project
+#
+# Racing vehicle model for use in lap time simulation, ported to Python from the MATLAB OpenVEHICLE script. The
+# vehicle is described by a dictionary of the values from the OpenVEHICLE vehicle sheet and the model is calculated
+# as whole arrays rather than per speed.
+#
+# This software is licensed under the GPL V3 Open Source License.
+#
+# Open Source MATLAB project created by:
+#
+# Michael Chalkiopoulos
+# Cranfield University Advanced Motorsport MSc Engineer
+# National Technical University of Athens MEng Mechanical Engineer
+#
+# LinkedIn: https://www.linkedin.com/in/michael-chalkiopoulos/
+# email: halkiopoulos_michalis@hotmail.com
+# MATLAB file exchange: https://uk.mathworks.com/matlabcentral/fileexchange/
+# GitHub: https://github.com/mc12027
 #
+# April 2020.
+import json
 import math
+from typing import Dict, Optional
 
 import numpy as np
 
-filename = 'Formula 1.xlsx'
-
-# %% Reading vehicle file
-
-info = read_info(filename,'Info')
-data = read_torque_curve(filename,'Torque Curve')
-
-## Getting variables
-
-# info
-name = "Formula 1"
-type = "Open Wheel"
-
-# mass
-M = 650  # vehicle mass
-df = 0.45  # frontal mass distribution
-
-# wheelbase
-L = 3  # wheel base (m)
-
-# steering rack ratio
-rack = 1
-
-# aerodynamics
-Cl = -4.8  # lift coefficient. + = lift, - = down force
-Cd = -1.2
-factor_Cl = 1
-factor_Cd = 1
-da = 0.5  # front aero distribution
-A = 1  # frontal area
-rho = 1.225  # air density
-
-# brakes
-br_disc_d = 0.25
-br_pad_h = 0.04
-br_pad_mu = 0.45
-br_nop = 6
-br_pist_d = 40
-br_mast_d = 25
-br_ped_r = 4
-
-# tyres
-factor_grip = 1
-tyre_radius = 0.33
-Cr = -0.001
-mu_x = 2
-mu_x_M = 250
-sens_x = 0.0001
-mu_y = 2
-mu_y_M = 250
-sens_y = 0.0001
-CF = 800
-CR = 1000
-
-# engine
-factor_power = 1
-n_thermal = 0.35
-fuel_LHV = 4.72E+07
-
-# drive train
-drive = "RWD"
-shift_time = 0.01
-n_primary = 1
-n_final = 0.92
-n_gearbox = 0.98
-ratio_primary = 1;
-ratio_final = 7
-ratio_gearbox = [2.57, 2.11, 1.75, 1.46, 1.29, 1.12, 1]
-nog = len(ratio_gearbox)
-
-%% HUD
-
-[folder_status,folder_msg] = mkdir('OpenVEHICLE Vehicles') ;
-vehname = "OpenVEHICLE Vehicles/OpenVEHICLE_"+name+"_"+type ;
-delete(vehname+".log") ;
-diary(vehname+".log") ;
-disp([...
-    '_______                    ___    ________________  ________________________________';...
-    '__  __ \_____________________ |  / /__  ____/__  / / /___  _/_  ____/__  /___  ____/';...
-    '_  / / /__  __ \  _ \_  __ \_ | / /__  __/  __  /_/ / __  / _  /    __  / __  __/   ';...
-    '/ /_/ /__  /_/ /  __/  / / /_ |/ / _  /___  _  __  / __/ /  / /___  _  /___  /___   ';...
-    '\____/ _  .___/\___//_/ /_/_____/  /_____/  /_/ /_/  /___/  \____/  /_____/_____/   ';...
-    '       /_/                                                                          '...
-    ]) ;
-disp('====================================================================================')
-disp(filename)
-disp('File read successfully')
-disp('====================================================================================')
-disp("Name: "+name)
-disp("Type: "+type)
-disp("Date: "+datestr(now,'dd/mm/yyyy'))
-disp("Time: "+datestr(now,'HH:MM:SS'))
-disp('====================================================================================')
-disp('Vehicle generation started.')
-
-# Brake Model
-br_pist_a = br_nop * math.pi * (br_pist_d/1000)**2/4
-br_mast_a = math.pi * (br_mast_d/1000)**2/4
-beta = tyre_radius / (br_disc_d / 2 - br_pad_h / 2) / br_pist_a / br_pad_mu / 4
-phi = br_mast_a / br_ped_r * 2
-
-# HUD
-disp('Braking model generated successfully.')
-
-# Driveline Model
-
-# fetching engine curves
-en_speed_curve = table2array(data(:,1)) ; % [rpm]
-en_torque_curve = table2array(data(:,2)) ; % [N*m]
-en_power_curve = en_torque_curve.*en_speed_curve*2*pi/60 ; % [W]
-# memory preallocation
-# wheel speed per gear for every engine speed value
-wheel_speed_gear = np.zeros(len(en_speed_curve), nog)
-# vehicle speed per gear for every engine speed value
-vehicle_speed_gear = np.zeros(len(en_speed_curve), nog)
-# wheel torque per gear for every engine speed value
-wheel_torque_gear =np.zeros(len(en_torque_curve), nog)
-# calculating values for each gear and engine speed
-for i in range(nog):
-    wheel_speed_gear(:,i) = en_speed_curve/ratio_primary/ratio_gearbox(i)/ratio_final ;
-    vehicle_speed_gear(:,i) = wheel_speed_gear(:,i)*2*pi/60*tyre_radius ;
-    wheel_torque_gear(:,i) = en_torque_curve*ratio_primary*ratio_gearbox(i)*ratio_final*n_primary*n_gearbox*n_final ;
-
-# minimum and maximum vehicle speeds
-v_min = min(vehicle_speed_gear,[],'all') ;
-v_max = max(vehicle_speed_gear,[],'all') ;
-# new speed vector for fine meshing
-dv = 0.5/3.6
-vehicle_speed = linspace(v_min,v_max,(v_max-v_min)/dv)' ;
-# % memory preallocation
-# % gear
-gear = np.zeros(len(vehicle_speed), 1)
-# % engine tractive force
-fx_engine = np.zeros(len(vehicle_speed), 1)
-# % engine tractive force per gear
-fx = np.zeros(len(vehicle_speed), nog)
-# optimising gear selection and calculating tractive force
-for i in range(len(vehicle_speed)):
-    # going through the gears
-    for j in range(nog):
-        fx(i,j) = interp1(vehicle_speed_gear(:,j),wheel_torque_gear(:,j)/tyre_radius,vehicle_speed(i),'linear',0) ;
-    % getting maximum tractive force and gear
-    [fx_engine(i),gear(i)] = max(fx(i,:)) ;
-
-% adding values for 0 speed to vectors for interpolation purposes at low speeds
-vehicle_speed = [0;vehicle_speed] ;
-gear = [gear(1);gear] ;
-fx_engine = [fx_engine(1);fx_engine] ;
-% final vectors
-% engine speed
-engine_speed = ratio_final*ratio_gearbox(gear)*ratio_primary.*vehicle_speed/tyre_radius*60/2/pi ;
-% wheel torque
-wheel_torque = fx_engine*tyre_radius ;
-% engine torque
-engine_torque = wheel_torque/ratio_final./ratio_gearbox(gear)/ratio_primary/n_primary/n_gearbox/n_final ;
-% engine power
-engine_power = engine_torque.*engine_speed*2*pi/60 ;
-% HUD
-disp('Driveline model generated successfully.')
-
-%% Shifting Points and Rev Drops
-
-% finding gear changes
-gear_change = diff(gear) ; % gear change will appear as 1
-% getting speed right before and after gear change
-gear_change = logical([gear_change;0]+[0;gear_change]) ;
-% getting engine speed at gear change
-engine_speed_gear_change = engine_speed(gear_change) ;
-% getting shift points
-shift_points = engine_speed_gear_change(1:2:length(engine_speed_gear_change)) ;
-% getting arrive points
-arrive_points = engine_speed_gear_change(2:2:length(engine_speed_gear_change)) ;
-% calculating revdrops
-rev_drops = shift_points-arrive_points ;
-% creating shifting table
-rownames = cell(nog-1,1) ;
-for i=1:nog-1
-    rownames(i) = {[num2str(i,'%d'),'-',num2str(i+1,'%d')]} ;
-end
-shifting = table(shift_points,arrive_points,rev_drops,'RowNames',rownames) ;
-% HUD
-disp('Shift points calculated successfully.')
-
-%% Force model
-
-% gravitational constant
-g = 9.81 ;
-% drive and aero factors
-if drive == "RWD":
-        factor_drive = (1-df)
-        factor_aero = (1-da)
-        driven_wheels = 2
-if drive == "FWD":
-        factor_drive = df
-        factor_aero = da
-        driven_wheels = 2
-
-if drive == "AWD":
-        factor_drive = 1
-        factor_aero = 1
-        driven_wheels = 4
-
-# Z axis
-fz_mass = -M*g
-fz_aero = 1/2*rho*factor_Cl*Cl*A*vehicle_speed.^2 ;
-fz_total = fz_mass+fz_aero ;
-fz_tyre = (factor_drive*fz_mass+factor_aero*fz_aero)/driven_wheels ;
-# x axis
-fx_aero = 1/2*rho*factor_Cd*Cd*A*vehicle_speed.^2 ;
-fx_roll = Cr*abs(fz_total) ;
-fx_tyre = driven_wheels*(mu_x+sens_x*(mu_x_M*g-abs(fz_tyre))).*abs(fz_tyre) ;
-# % HUD
-# disp('Forces calculated successfully.')
-
-%% GGV Map
-
-# track data
-bank = 0
-incl = 0
-# lateral tyre coefficients
-dmy = factor_grip*sens_y
-muy = factor_grip*mu_y
-Ny = mu_y_M*g
-# longitudinal tyre coefficients
-dmx = factor_grip*sens_x
-mux = factor_grip*mu_x
-Nx = mu_x_M*g
-# normal load on all wheels
-Wz = M*g*cosd(bank)*cosd(incl) ;
-# induced weight from banking and inclination
-Wy = -M*g*sind(bank) ;
-Wx = M*g*sind(incl) ;
-# speed map vector
-dv = 2 ;
-v = (0:dv:v_max)' ;
-if v(end)~=v_max
-    v = [v;v_max]
-
-# friction ellipse points
-N = 45 ;
-# map preallocation
-GGV = np.zeros((len(v),2*N-1,3))
-for i in range(len(v)):
-    # aero forces
-    Aero_Df = 1/2*rho*factor_Cl*Cl*A*v[i]**2
-    Aero_Dr = 1/2*rho*factor_Cd*Cd*A*v[i]**2
-    # rolling resistance
-    Roll_Dr = Cr*abs(-Aero_Df+Wz)
-    # normal load on driven wheels
-    Wd = (factor_drive*Wz+(-factor_aero*Aero_Df))/driven_wheels
-    # drag acceleration
-    ax_drag = (Aero_Dr+Roll_Dr+Wx)/M
-    # maximum lat acc available from tyres
-    ay_max = 1/M*(muy+dmy*(Ny-(Wz-Aero_Df)/4))*(Wz-Aero_Df)
-    # max long acc available from tyres
-    ax_tyre_max_acc = 1/M*(mux+dmx*(Nx-Wd))*Wd*driven_wheels
-    # max long acc available from tyres
-    ax_tyre_max_dec = -1/M*(mux+dmx*(Nx-(Wz-Aero_Df)/4))*(Wz-Aero_Df)
-    # getting power limit from engine
-    ax_power_limit = 1/M*(interp1(vehicle_speed,factor_power*fx_engine,v(i)))
-    ax_power_limit = ax_power_limit*np.ones(N,1)
-    # lat acc vector
-    ay = ay_max*cosd(linspace(0,180,N))' ;
-    # long acc vector
-    ax_tyre_acc = ax_tyre_max_acc*sqrt(1-(ay/ay_max).^2) ; % friction ellipse
-    ax_acc = min(ax_tyre_acc,ax_power_limit)+ax_drag ; % limiting by engine power
-    ax_dec = ax_tyre_max_dec*sqrt(1-(ay/ay_max).^2)+ax_drag ; % friction ellipse
-    # saving GGV map
-    GGV(i,:,1) = [ax_acc',ax_dec(2:end)'] ;
-    GGV(i,:,2) = [ay',flipud(ay(2:end))'] ;
-    GGV(i,:,3) = v(i)*ones(1,2*N-1) ;
-
-# HUD
-disp('GGV map generated successfully.')
-
-## Saving vehicle
-
-# saving
-save(vehname+".mat")
-
-## Plot
-
-# figure
-set(0,'units','pixels')
-SS = get(0,'screensize')
-H = 900-90
-W = 900
-Xpos = floor((SS(3)-W)/2)
-Ypos = floor((SS(4)-H)/2)
-f = figure('Name','Vehicle Model','Position',[Xpos,Ypos,W,H])
-sgtitle(name)
-
-% rows and columns
-rows = 4
-cols = 2
-
-% engine curves
-subplot(rows,cols,1)
-hold on
-title('Engine Curve')
-xlabel('Engine Speed [rpm]')
-yyaxis left
-plot(en_speed_curve,factor_power*en_torque_curve)
-ylabel('Engine Torque [Nm]')
-grid on
-xlim([en_speed_curve(1),en_speed_curve(end)])
-yyaxis right
-plot(en_speed_curve,factor_power*en_power_curve/745.7)
-ylabel('Engine Power [Hp]')
-
-% gearing
-subplot(rows,cols,3)
-hold on
-title('Gearing')
-xlabel('Speed [m/s]')
-yyaxis left
-plot(vehicle_speed,engine_speed)
-ylabel('Engine Speed [rpm]')
-grid on
-xlim([vehicle_speed(1),vehicle_speed(end)])
-yyaxis right
-plot(vehicle_speed,gear)
-ylabel('Gear [-]')
-ylim([gear(1)-1,gear(end)+1])
-
-% traction model
-subplot(rows,cols,[5,7])
-hold on
-title('Traction Model')
-plot(vehicle_speed,factor_power*fx_engine,'k','LineWidth',4)
-plot(vehicle_speed,min([factor_power*fx_engine';fx_tyre']),'r','LineWidth',2)
-plot(vehicle_speed,-fx_aero)
-plot(vehicle_speed,-fx_roll)
-plot(vehicle_speed,fx_tyre)
-for i=1:nog
-    plot(vehicle_speed(2:end),fx(:,i),'k--')
-end
-grid on
-xlabel('Speed [m/s]')
-ylabel('Force [N]')
-xlim([vehicle_speed(1),vehicle_speed(end)])
-legend({'Engine tractive force','Final tractive force','Aero drag','Rolling resistance','Max tyre tractive force','Engine tractive force per gear'},'Location','southoutside')
-
-% ggv map
-subplot(rows,cols,[2,4,6,8])
-hold on
-title('GGV Map')
-surf(GGV(:,:,2),GGV(:,:,1),GGV(:,:,3))
-grid on
-xlabel('Lat acc [m/s^2]')
-ylabel('Long acc [m/s^2]')
-zlabel('Speed [m/s]')
-% xlim([-ay_max,ay_max])
-% ylim([min(GGV(:,:,1),[],'all'),max(GGV(:,:,1),[],'all')])
-view(105,5)
-set(gca,'DataAspectRatio',[1 1 0.8])
-% cbar = colorbar ;
-% set(get(cbar,'Title'),'String','Speed [m/s]')
-
-% saving figure
-savefig(vehname+".fig")
-% HUD
-disp('Plots created and saved.')
-
-%% HUD
-
-% HUD
-disp('Vehicle generated successfully.')
-% diary
-diary('off') ;
-
-%% Functions
-
-%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
-function [data] = read_torque_curve(workbookFile,sheetName,startRow,endRow)
-    % Input handling
-    % If no sheet is specified, read first sheet
-    if nargin == 1 || isempty(sheetName)
-        sheetName = 1;
-    end
-    % If row start and end points are not specified, define defaults
-    if nargin <= 3
-        startRow = 2;
-        endRow = 10000;
-    end
-    % Setup the Import Options
-    opts = spreadsheetImportOptions("NumVariables", 2);
-    % Specify sheet and range
-    opts.Sheet = sheetName;
-    opts.DataRange = "A" + startRow(1) + ":B" + endRow(1);
-    % Specify column names and types
-    opts.VariableNames = ["Engine_Speed_rpm", "Torque_Nm"];
-    opts.VariableTypes = ["double", "double"];
-    % Setup rules for import
-    opts.MissingRule = "omitrow";
-    opts = setvaropts(opts, [1, 2], "TreatAsMissing", '');
-    % Import the data
-    data = readtable(workbookFile, opts, "UseExcel", false);
-    for idx = 2:length(startRow)
-        opts.DataRange = "A" + startRow(idx) + ":B" + endRow(idx);
-        tb = readtable(workbookFile, opts, "UseExcel", false);
-        data = [data; tb]; %#ok<AGROW>
-    end
-end
-
-%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
-function [data] = read_info(workbookFile,sheetName,startRow,endRow)
-    % Input handling
-    % If no sheet is specified, read first sheet
-    if nargin == 1 || isempty(sheetName)
-        sheetName = 1;
-    end
-    % If row start and end points are not specified, define defaults
-    if nargin <= 3
-        startRow = 2;
-        endRow = 10000;
-    end
-    % Setup the Import Options
-    opts = spreadsheetImportOptions("NumVariables", 2);
-    % Specify sheet and range
-    opts.Sheet = sheetName;
-    opts.DataRange = "B" + startRow(1) + ":C" + endRow(1);
-    % Specify column names and types
-    opts.VariableNames = ["Variable", "Value"];
-    opts.VariableTypes = ["string", "string"];
-    % Setup rules for import
-    opts.MissingRule = "omitrow";
-    opts = setvaropts(opts, [1, 2], "TreatAsMissing", '');
-    % Import the data
-    data = readtable(workbookFile, opts, "UseExcel", false);
-    for idx = 2:length(startRow)
-        opts.DataRange = "A" + startRow(idx) + ":B" + endRow(idx);
-        tb = readtable(workbookFile, opts, "UseExcel", false);
-        data = [data; tb]; %#ok<AGROW>
-    end
-end
\ No newline at end of file
+GRAVITY = 9.81
+
+# the vehicle values of the original script, any of which can be overridden by the vehicle spec
+DEFAULT_SPEC = {
+    "name": "Formula 1",
+    "type": "Open Wheel",
+
+    # mass
+    "mass": 650,  # kg
+    "front_mass_distribution": 0.45,
+
+    # wheelbase
+    "wheelbase": 3,  # m
+
+    # steering rack ratio
+    "steering_rack_ratio": 1,
+
+    # aerodynamics
+    "lift_coefficient": -4.8,  # + = lift, - = down force
+    "drag_coefficient": -1.2,
+    "lift_coefficient_factor": 1,
+    "drag_coefficient_factor": 1,
+    "front_aero_distribution": 0.5,
+    "frontal_area": 1,  # m^2
+    "air_density": 1.225,  # kg/m^3
+
+    # brakes
+    "disc_outer_diameter": 0.25,  # m
+    "pad_height": 0.04,  # m
+    "pad_friction_coefficient": 0.45,
+    "caliper_number_of_pistons": 6,
+    "caliper_piston_diameter": 40,  # mm
+    "master_cylinder_piston_diameter": 25,  # mm
+    "pedal_ratio": 4,
+
+    # tyres
+    "grip_factor": 1,
+    "tyre_radius": 0.33,  # m
+    "rolling_resistance": -0.001,
+    "longitudinal_friction_coefficient": 2,
+    "longitudinal_friction_load_rating": 250,  # kg
+    "longitudinal_friction_sensitivity": 0.0001,  # 1/N
+    "lateral_friction_coefficient": 2,
+    "lateral_friction_load_rating": 250,  # kg
+    "lateral_friction_sensitivity": 0.0001,  # 1/N
+    "front_cornering_stiffness": 800,  # N/deg
+    "rear_cornering_stiffness": 1000,  # N/deg
+
+    # engine
+    "power_factor": 1,
+    "thermal_efficiency": 0.35,
+    "fuel_lhv": 4.72E+07,  # J/kg
+
+    # drive train
+    "drive": "RWD",
+    "gear_shift_time": 0.01,  # s
+    "primary_gear_efficiency": 1,
+    "final_gear_efficiency": 0.92,
+    "gearbox_efficiency": 0.98,
+    "primary_gear_reduction": 1,
+    "final_gear_reduction": 7,
+    "gear_ratios": [2.57, 2.11, 1.75, 1.46, 1.29, 1.12, 1],
+}
+
+TRACTION_SPEED_STEP = 0.5 / 3.6  # m/s between the speeds of the tractive force curve
+GGV_SPEED_STEP = 2  # m/s between the speeds of the GGV map
+GGV_POINTS = 45  # points on each half of the friction ellipse
+
+# every array of the model, which are saved by 'save'
+ARRAYS = [
+    "engine_speed_curve", "engine_torque_curve", "engine_power_curve",
+    "vehicle_speed_gear", "wheel_torque_gear",
+    "vehicle_speed", "gear", "fx_gear", "fx_engine", "engine_speed", "wheel_torque", "engine_torque", "engine_power",
+    "shift_points", "arrive_points", "rev_drops",
+    "fz_aero", "fz_total", "fz_tyre", "fx_aero", "fx_roll", "fx_tyre",
+    "ggv_speed", "ay_max", "ax_tyre_max_acc", "ax_tyre_max_dec", "ax_power_limit", "ax_drag", "ggv"
+]
+
+
+class VehicleModel:
+    def __init__(self, spec: Dict):
+        """
+        Vehicle model for lap time simulation, calculated from a vehicle spec as in OpenVEHICLE. The model is made up
+        of the brake model, the driveline (the gear and tractive force of the engine at every speed), the shift
+        points and rev drops, the aero, rolling resistance and tyre forces at every speed, and the GGV map: the
+        friction ellipse of longitudinal and lateral accelerations available at each speed.
+
+        The spec is a dictionary of the values in DEFAULT_SPEC, where any missing value takes the default, along with
+        the engine curve, which has no default: 'engine_speed' (rpm) and 'engine_torque' (Nm) lists.
+
+        Every part of the model is a NumPy array, with one row per speed, so the model is calculated without looping
+        over the speeds and can be saved to and loaded from an .npz file with 'save' and 'load'.
+
+        :param spec: Dictionary describing the vehicle
+        """
+        missing = [key for key in ["engine_speed", "engine_torque"] if key not in spec]
+        if missing:
+            raise ValueError("Vehicle spec is missing {}".format(", ".join(missing)))
+        unknown = [key for key in spec if key not in DEFAULT_SPEC and key not in ["engine_speed", "engine_torque"]]
+        if unknown:
+            raise ValueError("Unknown vehicle spec values {}".format(", ".join(unknown)))
+
+        self.spec: Dict = {**DEFAULT_SPEC, **spec}
+        self.__set_constants()
+        self.__calculate_brakes()
+        self.__calculate_driveline()
+        self.__calculate_shift_points()
+        self.__calculate_forces()
+        self.__calculate_ggv()
+
+    @staticmethod
+    def from_json(path: str) -> "VehicleModel":
+        """
+        Create a vehicle model from a JSON file of the vehicle spec.
+
+        :param path: Path of the JSON file
+        :return: The vehicle model
+        """
+        with open(path) as file:
+            return VehicleModel(json.loads(file.read()))
+
+    def save(self, path: str):
+        """
+        Save the vehicle model to an .npz file, which can be loaded with 'load' without calculating the model again.
+
+        :param path: Path of the .npz file
+        """
+        np.savez(path, spec=json.dumps(self.spec), **{name: getattr(self, name) for name in ARRAYS})
+
+    @staticmethod
+    def load(path: str) -> "VehicleModel":
+        """
+        Load a vehicle model saved with 'save'.
+
+        :param path: Path of the .npz file
+        :return: The vehicle model
+        """
+        with np.load(path) as data:
+            model = VehicleModel.__new__(VehicleModel)
+            model.spec = json.loads(str(data["spec"]))
+            for name in ARRAYS:
+                setattr(model, name, data[name])
+
+        model.__set_constants()
+        model.__calculate_brakes()
+        return model
+
+    def get_max_lateral_acceleration(self, speed: np.ndarray) -> np.ndarray:
+        """
+        :param speed: Array of speeds (m/s)
+        :return: Array of the maximum lateral acceleration available from the tyres at each speed (m/s^2)
+        """
+        return np.interp(speed, self.ggv_speed, self.ay_max)
+
+    def get_max_acceleration(self, speed: np.ndarray, lateral_acceleration: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Get the maximum longitudinal acceleration at each speed, limited by both the tyres and the engine and
+        including the drag of the car. The tyre limit is reduced by the lateral acceleration following the friction
+        ellipse.
+
+        :param speed: Array of speeds (m/s)
+        :param lateral_acceleration: Array of the lateral acceleration at each speed (m/s^2), defaults to 0
+        :return: Array of longitudinal accelerations (m/s^2), negative where drag outweighs the available traction
+        """
+        tyre = np.interp(speed, self.ggv_speed, self.ax_tyre_max_acc) * self.__get_ellipse_factor(
+            speed, lateral_acceleration
+        )
+        power = np.interp(speed, self.ggv_speed, self.ax_power_limit)
+        return np.minimum(tyre, power) + np.interp(speed, self.ggv_speed, self.ax_drag)
+
+    def get_max_deceleration(self, speed: np.ndarray, lateral_acceleration: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Get the maximum longitudinal deceleration at each speed from the tyres and the drag of the car, reduced by
+        the lateral acceleration following the friction ellipse.
+
+        :param speed: Array of speeds (m/s)
+        :param lateral_acceleration: Array of the lateral acceleration at each speed (m/s^2), defaults to 0
+        :return: Array of longitudinal accelerations (m/s^2), negative as they slow the car
+        """
+        tyre = np.interp(speed, self.ggv_speed, self.ax_tyre_max_dec) * self.__get_ellipse_factor(
+            speed, lateral_acceleration
+        )
+        return tyre + np.interp(speed, self.ggv_speed, self.ax_drag)
+
+    def __get_ellipse_factor(self, speed: np.ndarray, lateral_acceleration: Optional[np.ndarray]) -> np.ndarray:
+        if lateral_acceleration is None:
+            return np.ones(np.shape(speed))
+        ratio = np.abs(lateral_acceleration) / self.get_max_lateral_acceleration(speed)
+        return np.sqrt(np.maximum(1 - np.square(ratio), 0))
+
+    def __set_constants(self):
+        spec = self.spec
+        self.name: str = spec["name"]
+        self.mass: float = spec["mass"]
+        self.tyre_radius: float = spec["tyre_radius"]
+        self.gear_ratios: np.ndarray = np.asarray(spec["gear_ratios"], dtype=np.float64)
+        self.gear_count: int = len(self.gear_ratios)
+
+        # share of the weight and aero load on the driven wheels
+        if spec["drive"] == "RWD":
+            self.factor_drive: float = 1 - spec["front_mass_distribution"]
+            self.factor_aero: float = 1 - spec["front_aero_distribution"]
+            self.driven_wheels: int = 2
+        elif spec["drive"] == "FWD":
+            self.factor_drive = spec["front_mass_distribution"]
+            self.factor_aero = spec["front_aero_distribution"]
+            self.driven_wheels = 2
+        elif spec["drive"] == "AWD":
+            self.factor_drive = 1
+            self.factor_aero = 1
+            self.driven_wheels = 4
+        else:
+            raise ValueError("Unknown drive '{}', expected RWD, FWD or AWD".format(spec["drive"]))
+
+        # aero coefficients multiplied out, so the forces are these times the speed squared
+        aero = 0.5 * spec["air_density"] * spec["frontal_area"]
+        self.lift: float = aero * spec["lift_coefficient_factor"] * spec["lift_coefficient"]
+        self.drag: float = aero * spec["drag_coefficient_factor"] * spec["drag_coefficient"]
+
+    def __calculate_brakes(self):
+        spec = self.spec
+        piston_diameter = spec["caliper_piston_diameter"] / 1000
+        master_diameter = spec["master_cylinder_piston_diameter"] / 1000
+        self.brake_piston_area: float = spec["caliper_number_of_pistons"] * math.pi * piston_diameter ** 2 / 4
+        self.brake_master_area: float = math.pi * master_diameter ** 2 / 4
+        # brake torque per unit of pad force, and pedal force per unit of brake pressure
+        effective_radius = spec["disc_outer_diameter"] / 2 - spec["pad_height"] / 2
+        self.brake_beta: float = spec["tyre_radius"] / effective_radius / self.brake_piston_area / spec[
+            "pad_friction_coefficient"] / 4
+        self.brake_phi: float = self.brake_master_area / spec["pedal_ratio"] * 2
+
+    def __calculate_driveline(self):
+        spec = self.spec
+        self.engine_speed_curve: np.ndarray = np.asarray(spec["engine_speed"], dtype=np.float64)  # rpm
+        self.engine_torque_curve: np.ndarray = np.asarray(spec["engine_torque"], dtype=np.float64)  # Nm
+        self.engine_power_curve: np.ndarray = self.engine_torque_curve * self.engine_speed_curve * 2 * math.pi / 60  # W
+
+        # overall reduction and efficiency from the engine to the wheels in each gear
+        reduction = spec["primary_gear_reduction"] * self.gear_ratios * spec["final_gear_reduction"]
+        efficiency = spec["primary_gear_efficiency"] * spec["gearbox_efficiency"] * spec["final_gear_efficiency"]
+
+        # vehicle speed and wheel torque in each gear (columns) at each point of the engine curve (rows)
+        wheel_speed_gear = self.engine_speed_curve[:, np.newaxis] / reduction
+        self.vehicle_speed_gear: np.ndarray = wheel_speed_gear * 2 * math.pi / 60 * self.tyre_radius
+        self.wheel_torque_gear: np.ndarray = self.engine_torque_curve[:, np.newaxis] * reduction * efficiency
+
+        v_min = np.min(self.vehicle_speed_gear)
+        v_max = np.max(self.vehicle_speed_gear)
+        vehicle_speed = np.linspace(v_min, v_max, int((v_max - v_min) / TRACTION_SPEED_STEP))
+
+        # the tractive force of each gear at each speed. The engine speed at a vehicle speed in a gear is the vehicle
+        # speed over the gear's speed per rpm, so every gear is one interpolation of the engine curve, and the
+        # force is 0 outside the engine's rev range
+        speed_per_rpm = 2 * math.pi / 60 * self.tyre_radius / reduction
+        engine_speed = vehicle_speed[:, np.newaxis] / speed_per_rpm
+        torque = np.interp(engine_speed, self.engine_speed_curve, self.engine_torque_curve, left=0, right=0)
+        self.fx_gear: np.ndarray = torque * reduction * efficiency / self.tyre_radius
+
+        # the best gear at each speed, the lowest gear where two are equal
+        gear = np.argmax(self.fx_gear, axis=1)
+        fx_engine = self.fx_gear[np.arange(len(vehicle_speed)), gear]
+
+        # a point at 0 speed for interpolating at low speeds
+        self.vehicle_speed: np.ndarray = np.concatenate([[0], vehicle_speed])
+        self.gear: np.ndarray = np.concatenate([gear[:1], gear]) + 1  # gears are numbered from 1
+        self.fx_engine: np.ndarray = np.concatenate([fx_engine[:1], fx_engine])
+
+        gear_reduction = reduction[self.gear - 1]
+        self.engine_speed: np.ndarray = gear_reduction * self.vehicle_speed / self.tyre_radius * 60 / 2 / math.pi
+        self.wheel_torque: np.ndarray = self.fx_engine * self.tyre_radius
+        self.engine_torque: np.ndarray = self.wheel_torque / gear_reduction / efficiency
+        self.engine_power: np.ndarray = self.engine_torque * self.engine_speed * 2 * math.pi / 60
+
+    def __calculate_shift_points(self):
+        # the speeds either side of every gear change, the engine speed before the change is the shift point and
+        # after it is the arrive point
+        gear_change = np.diff(self.gear) != 0
+        either_side = np.concatenate([gear_change, [False]]) | np.concatenate([[False], gear_change])
+        engine_speed_gear_change = self.engine_speed[either_side]
+
+        self.shift_points: np.ndarray = engine_speed_gear_change[0::2]
+        self.arrive_points: np.ndarray = engine_speed_gear_change[1::2]
+        self.rev_drops: np.ndarray = self.shift_points - self.arrive_points
+
+    def __calculate_forces(self):
+        spec = self.spec
+        speed_sq = np.square(self.vehicle_speed)
+
+        # z axis
+        fz_mass = -self.mass * GRAVITY
+        self.fz_aero: np.ndarray = self.lift * speed_sq
+        self.fz_total: np.ndarray = fz_mass + self.fz_aero
+        self.fz_tyre: np.ndarray = (self.factor_drive * fz_mass + self.factor_aero * self.fz_aero) / self.driven_wheels
+
+        # x axis
+        self.fx_aero: np.ndarray = self.drag * speed_sq
+        self.fx_roll: np.ndarray = spec["rolling_resistance"] * np.abs(self.fz_total)
+        load = np.abs(self.fz_tyre)
+        self.fx_tyre: np.ndarray = self.driven_wheels * (
+            spec["longitudinal_friction_coefficient"]
+            + spec["longitudinal_friction_sensitivity"] * (spec["longitudinal_friction_load_rating"] * GRAVITY - load)
+        ) * load
+
+    def __calculate_ggv(self):
+        spec = self.spec
+
+        # lateral and longitudinal tyre coefficients
+        dmy = spec["grip_factor"] * spec["lateral_friction_sensitivity"]
+        muy = spec["grip_factor"] * spec["lateral_friction_coefficient"]
+        ny = spec["lateral_friction_load_rating"] * GRAVITY
+        dmx = spec["grip_factor"] * spec["longitudinal_friction_sensitivity"]
+        mux = spec["grip_factor"] * spec["longitudinal_friction_coefficient"]
+        nx = spec["longitudinal_friction_load_rating"] * GRAVITY
+
+        # weight on a flat track, with no banking or inclination
+        wz = self.mass * GRAVITY
+        wx = 0
+
+        v_max = self.vehicle_speed[-1]
+        self.ggv_speed: np.ndarray = np.concatenate([np.arange(0, v_max, GGV_SPEED_STEP), [v_max]])
+        speed_sq = np.square(self.ggv_speed)
+
+        aero_df = self.lift * speed_sq
+        aero_dr = self.drag * speed_sq
+        roll_dr = spec["rolling_resistance"] * np.abs(-aero_df + wz)
+        # normal load on the driven wheels
+        wd = (self.factor_drive * wz + (-self.factor_aero * aero_df)) / self.driven_wheels
+        load = wz - aero_df
+
+        self.ax_drag: np.ndarray = (aero_dr + roll_dr + wx) / self.mass
+        self.ay_max: np.ndarray = 1 / self.mass * (muy + dmy * (ny - load / 4)) * load
+        self.ax_tyre_max_acc: np.ndarray = 1 / self.mass * (mux + dmx * (nx - wd)) * wd * self.driven_wheels
+        self.ax_tyre_max_dec: np.ndarray = -1 / self.mass * (mux + dmx * (nx - load / 4)) * load
+        self.ax_power_limit: np.ndarray = 1 / self.mass * np.interp(
+            self.ggv_speed, self.vehicle_speed, spec["power_factor"] * self.fx_engine
+        )
+
+        # points around the friction ellipse at each speed (rows), from full lateral acceleration through the
+        # acceleration half and back through the deceleration half
+        cos = np.cos(np.radians(np.linspace(0, 180, GGV_POINTS)))
+        ellipse = np.sqrt(1 - np.square(cos))
+        ay = self.ay_max[:, np.newaxis] * cos
+        ax_drag = self.ax_drag[:, np.newaxis]
+        ax_acc = np.minimum(self.ax_tyre_max_acc[:, np.newaxis] * ellipse, self.ax_power_limit[:, np.newaxis]) + ax_drag
+        ax_dec = self.ax_tyre_max_dec[:, np.newaxis] * ellipse + ax_drag
+
+        # (V, 2 * GGV_POINTS - 1, 3) array of the longitudinal acceleration, lateral acceleration and speed
+        self.ggv: np.ndarray = np.stack([
+            np.concatenate([ax_acc, ax_dec[:, 1:]], axis=1),
+            np.concatenate([ay, ay[:, :0:-1]], axis=1),
+            np.repeat(self.ggv_speed[:, np.newaxis], 2 * GGV_POINTS - 1, axis=1)
+        ], axis=-1)
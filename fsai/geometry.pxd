@@ -0,0 +1,10 @@
+# C level helpers of geometry.pyx shared with the other compiled modules
+
+cdef float* prepare_segments(segments, Py_ssize_t segment_count) except NULL
+cdef bint nearest_intersection(float lin_0, float lin_1, float lin_2, float lin_3, float* seg, Py_ssize_t segment_count, float* point,
+                               bint as_closest_point)
+cdef double score_sub_lines(float* sub, float* left_seg, Py_ssize_t left_count, float* right_seg, Py_ssize_t right_count,
+                            double* waypoint_line, double* optimum, bint* sticky)
+cdef float cmin(float a, float b)
+cdef float cmax(float a, float b)
+cdef float cdistance(float a1, float a2, float b1, float b2)
@@ -1,6 +1,7 @@
-from libc.math cimport atan2, round, sin, cos, sqrt, pi, pow
-from libc.stdlib cimport rand, RAND_MAX
+from libc.math cimport atan2, round, sin, cos, sqrt, pi, pow, fabs
+from libc.stdlib cimport rand, RAND_MAX, malloc, free
 import cython
+import numpy as np
 from fsai.path_planning.waypoint import Waypoint
 
 cpdef float distance(a, b):
@@ -112,6 +113,318 @@ cpdef segment_intersections(line, segments):
     return intersections
 
 
+cdef float* prepare_segments(segments, Py_ssize_t segment_count) except NULL:
+    # Precompute the line coefficients and bounds of each segment, since they do not depend on the query line.
+    # Segments given as an array are read through a typed view, lists are read the same way as segment_intersections.
+    # The returned buffer must be freed by the caller.
+    cdef float* seg = <float*> malloc(max(segment_count, 1) * 7 * sizeof(float))
+    if seg == NULL:
+        raise MemoryError()
+
+    cdef double[:, :] segments_view = None
+    if isinstance(segments, np.ndarray):
+        segments_view = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+
+    cdef Py_ssize_t index
+    cdef float seg_0, seg_1, seg_2, seg_3
+    for index in range(segment_count):
+        if segments_view is not None:
+            seg_0 = segments_view[index, 0]
+            seg_1 = segments_view[index, 1]
+            seg_2 = segments_view[index, 2]
+            seg_3 = segments_view[index, 3]
+        else:
+            seg_i = segments[index]
+            seg_0 = seg_i[0]
+            seg_1 = seg_i[1]
+            seg_2 = seg_i[2]
+            seg_3 = seg_i[3]
+        seg[index * 7] = seg_3 - seg_1
+        seg[index * 7 + 1] = seg_0 - seg_2
+        seg[index * 7 + 2] = seg[index * 7] * seg_0 + seg[index * 7 + 1] * seg_1
+        seg[index * 7 + 3] = cmin(seg_0, seg_2)
+        seg[index * 7 + 4] = cmin(seg_1, seg_3)
+        seg[index * 7 + 5] = cmax(seg_0, seg_2)
+        seg[index * 7 + 6] = cmax(seg_1, seg_3)
+    return seg
+
+
+@cython.cdivision(True)
+cdef bint nearest_intersection(float lin_0, float lin_1, float lin_2, float lin_3, float* seg, Py_ssize_t segment_count, float* point,
+                               bint as_closest_point):
+    # Find the intersection of the line with the prepared segments nearest the end of the line (lin_2, lin_3). The
+    # arithmetic mirrors segment_intersections so both give the same points. closest_point never updates the distance
+    # it compares against, so it returns the last point closer than the first rather than the closest; as_closest_point
+    # makes the selection follow closest_point(line[2:4], segment_intersections(line, segments)) for the waypoint
+    # scorer. Returns whether the line intersected any segment, writing the nearest point into point.
+    cdef float min_x_seg = cmin(lin_0, lin_2)
+    cdef float min_y_seg = cmin(lin_1, lin_3)
+    cdef float max_x_seg = cmax(lin_0, lin_2)
+    cdef float max_y_seg = cmax(lin_1, lin_3)
+
+    # convert fixed lines into y=mx+c ordinates
+    cdef float a1 = lin_3 - lin_1
+    cdef float b1 = lin_0 - lin_2
+    cdef float c1 = a1 * lin_0 + b1 * lin_1
+
+    cdef float a2, b2, c2
+    cdef float delta, x, y, dist
+    cdef float nearest_distance = 0
+    cdef float min_x, min_y, max_x, max_y
+    cdef float precision = 1000
+    cdef bint hit = False
+    cdef Py_ssize_t index
+    for index in range(segment_count):
+        a2 = seg[index * 7]
+        b2 = seg[index * 7 + 1]
+        c2 = seg[index * 7 + 2]
+        delta = a1 * b2 - a2 * b1
+
+        if delta != 0:
+            x = (b2 * c1 - b1 * c2) / delta
+            y = (a1 * c2 - a2 * c1) / delta
+
+            # check the point exists within both lines
+            min_x = round(precision * cmax(seg[index * 7 + 3], min_x_seg))
+            min_y = round(precision * cmax(seg[index * 7 + 4], min_y_seg))
+            max_x = round(precision * cmin(seg[index * 7 + 5], max_x_seg))
+            max_y = round(precision * cmin(seg[index * 7 + 6], max_y_seg))
+
+            if min_x <= round(precision * x) <= max_x and min_y <= round(precision * y) <= max_y:
+                dist = cdistance(lin_2, lin_3, x, y)
+                if not hit or dist < nearest_distance:
+                    point[0], point[1] = x, y
+                    if not hit or not as_closest_point:
+                        nearest_distance = dist
+                    hit = True
+    return hit
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef nearest_segment_intersections(lines, segments):
+    # Batched version of segment_intersections. Each of the (M, 4) query lines is tested against all (N, 4)
+    # segments and only the intersection closest to the end of the query line (line[2:4]) is kept, which for the
+    # radar sub-lines is the center of the radar line. Returns the (M, 2) nearest points and an (M,) hit mask,
+    # rows without any intersection are left as nan.
+    cdef double[:, :] lines_view = np.asarray(lines, dtype=np.float64).reshape(-1, 4)
+    cdef Py_ssize_t line_count = lines_view.shape[0]
+    cdef Py_ssize_t segment_count = len(segments)
+
+    # preallocate the outputs so the loop below never touches python objects
+    points = np.full((line_count, 2), np.nan, dtype=np.float64)
+    hits = np.zeros(line_count, dtype=np.uint8)
+    cdef double[:, ::1] points_view = points
+    cdef unsigned char[::1] hits_view = hits
+
+    cdef float* seg = prepare_segments(segments, segment_count)
+    cdef float[2] point
+    cdef Py_ssize_t line_index
+    for line_index in range(line_count):
+        if nearest_intersection(
+                lines_view[line_index, 0], lines_view[line_index, 1], lines_view[line_index, 2], lines_view[line_index, 3],
+                seg, segment_count, point, False):
+            points_view[line_index, 0] = point[0]
+            points_view[line_index, 1] = point[1]
+            hits_view[line_index] = 1
+
+    free(seg)
+    return points, hits.view(np.bool_)
+
+
+cdef double score_sub_lines(float* sub, float* left_seg, Py_ssize_t left_count, float* right_seg, Py_ssize_t right_count,
+                            double* waypoint_line, double* optimum, bint* sticky):
+    # Score a single radar line given as two sub-lines [x, y, cx, cy] packed into sub. Sub-line 0 is intersected with
+    # the left boundary and sub-line 1 with the right, keeping the intersections closest to the center. If a sub-line
+    # does not intersect then the end of the sub-line is used instead, such lines are sticky and the optimum is
+    # pushed to the side that did intersect. Writes the waypoint line, optimum and sticky flag, returning the width.
+    cdef float[2] left_point
+    cdef float[2] right_point
+    cdef bint left_hit = nearest_intersection(sub[0], sub[1], sub[2], sub[3], left_seg, left_count, left_point, True)
+    cdef bint right_hit = nearest_intersection(sub[4], sub[5], sub[6], sub[7], right_seg, right_count, right_point,
+                                               True)
+
+    # use the end of the sub-line as a dummy intersection point
+    if not left_hit:
+        left_point[0], left_point[1] = sub[0], sub[1]
+    if not right_hit:
+        right_point[0], right_point[1] = sub[4], sub[5]
+
+    optimum[0] = 0.5
+    if left_hit and not right_hit:
+        optimum[0] = 0
+    elif right_hit and not left_hit:
+        optimum[0] = 1
+    sticky[0] = not (left_hit and right_hit)
+
+    waypoint_line[0] = left_point[0]
+    waypoint_line[1] = left_point[1]
+    waypoint_line[2] = right_point[0]
+    waypoint_line[3] = right_point[1]
+    return cdistance(left_point[0], left_point[1], right_point[0], right_point[1])
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cpdef score_radar_lines(lines, left_boundary, right_boundary, double bias, double bias_strength):
+    # Score every radar line of a fan in one pass. Each radar line is a pair of sub-lines [x, y, cx, cy] stemming
+    # from the center of the line, given as an (M, 2, 4) array or list of pairs. Sub-line 0 is intersected with the
+    # left boundary and sub-line 1 with the right, keeping the intersections closest to the center. If a sub-line
+    # does not intersect then the end of the sub-line is used instead, such lines are sticky and the optimum is
+    # pushed to the side that did intersect. The width of the line is then weighted by the bias of the line.
+    # Returns the (M, 4) waypoint lines, (M,) optimums, (M,) sticky flags and (M,) weighted widths.
+    cdef Py_ssize_t line_count = len(lines)
+    cdef double[:, :, :] lines_view = None
+    if isinstance(lines, np.ndarray):
+        lines_view = np.asarray(lines, dtype=np.float64).reshape(-1, 2, 4)
+
+    waypoint_lines = np.empty((line_count, 4), dtype=np.float64)
+    optimums = np.empty(line_count, dtype=np.float64)
+    sticky = np.empty(line_count, dtype=np.uint8)
+    widths = np.empty(line_count, dtype=np.float64)
+    cdef double[:, ::1] waypoint_lines_view = waypoint_lines
+    cdef double[::1] optimums_view = optimums
+    cdef unsigned char[::1] sticky_view = sticky
+    cdef double[::1] widths_view = widths
+
+    cdef Py_ssize_t left_count = len(left_boundary)
+    cdef Py_ssize_t right_count = len(right_boundary)
+    cdef float* left_seg = prepare_segments(left_boundary, left_count)
+    cdef float* right_seg = prepare_segments(right_boundary, right_count)
+
+    cdef float[8] sub
+    cdef double[4] waypoint_line
+    cdef double optimum
+    cdef bint is_sticky
+    cdef double width, bias_angle, bias_value
+    cdef Py_ssize_t i, j
+    for i in range(line_count):
+        if lines_view is not None:
+            for j in range(4):
+                sub[j] = lines_view[i, 0, j]
+                sub[j + 4] = lines_view[i, 1, j]
+        else:
+            line = lines[i]
+            line_a, line_b = line[0], line[1]
+            for j in range(4):
+                sub[j] = line_a[j]
+                sub[j + 4] = line_b[j]
+
+        width = score_sub_lines(sub, left_seg, left_count, right_seg, right_count, waypoint_line, &optimum, &is_sticky)
+        for j in range(4):
+            waypoint_lines_view[i, j] = waypoint_line[j]
+        optimums_view[i] = optimum
+        sticky_view[i] = is_sticky
+
+        # we can then create a new heuristic distance which is the current distance affected by the bias
+        bias_angle = ((i + 0.5) / line_count * 2 - 1)
+        bias_value = 1 - fabs(bias_angle - bias)
+        if bias_value < 0:
+            bias_value = 0
+        width -= width * bias_value * bias_strength
+        widths_view[i] = width
+
+    free(left_seg)
+    free(right_seg)
+    return waypoint_lines, optimums, sticky.view(np.bool_), widths
+
+
+@cython.cdivision(True)
+cdef double score_radar_angle(double x, double y, double angle, double offset, double spacing, double length,
+                              double angle_span, bint reverse, float* left_seg, Py_ssize_t left_count,
+                              float* right_seg, Py_ssize_t right_count, double bias, double bias_strength,
+                              double* waypoint_line, double* optimum, bint* sticky):
+    # Create the radar line whose stem line is offset from the heading angle, then score it as score_radar_lines
+    # would. The bias angle is taken from the offset across the span rather than the index of the line so that it
+    # is continuous. This is the same line as the one __create_radar_lines would give for the offset.
+    cdef double a = angle + offset
+    cdef double cos_a = cos(a)
+    cdef double sin_a = sin(a)
+    cdef double px = x + spacing * cos_a
+    cdef double py = y + spacing * sin_a
+    cdef double half = length / 2
+    if reverse:
+        half = -half
+
+    cdef float[8] sub
+    sub[0], sub[1], sub[2], sub[3] = px + half * sin_a, py - half * cos_a, px, py
+    sub[4], sub[5], sub[6], sub[7] = px - half * sin_a, py + half * cos_a, px, py
+    cdef double width = score_sub_lines(sub, left_seg, left_count, right_seg, right_count, waypoint_line, optimum, sticky)
+
+    cdef double bias_value = 0
+    if angle_span > 0:
+        bias_value = 1 - fabs(2 * offset / angle_span - bias)
+        if bias_value < 0:
+            bias_value = 0
+    return width - width * bias_value * bias_strength
+
+
+@cython.cdivision(True)
+cpdef search_radar_line(point, double angle, double spacing, double length, int line_count, double angle_span,
+                        double tolerance, bint reverse, left_boundary, right_boundary, double bias,
+                        double bias_strength):
+    # Adaptive search for the most perpendicular radar line. A coarse fan of line_count lines is scored first, then
+    # each round scores a few lines either side of the best line so far, between it and the lines tested next to it
+    # in the previous round. This shrinks the gap between tested angles by a constant factor each round and stops
+    # once the gap is within the tolerance. Returns the waypoint line, optimum and sticky flag of the best line.
+    if not tolerance > 0:
+        raise ValueError("The radar tolerance must be positive, got {}".format(tolerance))
+
+    cdef double x = point[0]
+    cdef double y = point[1]
+    cdef Py_ssize_t left_count = len(left_boundary)
+    cdef Py_ssize_t right_count = len(right_boundary)
+    cdef float* left_seg = prepare_segments(left_boundary, left_count)
+    cdef float* right_seg = prepare_segments(right_boundary, right_count)
+
+    cdef double[4] waypoint_line
+    cdef double[4] best_line
+    cdef double optimum, best_optimum = 0.5
+    cdef bint is_sticky, best_sticky = False
+    cdef double width, best_width = 0, offset, best_offset = 0, round_offset
+    cdef bint found = False
+    cdef Py_ssize_t i, j, k
+
+    if line_count < 2:
+        line_count = 2
+    cdef double step = angle_span / (line_count - 1)
+    cdef int refine_count = (line_count - 1) // 2
+    if refine_count < 1:
+        refine_count = 1
+
+    # coarse search over an evenly spaced fan of lines, the first line wins any ties as with a fixed fan
+    for i in range(line_count):
+        offset = -angle_span / 2 + i * step
+        width = score_radar_angle(x, y, angle, offset, spacing, length, angle_span, reverse, left_seg, left_count,
+                                  right_seg, right_count, bias, bias_strength, waypoint_line, &optimum, &is_sticky)
+        if not found or width < best_width:
+            found = True
+            best_width, best_offset, best_optimum, best_sticky = width, offset, optimum, is_sticky
+            for j in range(4):
+                best_line[j] = waypoint_line[j]
+
+    # refine around the best line, testing from the left most line to the right most line of each round
+    while step > tolerance:
+        step /= refine_count + 1
+        round_offset = best_offset
+        for k in range(-refine_count, refine_count + 1):
+            offset = round_offset + k * step
+            if k == 0 or fabs(offset) > angle_span / 2:
+                continue
+            width = score_radar_angle(x, y, angle, offset, spacing, length, angle_span, reverse, left_seg,
+                                      left_count, right_seg, right_count, bias, bias_strength, waypoint_line,
+                                      &optimum, &is_sticky)
+            if width < best_width:
+                best_width, best_offset, best_optimum, best_sticky = width, offset, optimum, is_sticky
+                for j in range(4):
+                    best_line[j] = waypoint_line[j]
+
+    free(left_seg)
+    free(right_seg)
+    return [best_line[0], best_line[1], best_line[2], best_line[3]], best_optimum, best_sticky
+
+
 cpdef rotate_points(points, float rotation, rotation_center):
     rotated_points = []
 
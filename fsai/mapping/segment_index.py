@@ -0,0 +1,94 @@
+import math
+from typing import Dict, List, Tuple
+
+from fsai import geometry
+
+
+class SegmentIndex:
+    def __init__(self, lines: List[List[float]], cell_size: float = 10):
+        """
+        A uniform grid over a set of boundary lines, used to quickly find the lines around a point. Filtering a
+        boundary with 'geometry.filter_lines_by_distance' loops through every line in the boundary which becomes
+        costly on long tracks. Instead each line is registered in every grid cell its bounding box covers, so a
+        query only has to look at the cells surrounding the query area, keeping the cost independent of the size
+        of the track. The index should be built once per track, for example from the output of
+        'Track.get_boundary()'.
+
+        :param lines: List of lines [x1, y1, x2, y2] to index.
+        :param cell_size: Width of each grid cell. This should be around the search radius used to query the index.
+        """
+        self.lines: List[List[float]] = lines
+        self.cell_size: float = cell_size
+
+        # bounding box of each line, used for the exact check of bounding box queries
+        self.__bounds: List[Tuple[float, float, float, float]] = []
+        self.__cells: Dict[Tuple[int, int], List[int]] = {}
+
+        for index in range(len(lines)):
+            ax, ay, bx, by = lines[index][0], lines[index][1], lines[index][2], lines[index][3]
+            bounds = (min(ax, bx), min(ay, by), max(ax, bx), max(ay, by))
+            self.__bounds.append(bounds)
+
+            min_cx, min_cy = self.__cell(bounds[0], bounds[1])
+            max_cx, max_cy = self.__cell(bounds[2], bounds[3])
+            for cx in range(min_cx, max_cx + 1):
+                for cy in range(min_cy, max_cy + 1):
+                    self.__cells.setdefault((cx, cy), []).append(index)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __cell(self, x: float, y: float) -> Tuple[int, int]:
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def candidates(self, min_x: float, min_y: float, max_x: float, max_y: float) -> List[int]:
+        """
+        Get the indices of all lines registered in the grid cells overlapping the given area. This is a superset of
+        the lines within the area, the indices are sorted so that the lines keep the order of the original boundary.
+
+        :param min_x: Left of the area
+        :param min_y: Bottom of the area
+        :param max_x: Right of the area
+        :param max_y: Top of the area
+        :return: Sorted list of line indices
+        """
+        min_cx, min_cy = self.__cell(min_x, min_y)
+        max_cx, max_cy = self.__cell(max_x, max_y)
+
+        candidates = set()
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                cell = self.__cells.get((cx, cy))
+                if cell is not None:
+                    candidates.update(cell)
+        return sorted(candidates)
+
+    def filter_lines_by_distance(self, point: List[float], distance: float) -> List[List[float]]:
+        """
+        Drop in replacement for 'geometry.filter_lines_by_distance' which returns the same lines, in the same order.
+        Only the lines in the grid cells around the point are checked.
+
+        :param point: Center of the search area
+        :param distance: Search radius
+        :return: List of lines with at least one end closer than the given distance to the point
+        """
+        candidates = self.candidates(point[0] - distance, point[1] - distance, point[0] + distance, point[1] + distance)
+        return geometry.filter_lines_by_distance(point, distance, [self.lines[i] for i in candidates])
+
+    def filter_lines_by_bbox(self, min_x: float, min_y: float, max_x: float, max_y: float) -> List[List[float]]:
+        """
+        Get the lines whose bounding box overlaps the given bounding box. When querying with the bounding box of a
+        shape, every line that could intersect the shape is returned.
+
+        :param min_x: Left of the bounding box
+        :param min_y: Bottom of the bounding box
+        :param max_x: Right of the bounding box
+        :param max_y: Top of the bounding box
+        :return: List of lines overlapping the bounding box
+        """
+        lines = []
+        for i in self.candidates(min_x, min_y, max_x, max_y):
+            bounds = self.__bounds[i]
+            if bounds[0] <= max_x and bounds[2] >= min_x and bounds[1] <= max_y and bounds[3] >= min_y:
+                lines.append(self.lines[i])
+        return lines
@@ -0,0 +1,92 @@
+from libc.math cimport sqrt
+import cython
+
+# Compiled velocity profile of GGVLapTime.solve_velocity_profile. Each point's acceleration depends on the speed the
+# car reaches it at, so the passes are solved in order along the loop, one point at a time.
+
+# columns of the packed lookup table, see GGVLapTime.__init__
+cdef enum:
+    INVERSE_AY_MAX = 0
+    INVERSE_AY_MAX_SLOPE = 1
+    TYRE = 2
+    TYRE_SLOPE = 3
+    POWER = 4
+    DRAG = 5
+    DRAG_SLOPE = 6
+    COLUMNS = 7
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef inline double get_acceleration(double speed_sq, double curvature, const double* table, Py_ssize_t offset,
+                                    Py_ssize_t speed_count, double inverse_step) noexcept nogil:
+    # linear interpolation of the lookup table, the offset selecting the accelerating or braking rows
+    cdef double position = speed_sq * inverse_step
+    cdef Py_ssize_t index = <Py_ssize_t> position
+    if index > speed_count - 1:
+        index = speed_count - 1
+    cdef double fraction = position - index
+    cdef const double* row = table + (index + offset) * COLUMNS
+
+    # the longitudinal grip left over from cornering follows the friction ellipse
+    cdef double ratio = (row[INVERSE_AY_MAX_SLOPE] * fraction + row[INVERSE_AY_MAX]) * speed_sq
+    ratio *= curvature
+    ratio = 1 - ratio * ratio
+    if ratio < 0:
+        ratio = 0
+    cdef double acceleration = sqrt(ratio) * (row[TYRE_SLOPE] * fraction + row[TYRE])
+
+    # the engine limit is taken at the row below, which is at most a lookup step out
+    if row[POWER] < acceleration:
+        acceleration = row[POWER]
+    return acceleration + (row[DRAG_SLOPE] * fraction + row[DRAG])
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef void solve_passes(
+        double[:, ::1] speeds_sq,
+        const double[:, ::1] apex_sq,
+        const double[:, ::1] curvatures,
+        const double[:, ::1] lengths,
+        const double[:, ::1] table,
+        double speed_sq_step
+):
+    # Solve the squared speeds of every (N + 1,) row of speeds_sq, each row being a loop unrolled from its slowest
+    # apex with the start repeated at the end. The forward pass accelerates from the start through the (N + 1,)
+    # curvatures and the (N,) doubled lengths, capped at the (N + 1,) apex_sq, then the backward pass brakes from the
+    # end, and each speed is the lower of the two. The table holds the accelerating rows followed by the braking rows.
+    cdef Py_ssize_t row, j
+    cdef Py_ssize_t count = lengths.shape[1]
+    cdef Py_ssize_t speed_count = table.shape[0] // 2
+    cdef double inverse_step = 1 / speed_sq_step
+    cdef double speed_sq, clamped = 0
+
+    with nogil:
+        for row in range(speeds_sq.shape[0]):
+            # v_{i+1}^2 = v_i^2 + 2 a(v_i, k_i) ds_i, capped at every apex. A pass that can't make it through a corner
+            # keeps going from a negative speed, which is taken as stopped and never finishes the lap
+            speed_sq = apex_sq[row, 0]
+            for j in range(count + 1):
+                if j > 0:
+                    speed_sq += get_acceleration(
+                        clamped, curvatures[row, j - 1], &table[0, 0], 0, speed_count, inverse_step
+                    ) * lengths[row, j - 1]
+                    if apex_sq[row, j] < speed_sq:
+                        speed_sq = apex_sq[row, j]
+                clamped = speed_sq if speed_sq > 0 else 0
+                speeds_sq[row, j] = clamped
+
+            # braking is accelerating along the reversed loop, from the far end of each segment
+            speed_sq = apex_sq[row, count]
+            for j in range(count, -1, -1):
+                if j < count:
+                    speed_sq += get_acceleration(
+                        clamped, curvatures[row, j + 1], &table[0, 0], speed_count, speed_count, inverse_step
+                    ) * lengths[row, j]
+                    if apex_sq[row, j] < speed_sq:
+                        speed_sq = apex_sq[row, j]
+                clamped = speed_sq if speed_sq > 0 else 0
+                if clamped < speeds_sq[row, j]:
+                    speeds_sq[row, j] = clamped
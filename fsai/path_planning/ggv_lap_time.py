@@ -0,0 +1,176 @@
+from typing import Tuple
+
+import numpy as np
+
+from fsai.car.physics.openVehicle import VehicleModel
+from fsai.path_planning.ggv_kernel import solve_passes
+from fsai.path_planning.waypoint_array import WaypointArray
+
+DEFAULT_SPEED_SQ_STEP = 1.0  # m^2/s^2 between the squared speeds of the lookup table
+
+
+def get_curvatures(points: np.ndarray) -> np.ndarray:
+    """
+    Get the curvature of the circle through each point and the points either side of it, treating the points as a
+    closed loop. The curvature is 2 sin(angle) / chord of the triangle of the three points, which is 0 for collinear
+    points rather than an infinite radius.
+
+    :param points: (..., N, 2) array of points around the track
+    :return: (..., N) array of curvatures (1/m)
+    """
+    points = np.asarray(points, dtype=np.float64)
+    previous = np.roll(points, 1, axis=-2)
+    following = np.roll(points, -1, axis=-2)
+
+    a = points - previous
+    b = following - points
+    cross = a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+    lengths = np.sqrt(
+        np.sum(a * a, axis=-1) * np.sum(b * b, axis=-1) * np.sum(np.square(following - previous), axis=-1)
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        curvatures = np.abs(2 * cross / lengths)
+    # repeated points have no curvature
+    return np.where(lengths > 0, curvatures, 0)
+
+
+class GGVLapTime:
+    def __init__(self, vehicle: VehicleModel, speed_sq_step: float = DEFAULT_SPEED_SQ_STEP):
+        """
+        Quasi-steady-state lap time simulation, as in OpenLAP, constrained by the GGV map of a vehicle. At each point
+        of the racing line the car can corner up to its maximum lateral acceleration, and the longitudinal
+        acceleration and braking available are reduced by the lateral acceleration of the corner following the
+        friction ellipse, limited by the engine's tractive force and offset by the drag. All of these depend on the
+        speed through the aero forces, so they are sampled once into lookup tables and interpolated with index
+        arithmetic rather than a search. The tables are spaced evenly in v^2, which the solver works in and which
+        the aero forces are proportional to, so the grip and drag are interpolated almost exactly.
+
+        :param vehicle: Vehicle model whose GGV map constrains the car
+        :param speed_sq_step: Squared speed between the rows of the lookup table (m^2/s^2)
+        """
+        self.vehicle: VehicleModel = vehicle
+        self.max_speed: float = float(vehicle.ggv_speed[-1])
+        self.speed_sq_step: float = speed_sq_step
+
+        speeds = np.sqrt(np.arange(0, self.max_speed ** 2 + speed_sq_step, speed_sq_step))
+        self.speeds: np.ndarray = speeds
+
+        ay_max = np.interp(speeds, vehicle.ggv_speed, vehicle.ay_max)
+        drag = np.interp(speeds, vehicle.ggv_speed, vehicle.ax_drag)
+        # the braking pass is solved as accelerating along the reversed track, so each lookup table has a row for
+        # accelerating and a row for braking: the inverse of the lateral limit, tyre grip, engine limit and drag,
+        # where braking has no engine limit and the drag helps the brakes
+        tables = [
+            np.stack([1 / ay_max, 1 / ay_max]),
+            np.stack([
+                np.interp(speeds, vehicle.ggv_speed, vehicle.ax_tyre_max_acc),
+                -np.interp(speeds, vehicle.ggv_speed, vehicle.ax_tyre_max_dec)
+            ]),
+            np.stack([np.interp(speeds, vehicle.ggv_speed, vehicle.ax_power_limit), np.full(len(speeds), np.inf)]),
+            np.stack([drag, -drag])
+        ]
+        # the tables are packed side by side with each one's change to the next speed, so a lookup reads one row of
+        # the table and interpolates with a multiply add. The braking rows follow the accelerating rows
+        columns = []
+        for i, table in enumerate(tables):
+            columns.append(table)
+            # the engine limit is taken at the row below rather than interpolated, so has no slope
+            if i != 2:
+                columns.append(np.diff(table, axis=-1, append=table[:, -1:]))
+        self.table: np.ndarray = np.ascontiguousarray(np.stack(columns, axis=-1).reshape(-1, len(columns)))
+
+        # the tightest curvature the car can take at each speed, ay_max / v^2. The apex speed of a corner is the
+        # highest speed it can be taken at, so the curvatures are made non increasing with a cumulative maximum from
+        # the top speed down, which can then be searched
+        with np.errstate(divide="ignore"):
+            max_curvatures = ay_max / np.square(speeds)
+        self.max_curvatures: np.ndarray = np.flip(np.maximum.accumulate(np.flip(max_curvatures)))
+
+    def get_apex_velocities(self, curvatures: np.ndarray) -> np.ndarray:
+        """
+        Get the fastest speed each point can be taken at, where the lateral acceleration v^2 k is the maximum
+        lateral acceleration at that speed, capped at the top speed.
+
+        :param curvatures: (..., N) array of curvatures
+        :return: (..., N) array of apex velocities
+        """
+        # max_curvatures is non increasing, so flipped it is sorted for interpolation
+        return np.interp(curvatures, self.max_curvatures[:0:-1], self.speeds[:0:-1], right=self.speeds[1])
+
+    def solve_velocity_profile(self, curvatures: np.ndarray, lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the velocity profile around a closed loop. The forward pass accelerates from each point as hard as the
+        GGV map allows at that point's speed and curvature, v_{i+1}^2 = v_i^2 + 2 a(v_i, k_i) ds_i, capped at the apex
+        speed of every point, and the backward pass does the same for braking; the profile is the lower of the two.
+        Unlike 'lap_time.solve_velocity_profile' the accelerations depend on the speed, so each pass can't be solved
+        as a cumulative sum and is instead stepped along the loop one point at a time in 'ggv_kernel.solve_passes'.
+        As there, each loop is unrolled from its slowest apex.
+
+        :param curvatures: (..., N) array of curvatures at each point
+        :param lengths: (..., N) array of distances from each point to the next, the last being back to the first
+        :return: (..., N) array of velocities at each point and (...,) array of lap times, inf if the car has to stop
+        """
+        curvatures = np.asarray(curvatures, dtype=np.float64)
+        lengths = np.broadcast_to(np.asarray(lengths, dtype=np.float64), curvatures.shape)
+        count = curvatures.shape[-1]
+        apex = self.get_apex_velocities(curvatures)
+
+        # reorder each loop to start from its slowest apex, with the start repeated at the end to close the loop
+        start = np.argmin(apex, axis=-1)[..., np.newaxis]
+        order = (start + np.arange(count)) % count
+        order = np.concatenate([order, order[..., :1]], axis=-1)
+        curvatures = np.take_along_axis(curvatures, order, axis=-1)
+        apex_sq = np.square(np.take_along_axis(apex, order, axis=-1))
+        lengths = 2 * np.take_along_axis(lengths, order[..., :-1], axis=-1)
+
+        speeds_sq = np.empty(apex_sq.shape)
+        solve_passes(
+            speeds_sq.reshape(-1, count + 1),
+            apex_sq.reshape(-1, count + 1),
+            curvatures.reshape(-1, count + 1),
+            lengths.reshape(-1, count),
+            self.table,
+            self.speed_sq_step
+        )
+        velocities = np.sqrt(speeds_sq)
+
+        # constant acceleration along each segment, so the average speed is the mean of both ends
+        with np.errstate(divide="ignore", invalid="ignore"):
+            times = np.sum(lengths / (velocities[..., :-1] + velocities[..., 1:]), axis=-1)
+        # a car that has to stop never finishes the lap
+        times = np.where(np.any(velocities == 0, axis=-1), np.inf, times)
+
+        # back to the original order
+        unrolled = velocities[..., :-1]
+        velocities = np.empty_like(unrolled)
+        np.put_along_axis(velocities, order[..., :-1], unrolled, axis=-1)
+        return velocities, times
+
+    def evaluate_population(self, lines: np.ndarray, optimums: np.ndarray) -> np.ndarray:
+        """
+        Get the lap time of every racing line in a population, each racing line being a set of optimums along the
+        same closed loop of waypoint lines.
+
+        :param lines: (N, 4) array of waypoint lines, or a WaypointArray
+        :param optimums: (P, N) array of the optimums of each racing line
+        :return: (P,) array of lap times, inf for any racing line that comes to a stop
+        """
+        return self.solve_population(lines, optimums)[1]
+
+    def solve_population(self, lines: np.ndarray, optimums: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the velocity profile and lap time of every racing line in a population. See 'evaluate_population'.
+
+        :param lines: (N, 4) array of waypoint lines, or a WaypointArray
+        :param optimums: (..., N) array of the optimums of each racing line
+        :return: (..., N) array of velocities at each waypoint and (...,) array of lap times
+        """
+        if isinstance(lines, WaypointArray):
+            lines = lines.lines
+        lines = np.asarray(lines, dtype=np.float64).reshape(-1, 4)
+        optimums = np.asarray(optimums, dtype=np.float64)
+
+        start = lines[:, 0:2]
+        points = start + (lines[:, 2:4] - start) * optimums[..., np.newaxis]
+        lengths = np.sqrt(np.sum(np.square(np.roll(points, -1, axis=-2) - points), axis=-1))
+        return self.solve_velocity_profile(get_curvatures(points), lengths)
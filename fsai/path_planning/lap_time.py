@@ -0,0 +1,553 @@
+import math
+from typing import List, Tuple
+
+import numpy as np
+
+from fsai import geometry
+from fsai.path_planning.waypoint_array import WaypointArray
+
+# engine and brake force of the simulated car (advanced.CarPhysics) over its mass
+DEFAULT_MAX_ACCELERATION = 10.0  # m/s^2
+DEFAULT_MAX_BRAKING = 14.0  # m/s^2
+
+
+def get_optimum_points(lines: np.ndarray, optimums: np.ndarray) -> np.ndarray:
+    """
+    Get the optimum points of many sets of optimums along the same waypoint lines. This follows the single precision
+    arithmetic of 'Waypoint.get_optimum_point'.
+
+    :param lines: (N, 4) array of waypoint lines
+    :param optimums: (..., N) array of optimums
+    :return: (..., N, 2) array of optimum points
+    """
+    lines = np.asarray(lines, dtype=np.float32)
+    optimums = np.asarray(optimums, dtype=np.float32)
+    start = lines[:, 0:2]
+    return start + (lines[:, 2:4] - start) * optimums[..., np.newaxis]
+
+
+def get_corner_radii(points: np.ndarray) -> np.ndarray:
+    """
+    Get the radius of the circle through each point and the points either side of it, treating the points as a
+    closed loop. This follows the single precision arithmetic of 'geometry.find_circle_radius', including the floor
+    division used to find the center of the circle.
+
+    :param points: (..., N, 2) array of points around the track
+    :return: (..., N) array of corner radii, nan where the points are collinear enough for no circle to be found
+    """
+    points = np.asarray(points, dtype=np.float32)
+    x1, y1 = np.roll(points[..., 0], 1, axis=-1), np.roll(points[..., 1], 1, axis=-1)
+    x2, y2 = points[..., 0], points[..., 1]
+    x3, y3 = np.roll(points[..., 0], -1, axis=-1), np.roll(points[..., 1], -1, axis=-1)
+
+    x12, x13, y12, y13 = x1 - x2, x1 - x3, y1 - y2, y1 - y3
+    y31, y21, x31, x21 = y3 - y1, y2 - y1, x3 - x1, x2 - x1
+
+    # the squares are taken at double precision, as the C pow function returns a double
+    x1_sq, y1_sq = x1.astype(np.float64) ** 2, y1.astype(np.float64) ** 2
+    sx13 = (x1_sq - x3.astype(np.float64) ** 2).astype(np.float32)
+    sy13 = (y1_sq - y3.astype(np.float64) ** 2).astype(np.float32)
+    sx21 = (x2.astype(np.float64) ** 2 - x1_sq).astype(np.float32)
+    sy21 = (y2.astype(np.float64) ** 2 - y1_sq).astype(np.float32)
+
+    two = np.float32(2)
+    f_denom = two * (y31 * x12 - y21 * x13)
+    f_denom[f_denom == 0] = np.float32(0.00001)
+    f = np.floor((sx13 * x12 + sy13 * x12 + sx21 * x13 + sy21 * x13) / f_denom)
+
+    g_denom = two * (x31 * y12 - x21 * y13)
+    g_denom[g_denom == 0] = np.float32(0.00001)
+    g = np.floor((sx13 * y12 + sy13 * y12 + sx21 * y13 + sy21 * y13) / g_denom)
+
+    # as in the C code, c is found at double precision before being stored as a float
+    c = (-x1_sq - y1_sq - 2.0 * g.astype(np.float64) * x1 - 2.0 * f.astype(np.float64) * y1).astype(np.float32)
+    with np.errstate(invalid="ignore"):
+        return np.sqrt(g * g + f * f - c)
+
+
+def get_max_velocities(radii: np.ndarray, max_friction: float, max_speed: float) -> np.ndarray:
+    """
+    Get the maximum speed through each corner, as 'geometry.get_max_velocities_from_corners' does. Corners without a
+    radius are taken at the maximum speed.
+
+    :param radii: (..., N) array of corner radii
+    :param max_friction: Maximum lateral frictional force of the car
+    :param max_speed: Top speed of the car
+    :return: (..., N) array of maximum velocities
+    """
+    with np.errstate(invalid="ignore"):
+        velocities = np.sqrt(np.asarray(radii, dtype=np.float32) * np.float32(max_friction))
+    max_speed = np.float32(max_speed)
+    # comparing this way round means nan velocities become the max speed
+    return np.where(velocities < max_speed, velocities, max_speed)
+
+
+def solve_velocity_profile(
+        limits: np.ndarray,
+        lengths: np.ndarray,
+        max_acceleration: float = DEFAULT_MAX_ACCELERATION,
+        max_braking: float = DEFAULT_MAX_BRAKING
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the fastest velocity profile around a closed loop which never exceeds the velocity limit at any point and
+    can be reached by accelerating and braking at constant rates. Under constant acceleration v^2 grows linearly with
+    distance, so the forward (acceleration) pass is v_i^2 = 2 a s_i + min_{j <= i}(limit_j^2 - 2 a s_j), which is a
+    cumulative minimum, and the backward (braking) pass is the same from the other direction. The loop is unrolled
+    from the slowest point, which neither pass can constrain, so both passes see every point exactly once.
+
+    :param limits: (..., N) array of maximum velocities at each point
+    :param lengths: (..., N) array of distances from each point to the next, the last being back to the first point
+    :param max_acceleration: Maximum forward acceleration of the car (m/s^2)
+    :param max_braking: Maximum deceleration of the car under braking (m/s^2)
+    :return: (..., N) array of velocities at each point and (...,) array of lap times, inf if the car has to stop
+    """
+    limits = np.asarray(limits, dtype=np.float64)
+    lengths = np.broadcast_to(np.asarray(lengths, dtype=np.float64), limits.shape)
+    count = limits.shape[-1]
+
+    # reorder each loop to start from its slowest point
+    start = np.argmin(limits, axis=-1)[..., np.newaxis]
+    order = (start + np.arange(count)) % count
+    limits_sq = np.square(np.take_along_axis(limits, order, axis=-1))
+    lengths = np.take_along_axis(lengths, order, axis=-1)
+
+    # distance of each point from the start, with the start repeated at the end to close the loop
+    distances = np.concatenate([np.zeros(limits.shape[:-1] + (1,)), np.cumsum(lengths, axis=-1)], axis=-1)
+    limits_sq = np.concatenate([limits_sq, limits_sq[..., :1]], axis=-1)
+
+    accelerating = 2 * max_acceleration * distances
+    forward = accelerating + np.minimum.accumulate(limits_sq - accelerating, axis=-1)
+
+    braking = 2 * max_braking * distances
+    backward = np.flip(np.minimum.accumulate(np.flip(limits_sq + braking, axis=-1), axis=-1), axis=-1) - braking
+
+    velocities = np.sqrt(np.maximum(np.minimum(forward, backward), 0))
+
+    # constant acceleration along each segment, so the average speed is the mean of both ends
+    with np.errstate(divide="ignore", invalid="ignore"):
+        times = np.sum(2 * lengths / (velocities[..., :-1] + velocities[..., 1:]), axis=-1)
+    # a car that has to stop never finishes the lap
+    times = np.where(np.any(velocities == 0, axis=-1), np.inf, times)
+
+    # undo the reordering
+    profile = np.empty_like(limits)
+    np.put_along_axis(profile, order, velocities[..., :-1], axis=-1)
+    return profile, times
+
+
+def evaluate_population(
+        lines: np.ndarray,
+        optimums: np.ndarray,
+        max_frictional_force: float,
+        max_speed: float,
+        max_acceleration: float = DEFAULT_MAX_ACCELERATION,
+        max_braking: float = DEFAULT_MAX_BRAKING
+) -> np.ndarray:
+    """
+    Get the lap time of many racing lines along the same waypoints at once. This is 'geneticTestUtils.get_track_time'
+    applied to every row of optimums using 2D numpy operations, so a whole population is scored in one call.
+
+    :param lines: (N, 4) array of waypoint lines, or a WaypointArray
+    :param optimums: (P, N) array of the optimums of each racing line
+    :param max_frictional_force: Maximum lateral frictional force of the car
+    :param max_speed: Top speed of the car
+    :param max_acceleration: Maximum forward acceleration of the car (m/s^2)
+    :param max_braking: Maximum deceleration of the car under braking (m/s^2)
+    :return: (P,) array of lap times, inf for any racing line that comes to a stop
+    """
+    if isinstance(lines, WaypointArray):
+        lines = lines.lines
+    optimums = np.atleast_2d(optimums)
+
+    points = get_optimum_points(lines, optimums)
+    radii = get_corner_radii(points)
+    limits = get_max_velocities(radii, max_frictional_force, max_speed)
+
+    # distance from each point to the next
+    lengths = np.sqrt(np.sum(np.square(np.roll(points, -1, axis=-2) - points), axis=-1, dtype=np.float32))
+
+    _, times = solve_velocity_profile(limits, lengths, max_acceleration, max_braking)
+    return times
+
+
+def get_minimum_segment_times(lines: np.ndarray, max_speed: float) -> np.ndarray:
+    """
+    Get the least time the car could possibly take between each pair of neighbouring waypoints, whatever their
+    optimums: the shortest distance between the two waypoint lines at the car's top speed. The sum of these over
+    any part of the track is a lower bound on the time taken for that part of the track.
+
+    :param lines: (N, 4) array of waypoint lines
+    :param max_speed: Top speed of the car
+    :return: (N,) array of the minimum time from each waypoint to the next
+    """
+    lines = np.asarray(lines, dtype=np.float64).reshape(-1, 4)
+    following = np.roll(lines, -1, axis=0)
+
+    # closest distance between two segments is from an end of one segment to the other, unless they cross
+    distances = np.min([
+        __point_segment_distances(lines[:, 0:2], following),
+        __point_segment_distances(lines[:, 2:4], following),
+        __point_segment_distances(following[:, 0:2], lines),
+        __point_segment_distances(following[:, 2:4], lines)
+    ], axis=0)
+    distances[__segments_cross(lines, following)] = 0
+    return distances / max_speed
+
+
+def evaluate_population_bounded(
+        lines: np.ndarray,
+        optimums: np.ndarray,
+        cutoff: float,
+        max_frictional_force: float,
+        max_speed: float,
+        max_acceleration: float = DEFAULT_MAX_ACCELERATION,
+        max_braking: float = DEFAULT_MAX_BRAKING,
+        blocks: int = 4,
+        minimum_segment_times: np.ndarray = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the lap times of a population, giving up on racing lines which can't be faster than a cutoff time. The track
+    is split into blocks which are evaluated in turn. After each block, every racing line has a lower bound on its
+    lap time: the time of the finished blocks, with each block's velocities taken from a velocity profile of that
+    block alone (which can only be faster than the full profile), plus the minimum segment times of the remaining
+    blocks. Racing lines whose bound is over the cutoff are pruned and the rest of their geometry is never
+    calculated. The racing lines which survive every block are solved exactly, so their lap times are identical to
+    'evaluate_population'.
+
+    :param lines: (N, 4) array of waypoint lines, or a WaypointArray
+    :param optimums: (P, N) array of the optimums of each racing line
+    :param cutoff: Racing lines which are certainly slower than this time are pruned
+    :param max_frictional_force: Maximum lateral frictional force of the car
+    :param max_speed: Top speed of the car
+    :param max_acceleration: Maximum forward acceleration of the car (m/s^2)
+    :param max_braking: Maximum deceleration of the car under braking (m/s^2)
+    :param blocks: Number of blocks to split the track into
+    :param minimum_segment_times: Result of 'get_minimum_segment_times' for the lines, so it can be calculated once
+    :return: (P,) array of lap times, inf for pruned racing lines, and a (P,) array of whether each was pruned
+    """
+    if isinstance(lines, WaypointArray):
+        lines = lines.lines
+    lines = np.asarray(lines, dtype=np.float64).reshape(-1, 4)
+    optimums = np.atleast_2d(optimums)
+    population, count = optimums.shape
+
+    if minimum_segment_times is None:
+        minimum_segment_times = get_minimum_segment_times(lines, max_speed)
+    edges = np.linspace(0, count, min(blocks, count) + 1).astype(np.int64)
+    # minimum time of everything after each block
+    block_minimums = [np.sum(minimum_segment_times[start:end]) for start, end in zip(edges[:-1], edges[1:])]
+    remaining = np.sum(minimum_segment_times) - np.cumsum(block_minimums)
+
+    limits = np.empty((population, count), dtype=np.float32)
+    lengths = np.empty((population, count), dtype=np.float32)
+    alive = np.arange(population)
+    bounds = np.zeros(population)
+
+    for block, (start, end) in enumerate(zip(edges[:-1], edges[1:])):
+        # the block's points and one either side to find the radius and length of every point in the block
+        indices = np.arange(start - 1, end + 1) % count
+        points = get_optimum_points(lines[indices], optimums[alive][:, indices])
+        block_limits = get_max_velocities(get_corner_radii(points)[:, 1:-1], max_frictional_force, max_speed)
+        segment_lengths = np.sqrt(np.sum(np.square(points[:, 2:] - points[:, 1:-1]), axis=-1, dtype=np.float32))
+        limits[alive, start:end] = block_limits
+        lengths[alive, start:end] = segment_lengths
+
+        # upper bound of the velocity through the block, so a lower bound on the time, ending at the top speed
+        velocities = __solve_open_velocity_profile(
+            block_limits, segment_lengths[:, :-1], max_acceleration, max_braking
+        )
+        velocities = np.concatenate([velocities, np.full((len(alive), 1), float(max_speed))], axis=-1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bounds[alive] += np.sum(2 * segment_lengths / (velocities[:, :-1] + velocities[:, 1:]), axis=-1)
+
+        # allow for rounding so a racing line exactly on the cutoff is never pruned
+        alive = alive[bounds[alive] + remaining[block] <= cutoff * (1 + 1e-9)]
+        if len(alive) == 0:
+            break
+
+    times = np.full(population, np.inf)
+    pruned = np.ones(population, dtype=bool)
+    if len(alive) > 0:
+        _, times[alive] = solve_velocity_profile(limits[alive], lengths[alive], max_acceleration, max_braking)
+        pruned[alive] = False
+    return times, pruned
+
+
+def __solve_open_velocity_profile(
+        limits: np.ndarray,
+        lengths: np.ndarray,
+        max_acceleration: float,
+        max_braking: float
+) -> np.ndarray:
+    # the forward and backward passes of 'solve_velocity_profile' along an open stretch of track which can be
+    # entered and left at any speed up to the limits at either end
+    limits_sq = np.square(np.asarray(limits, dtype=np.float64))
+    distances = np.concatenate([np.zeros(limits.shape[:-1] + (1,)), np.cumsum(lengths, axis=-1)], axis=-1)
+
+    accelerating = 2 * max_acceleration * distances
+    forward = accelerating + np.minimum.accumulate(limits_sq - accelerating, axis=-1)
+    braking = 2 * max_braking * distances
+    backward = np.flip(np.minimum.accumulate(np.flip(limits_sq + braking, axis=-1), axis=-1), axis=-1) - braking
+
+    return np.sqrt(np.maximum(np.minimum(forward, backward), 0))
+
+
+def __point_segment_distances(points: np.ndarray, segments: np.ndarray) -> np.ndarray:
+    start = segments[:, 0:2]
+    direction = segments[:, 2:4] - start
+    length_sq = np.sum(direction * direction, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.clip(np.sum((points - start) * direction, axis=1) / length_sq, 0, 1)
+    t[length_sq == 0] = 0
+    closest = start + direction * t[:, np.newaxis]
+    return np.sqrt(np.sum(np.square(points - closest), axis=1))
+
+
+def __segments_cross(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    def side(p, q, r):
+        return np.sign((q[:, 0] - p[:, 0]) * (r[:, 1] - p[:, 1]) - (q[:, 1] - p[:, 1]) * (r[:, 0] - p[:, 0]))
+
+    a1, a2, b1, b2 = a[:, 0:2], a[:, 2:4], b[:, 0:2], b[:, 2:4]
+    return (side(a1, a2, b1) != side(a1, a2, b2)) & (side(b1, b2, a1) != side(b1, b2, a2))
+
+
+class IncrementalLapTime:
+    def __init__(
+            self,
+            lines: np.ndarray,
+            optimums: np.ndarray,
+            max_frictional_force: float,
+            max_speed: float,
+            max_acceleration: float = DEFAULT_MAX_ACCELERATION,
+            max_braking: float = DEFAULT_MAX_BRAKING
+    ):
+        """
+        Lap time of a single racing line which is updated incrementally as the optimums of a few waypoints change,
+        for hill climbing and other local searches. The corner radii, speed limits, velocity profile and segment
+        times of every waypoint are cached. Moving a window of optimums only recalculates the radii and limits either
+        side of the window, then the forward (acceleration) and backward (braking) passes of the velocity profile are
+        propagated outwards from the window until they match the cached profile again. The cost of a change is the
+        size of the window plus the length of track whose speed it affects rather than the whole track.
+
+        The geometry follows 'geneticTestUtils.get_track_time' and the velocity profile follows
+        'solve_velocity_profile', so lap times agree with both to within floating point rounding.
+
+        :param lines: (N, 4) array of waypoint lines, or a WaypointArray
+        :param optimums: (N,) array of optimums of the racing line
+        :param max_frictional_force: Maximum lateral frictional force of the car
+        :param max_speed: Top speed of the car
+        :param max_acceleration: Maximum forward acceleration of the car (m/s^2)
+        :param max_braking: Maximum deceleration of the car under braking (m/s^2)
+        """
+        if isinstance(lines, WaypointArray):
+            lines = lines.lines
+        self.__lines: List[List[float]] = np.asarray(lines, dtype=np.float64).reshape(-1, 4).tolist()
+        self.__optimums: List[float] = np.asarray(optimums, dtype=np.float64).tolist()
+        self.__count: int = len(self.__lines)
+
+        self.max_frictional_force: float = max_frictional_force
+        self.max_speed: float = max_speed
+        self.__twice_acceleration: float = 2 * max_acceleration
+        self.__twice_braking: float = 2 * max_braking
+
+        points = [self.__get_point(i, self.__optimums[i]) for i in range(self.__count)]
+        radii, self.__lengths = geometry.get_corner_radii_for_points([points[-1]] + points + [points[0]])
+        self.__points: List[Tuple[float, float]] = points
+        self.__limits: List[float] = [v * v for v in geometry.get_max_velocities_from_corners(
+            radii, max_frictional_force, max_speed
+        )]
+
+        # velocities squared of the forward and backward passes, unrolled from the slowest point
+        count = self.__count
+        start = int(np.argmin(self.__limits))
+        limits, lengths = self.__limits, self.__lengths
+        forward, backward = list(limits), list(limits)
+        for step in range(1, count):
+            i, j = (start + step) % count, (start - step) % count
+            forward[i] = min(limits[i], forward[i - 1] + self.__twice_acceleration * lengths[i - 1])
+            backward[j] = min(limits[j], backward[(j + 1) % count] + self.__twice_braking * lengths[j])
+        self.__forward: List[float] = forward
+        self.__backward: List[float] = backward
+
+        self.__velocities: List[float] = [math.sqrt(min(f, b)) for f, b in zip(self.__forward, self.__backward)]
+        self.__segment_times: List[float] = [self.__get_segment_time(
+            self.__lengths[i], self.__velocities[i], self.__velocities[(i + 1) % count]
+        ) for i in range(count)]
+
+        # infinite segments are counted separately so the finite total can be updated by differences
+        self.__total: float = sum(t for t in self.__segment_times if t != math.inf)
+        self.__stopped: int = sum(1 for t in self.__segment_times if t == math.inf)
+
+        self.__staged = None
+
+    @property
+    def time(self) -> float:
+        """
+        :return: Lap time of the current racing line, inf if the car has to stop
+        """
+        return math.inf if self.__stopped > 0 else self.__total
+
+    @property
+    def optimums(self) -> np.ndarray:
+        """
+        :return: (N,) array of the current optimums
+        """
+        return np.array(self.__optimums)
+
+    @property
+    def velocities(self) -> np.ndarray:
+        """
+        :return: (N,) array of the velocity at each waypoint of the current racing line
+        """
+        return np.array(self.__velocities)
+
+    def evaluate(self, start: int, optimums: List[float]) -> float:
+        """
+        Get the lap time if the optimums of a window of waypoints were changed, without changing the racing line.
+        The change is kept so that it can be applied with 'accept' without calculating it again.
+
+        :param start: Index of the first waypoint of the window, the window wraps around the end of the track
+        :param optimums: New optimums [0, 1] of the waypoints in the window
+        :return: Lap time of the changed racing line, inf if the car has to stop
+        """
+        count = self.__count
+        window = len(optimums)
+        if window >= count - 2:
+            # the window touches every corner, so nothing can be reused
+            return self.__evaluate_all(start, optimums)
+
+        new_optimums = {(start + k) % count: float(optimums[k]) for k in range(window)}
+        new_points = {i: self.__get_point(i, value) for i, value in new_optimums.items()}
+
+        # the radius and limit either side of each moved point change, as does the length either side of it
+        window_points = [
+            new_points[i % count] if i % count in new_points else self.__points[i % count] for i in range(start - 2, start + window + 2)
+        ]
+        radii, lengths = geometry.get_corner_radii_for_points(window_points)
+        limits = geometry.get_max_velocities_from_corners(radii, self.max_frictional_force, self.max_speed)
+        new_limits = {(start - 1 + k) % count: v * v for k, v in enumerate(limits)}
+        new_lengths = {(start - 1 + k) % count: length for k, length in enumerate(lengths)}
+
+        limit = lambda i: new_limits[i] if i in new_limits else self.__limits[i]
+        length = lambda i: new_lengths[i] if i in new_lengths else self.__lengths[i]
+
+        # propagate the forward pass from the first changed limit until it matches the cached pass again
+        new_forward = {}
+        forward = lambda i: new_forward[i] if i in new_forward else self.__forward[i]
+        for step in range(3 * count):
+            i = (start - 1 + step) % count
+            previous = (i - 1) % count
+            value = min(limit(i), forward(previous) + self.__twice_acceleration * length(previous))
+            if step > window + 1 and value == forward(i):
+                break
+            new_forward[i] = value
+
+        # and the backward pass from the last changed limit
+        new_backward = {}
+        backward = lambda i: new_backward[i] if i in new_backward else self.__backward[i]
+        for step in range(3 * count):
+            i = (start + window - step) % count
+            value = min(limit(i), backward((i + 1) % count) + self.__twice_braking * length(i))
+            if step > window + 1 and value == backward(i):
+                break
+            new_backward[i] = value
+
+        new_velocities = {i: math.sqrt(min(forward(i), backward(i))) for i in set(new_forward) | set(new_backward)}
+        velocity = lambda i: new_velocities[i] if i in new_velocities else self.__velocities[i]
+
+        # segments either side of a changed velocity, and every segment with a changed length
+        segments = set(new_lengths)
+        for i in new_velocities:
+            segments.add(i)
+            segments.add((i - 1) % count)
+        new_segment_times = {
+            i: self.__get_segment_time(length(i), velocity(i), velocity((i + 1) % count)) for i in segments
+        }
+
+        total, stopped = self.__total, self.__stopped
+        for i, segment_time in new_segment_times.items():
+            old_time = self.__segment_times[i]
+            if old_time == math.inf:
+                stopped -= 1
+            else:
+                total -= old_time
+            if segment_time == math.inf:
+                stopped += 1
+            else:
+                total += segment_time
+
+        self.__staged = (
+            new_optimums, new_points, new_limits, new_lengths, new_forward, new_backward, new_velocities,
+            new_segment_times, total, stopped
+        )
+        return math.inf if stopped > 0 else total
+
+    def accept(self):
+        """
+        Apply the change given to the last call of 'evaluate' to the racing line.
+        """
+        if self.__staged is None:
+            raise ValueError("No change has been evaluated")
+
+        optimums, points, limits, lengths, forward, backward, velocities, segment_times, total, stopped = self.__staged
+        for values, cache in [
+            (optimums, self.__optimums),
+            (points, self.__points),
+            (limits, self.__limits),
+            (lengths, self.__lengths),
+            (forward, self.__forward),
+            (backward, self.__backward),
+            (velocities, self.__velocities),
+            (segment_times, self.__segment_times)
+        ]:
+            for i, value in values.items():
+                cache[i] = value
+
+        self.__total, self.__stopped = total, stopped
+        self.__staged = None
+
+    def update(self, start: int, optimums: List[float]) -> float:
+        """
+        Change the optimums of a window of waypoints.
+
+        :param start: Index of the first waypoint of the window, the window wraps around the end of the track
+        :param optimums: New optimums [0, 1] of the waypoints in the window
+        :return: Lap time of the new racing line
+        """
+        lap_time = self.evaluate(start, optimums)
+        self.accept()
+        return lap_time
+
+    def __evaluate_all(self, start: int, optimums: List[float]) -> float:
+        # rebuild the whole evaluator from the changed optimums and stage its state in place of the current state
+        count = self.__count
+        full = list(self.__optimums)
+        for k, value in enumerate(optimums[:count]):
+            full[(start + k) % count] = float(value)
+
+        other = IncrementalLapTime(
+            np.array(self.__lines),
+            np.array(full),
+            self.max_frictional_force,
+            self.max_speed,
+            self.__twice_acceleration / 2,
+            self.__twice_braking / 2
+        )
+        everything = lambda values: dict(enumerate(values))
+        self.__staged = (
+            everything(other.__optimums), everything(other.__points), everything(other.__limits),
+            everything(other.__lengths), everything(other.__forward), everything(other.__backward),
+            everything(other.__velocities), everything(other.__segment_times), other.__total, other.__stopped
+        )
+        return other.time
+
+    def __get_point(self, index: int, optimum: float) -> Tuple[float, float]:
+        line = self.__lines[index]
+        return tuple(geometry.get_point_from_rel_pos_on_line(line[0], line[1], line[2], line[3], optimum))
+
+    @staticmethod
+    def __get_segment_time(length: float, start_velocity: float, end_velocity: float) -> float:
+        # constant acceleration along the segment, so the average speed is the mean of both ends
+        if start_velocity == 0 or end_velocity == 0:
+            return math.inf
+        return 2 * length / (start_velocity + end_velocity)
@@ -0,0 +1,229 @@
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from fsai import geometry
+from fsai.mapping.segment_index import SegmentIndex
+from fsai.path_planning.waypoint import Waypoint
+from fsai.path_planning.waypoints import gen_waypoints, create_waypoint_lines, apply_error_margin, smoothify, \
+    Boundary, BLUE_ON_LEFT
+
+
+class LocalWaypointPlanner:
+    def __init__(
+            self,
+            foresight: int = 20,
+            negative_foresight: int = 10,
+            spacing: float = 2,
+            margin: float = 0,
+            radar_length: float = 25,
+            radar_count: int = 13,
+            radar_span: float = math.pi / 1.1,
+            bias: float = 0,
+            bias_strength: float = 0.2,
+            left_boundary_colour: int = BLUE_ON_LEFT,
+            smooth: bool = False
+    ):
+        """
+        Stateful version of 'gen_waypoints' for generating the local waypoints around a car every frame. Between
+        frames the car only moves a small distance, so rather than rebuilding every waypoint the planner keeps the
+        waypoints of the previous frame. Waypoints behind the car are dropped, and only the new waypoints at the end
+        of the lookahead, and any waypoints whose surrounding boundary changed, are generated. In the steady state
+        this costs about one radar search per frame instead of foresight + negative_foresight searches.
+
+        The parameters are the same as those of 'gen_waypoints'.
+
+        :param foresight: How many waypoints in front of the car to generate
+        :param negative_foresight: How many waypoints behind the car to generate
+        :param spacing: How far apart should each waypoint be spaced
+        :param margin: Error margin to shorten the track by. This is applied to both ends of the waypoints.
+        :param radar_length: The maximum length a waypoint can be
+        :param radar_count: How many radar lines should be tested upon to find the true waypoint
+        :param radar_span: The total coverage the radar lines can exists between
+        :param bias: Bias the track to head certain directions
+        :param bias_strength: How strongly to apply the bias
+        :param left_boundary_colour: Which colour boundary is on the left [BLUE_ON_LEFT, YELLOW_ON_LEFT]
+        :param smooth: If true then the waypoints will be smoothed to create a smoothing angle between waypoints
+        """
+        self.foresight: int = foresight
+        self.negative_foresight: int = negative_foresight
+        self.spacing: float = spacing
+        self.margin: float = margin
+        self.radar_length: float = radar_length
+        self.radar_count: int = radar_count
+        self.radar_span: float = radar_span
+        self.bias: float = bias
+        self.bias_strength: float = bias_strength
+        self.left_boundary_colour: int = left_boundary_colour
+        self.smooth: bool = smooth
+
+        # the waypoints of the previous frame before the margin and smoothing are applied
+        self.waypoints: List[Waypoint] = []
+        # how many waypoints were generated by the last update, useful to monitor the cost of each frame
+        self.generated_count: int = 0
+
+        # copies of the boundary lines of the previous frame, used to detect which boundary lines have changed
+        self.__boundary_lines: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+    def reset(self):
+        """
+        Forget the waypoints of the previous frames, forcing the next update to generate every waypoint.
+        """
+        self.waypoints = []
+        self.__boundary_lines = None
+
+    def update(
+            self,
+            car_pos: List[float],
+            car_angle: float,
+            blue_boundary: Boundary,
+            yellow_boundary: Boundary,
+            orange_boundary: Boundary
+    ) -> List[Waypoint]:
+        """
+        Get the waypoints around the car for the current frame. The boundary lines are compared to a copy of those
+        of the previous frame, so lines that were added, removed or edited in place are all found, and the waypoints
+        around these lines are generated again.
+
+        :param car_pos: Current position of the car
+        :param car_angle: Current orientation of the car
+        :param blue_boundary: Blue boundary of the track, either a list of lines or a SegmentIndex
+        :param yellow_boundary: Yellow boundary of the track, either a list of lines or a SegmentIndex
+        :param orange_boundary: Orange boundary of the track, either a list of lines or a SegmentIndex
+        :return: List of waypoints in order from behind the car to in front of the car
+        """
+        boundaries = (blue_boundary, yellow_boundary, orange_boundary)
+        boundary_lines = self.__get_boundary_lines(boundaries)
+        self.generated_count = 0
+
+        if len(self.waypoints) == 0:
+            self.__generate(car_pos, car_angle, boundaries)
+        else:
+            # find the waypoint the car is currently at. If the car has left the waypoints, for example when it
+            # has been reset to a new position, then all the waypoints are generated again.
+            car_index = self.__get_car_index(car_pos)
+            centers = np.array([geometry.line_center(w.line) for w in self.waypoints])
+            if geometry.distance(centers[car_index], car_pos) > self.spacing + self.radar_length / 2:
+                self.__generate(car_pos, car_angle, boundaries)
+            else:
+                # the waypoints are generated as a chain, each waypoint from the one before, so every waypoint after
+                # the first waypoint affected by a changed boundary has to be generated again
+                changed_index = self.__get_first_changed_index(boundary_lines, centers)
+                if changed_index is not None and changed_index <= car_index:
+                    self.__generate(car_pos, car_angle, boundaries)
+                else:
+                    if changed_index is not None:
+                        self.waypoints = self.waypoints[:changed_index]
+
+                    # drop the waypoints that have fallen behind the car and extend the waypoints in front of it
+                    self.waypoints = self.waypoints[max(0, car_index - self.negative_foresight):]
+                    car_index = min(car_index, self.negative_foresight)
+                    self.__extend(car_index + self.foresight + 1 - len(self.waypoints), car_angle, boundaries)
+
+        self.__boundary_lines = boundary_lines
+
+        # apply the margin and smoothing to copies so that the stored waypoints can be reused next frame
+        car_index = self.__get_car_index(car_pos)
+        window = self.waypoints[max(0, car_index - self.negative_foresight):car_index + self.foresight + 1]
+        waypoints = apply_error_margin([waypoint.copy() for waypoint in window], self.margin)
+        return smoothify(waypoints, False) if self.smooth and len(waypoints) > 2 else waypoints
+
+    def __generate(self, car_pos: List[float], car_angle: float, boundaries: Tuple[Boundary, Boundary, Boundary]):
+        """
+        Generate every waypoint from scratch around the car using 'gen_waypoints'.
+        """
+        self.waypoints = gen_waypoints(
+            car_pos,
+            car_angle,
+            boundaries[0],
+            boundaries[1],
+            boundaries[2],
+            foresight=self.foresight,
+            negative_foresight=self.negative_foresight,
+            spacing=self.spacing,
+            margin=0,
+            radar_length=self.radar_length,
+            radar_count=self.radar_count,
+            radar_span=self.radar_span,
+            bias=self.bias,
+            bias_strength=self.bias_strength,
+            left_boundary_colour=self.left_boundary_colour
+        )
+        self.generated_count = len(self.waypoints)
+
+    def __extend(self, count: int, car_angle: float, boundaries: Tuple[Boundary, Boundary, Boundary]):
+        """
+        Continue the chain of waypoints forwards. The chain carries on from the optimum point of the last waypoint,
+        heading in the direction from the previous waypoint, exactly as 'create_waypoint_lines' would have done.
+        """
+        if count <= 0:
+            return
+
+        last_point = self.waypoints[-1].get_optimum_point()
+        last_angle = car_angle
+        if len(self.waypoints) > 1:
+            last_angle = geometry.angle_to(self.waypoints[-2].get_optimum_point(), last_point)
+
+        self.waypoints += create_waypoint_lines(
+            initial_point=last_point,
+            initial_angle=last_angle,
+            count=count,
+            spacing=self.spacing,
+            overlap=True,
+            blue_boundary=boundaries[0],
+            yellow_boundary=boundaries[1],
+            orange_boundary=boundaries[2],
+            bias=self.bias,
+            bias_strength=self.bias_strength,
+            max_radar_length=self.radar_length,
+            radar_count=self.radar_count,
+            radar_angle_span=self.radar_span,
+            left_boundary_colour=self.left_boundary_colour
+        )
+        self.generated_count += count
+
+    def __get_car_index(self, car_pos: List[float]) -> int:
+        """
+        Get the index of the waypoint closest to the car.
+        """
+        centers = np.array([geometry.line_center(w.line) for w in self.waypoints])
+        return int(np.argmin(np.hypot(centers[:, 0] - car_pos[0], centers[:, 1] - car_pos[1])))
+
+    def __get_first_changed_index(self, boundary_lines: Tuple[np.ndarray, np.ndarray, np.ndarray],
+                                  centers: np.ndarray) -> Optional[int]:
+        """
+        Find the first waypoint whose surrounding boundary has changed since the previous frame. A waypoint is
+        affected if a changed line is within reach of the radar lines used to generate it.
+        """
+        if self.__boundary_lines is None:
+            return 0
+
+        changed_lines = []
+        for lines, previous_lines in zip(boundary_lines, self.__boundary_lines):
+            # boundaries mostly grow at the end as cones are found, so the lines they share are compared directly
+            shared = min(len(lines), len(previous_lines))
+            if np.array_equal(lines[:shared], previous_lines[:shared]):
+                changed_lines += [lines[shared:], previous_lines[shared:]]
+            else:
+                changed = set(map(tuple, lines.tolist())).symmetric_difference(map(tuple, previous_lines.tolist()))
+                changed_lines.append(np.array(list(changed), dtype=np.float64).reshape(-1, 4))
+
+        ends = np.concatenate(changed_lines).reshape(-1, 2)
+        if len(ends) == 0:
+            return None
+
+        # distance from each waypoint to the closest end of the changed lines
+        distances = np.hypot(centers[:, np.newaxis, 0] - ends[np.newaxis, :, 0], centers[:, np.newaxis, 1] - ends[np.newaxis, :, 1])
+
+        reach = self.spacing + (self.spacing ** 2 + (self.radar_length / 2) ** 2) ** (1 / 2)
+        affected = np.nonzero(distances.min(axis=1) < reach)[0]
+        return int(affected[0]) if len(affected) > 0 else None
+
+    @staticmethod
+    def __get_boundary_lines(boundaries: Tuple[Boundary, Boundary, Boundary]) -> Tuple[np.ndarray, ...]:
+        # copied so that boundaries edited in place after this frame don't change the stored lines
+        return tuple(np.array(
+            [line[0:4] for line in (boundary.lines if isinstance(boundary, SegmentIndex) else boundary)],
+            dtype=np.float64
+        ).reshape(-1, 4) for boundary in boundaries)
@@ -1,88 +1,111 @@
-import math
-import sys
-from typing import List
-from fsai.objects.point import Point
-from fsai.path_planning.waypoint import Waypoint
+from typing import List, Optional
 
+import numpy as np
 
-def calculate_minimum_curve(waypoints: List[Waypoint] = None, full_track: bool = False, epochs: int = 1000):
-    if full_track:
-        if len(waypoints) < 5:
-            print("Calculating the minimum curve of a full requires at least 5 waypoints.")
+from fsai.path_planning.waypoint import Waypoint
+from fsai.path_planning.waypoint_array import WaypointArray
+
+
+def calculate_minimum_curve(
+        waypoints: List[Waypoint] = None,
+        full_track: bool = False,
+        epochs: int = 10000,
+        tolerance: float = 1e-6
+):
+    """
+    Move the optimum of each waypoint to the minimum curvature racing line. Sticky waypoints keep their optimum. See
+    'solve_minimum_curvature'.
+
+    :param waypoints: Waypoints to optimise, the optimums are updated in place
+    :param full_track: Whether the waypoints form a closed loop around the whole track
+    :param epochs: Maximum number of gradient steps
+    :param tolerance: Stop once no optimum moves further than this in a step
+    """
+    array = WaypointArray.from_waypoints(waypoints)
+    optimums = solve_minimum_curvature(
+        array.lines, array.optimum, array.sticky, closed=full_track, iterations=epochs, tolerance=tolerance
+    )
+    for waypoint, optimum in zip(waypoints, optimums):
+        waypoint.optimum = float(optimum)
+
+
+def solve_minimum_curvature(
+        lines: np.ndarray,
+        optimums: Optional[np.ndarray] = None,
+        sticky: Optional[np.ndarray] = None,
+        closed: bool = True,
+        iterations: int = 10000,
+        tolerance: float = 1e-6
+) -> np.ndarray:
+    """
+    Find the optimums along the waypoint lines which give the racing line with the least curvature. Each point of the
+    racing line is p_i = a_i + t_i * d_i where a_i is the start of the waypoint line, d_i is the line's direction
+    and t_i is the optimum. The curvature is measured by the second differences c_i = p_{i-1} - 2 p_i + p_{i+1}, so
+    sum |c_i|^2 is a convex quadratic in t with the closed form gradient 2 d_i . (c_{i-1} - 2 c_i + c_{i+1}). This
+    is minimised with accelerated projected gradient descent (FISTA), clipping t to [0, 1] and holding sticky
+    waypoints in place after every step. Every step is a handful of whole array operations, so a full track
+    converges in a fraction of a second.
+
+    :param lines: (N, 4) array of waypoint lines, or a WaypointArray
+    :param optimums: (N,) array of initial optimums, defaults to the middle of each line
+    :param sticky: (N,) array of whether each waypoint is fixed at its initial optimum, defaults to none
+    :param closed: Whether the waypoints form a closed loop, otherwise the ends of the line are free
+    :param iterations: Maximum number of gradient steps
+    :param tolerance: Stop once no optimum moves further than this in a step
+    :return: (N,) array of optimums [0, 1]
+    """
+    if isinstance(lines, WaypointArray):
+        optimums = lines.optimum if optimums is None else optimums
+        sticky = lines.sticky if sticky is None else sticky
+        lines = lines.lines
+    lines = np.asarray(lines, dtype=np.float64).reshape(-1, 4)
+    count = len(lines)
+
+    t = np.full(count, 0.5) if optimums is None else np.clip(np.array(optimums, dtype=np.float64), 0, 1)
+    fixed = np.zeros(count, dtype=bool) if sticky is None else np.asarray(sticky, dtype=bool)
+    if count < 3:
+        return t
+
+    start = lines[:, 0:2]
+    direction = lines[:, 2:4] - start
+
+    # the second difference operator has a norm of at most 4, so the gradient is Lipschitz with this constant
+    lipschitz = 2 * 16 * np.max(np.sum(direction * direction, axis=1))
+    if lipschitz == 0:
+        return t
+    step = 1 / lipschitz
+
+    fixed_values = t[fixed]
+    y, momentum = t.copy(), 1.0
+    for _ in range(iterations):
+        points = start + direction * y[:, np.newaxis]
+        curve = __second_difference(points, closed)
+        gradient = 2 * np.sum(direction * __second_difference(curve, closed, pad=False), axis=1)
+
+        t_next = np.clip(y - step * gradient, 0, 1)
+        t_next[fixed] = fixed_values
+
+        change = t_next - t
+        momentum_next = (1 + np.sqrt(1 + 4 * momentum * momentum)) / 2
+        # restart the momentum whenever it points away from the last step, which keeps the descent monotone
+        if np.dot(change, y - t_next) > 0:
+            momentum_next = 1.0
+            y = t_next
         else:
-            # Loop through all waypoints to start calculating the minimum curve
-            for i in range(epochs):
-                total_angle = 0
-                for i in range(len(waypoints)):
-                    if not waypoints[i].sticky:
-                        p2 = waypoints[i - 2].get_optimum_point()
-                        p1 = waypoints[i - 1].get_optimum_point()
-                        n1 = waypoints[(i + 1) % len(waypoints)].get_optimum_point()
-                        n2 = waypoints[(i + 2) % len(waypoints)].get_optimum_point()
-
-                        waypoints[i].optimum, angle = __calculate_optimal_p(p2, p1, waypoints[i], n1, n2)
-                        total_angle += angle
-                # print(total_angle)
-    else:
-        print("Unimplemented for partial track")
-
-
-def __calculate_optimal_p(pre_2: Point, pre_1: Point, waypoint: Waypoint, nex_1: Point, nex_2: Point):
-    total_angle = None
-    optimal_value = 0.5
-
-    steps = 10
-    ubound = min(1, waypoint.optimum + 0.1)
-    lbound = max(0, waypoint.optimum - 0.1)
-    for i in range(steps):
-        lmbound = (ubound - lbound) * 0.3 + lbound
-        umbound = (ubound - lbound) * 0.7 + lbound
-
-        bounds = [lbound, lmbound, umbound, ubound]
-        for bound_index in range(4):
-            p = bounds[bound_index]
-            waypoint.optimum = p
-            angle = __calculate_total_angle(
-                pre_2.x, pre_2.y, pre_1.x, pre_1.y, waypoint.line.a.x, waypoint.line.a.y, waypoint.line.b.x, waypoint.line.b.y, p, nex_1.x, nex_1.y, nex_2.x, nex_2.y)
-
-            bounds[bound_index] = angle
-
-        total_angle = min(bounds)
-
-        min_bound = bounds.index(min(bounds))
-        if min_bound == 0:
-            optimal_value = lbound
-            ubound = lmbound
-        if min_bound == 1:
-            optimal_value = lmbound
-            ubound = umbound
-        if min_bound == 2:
-            optimal_value = umbound
-            lbound = lmbound
-        if min_bound == 3:
-            optimal_value = ubound
-            lbound = umbound
-
-    return optimal_value, total_angle
-
-
-def __calculate_total_angle(p1_x, p1_y, p2_x, p2_y, wa_x, wa_y, wb_x, wb_y, op: float, p4_x, p4_y, p5_x, p5_y):
-    a = ((math.atan2((wa_y + ((wb_y - wa_y) * op)) - p2_y, (wa_x + ((wb_x - wa_x) * op)) - p2_x) - math.atan2(p1_y - p2_y, p1_x - p2_x)) + (2 * math.pi)) % (2 * math.pi) - math.pi
-    b = ((math.atan2(p4_y - (wa_y + ((wb_y - wa_y) * op)), p4_x - (wa_x + ((wb_x - wa_x) * op))) - math.atan2(p2_y - (wa_y + ((wb_y - wa_y) * op)), p2_x - (wa_x + ((wb_x - wa_x) * op)))) + (2 * math.pi)) % (2 * math.pi) - math.pi
-    c = ((math.atan2(p5_y - p4_y, p5_x - p4_x) - math.atan2((wa_y + ((wb_y - wa_y) * op)) - p4_y, (wa_x + ((wb_x - wa_x) * op)) - p4_x)) + (2 * math.pi)) % (2 * math.pi) - math.pi
-    avg = (a + b + c) / 3
-
-    return abs(a - avg) + abs(b - avg) + abs(c - avg)
-
-# def __calculate_total_angle(p1, p2, p3, p4, p5):
-#     a = __angle(p1, p2, p3)
-#     b = __angle(p2, p3, p4)
-#     c = __angle(p3, p4, p5)
-#     avg = (a + b + c) / 3
-#
-#     return abs(a - avg) + abs(b - avg) + abs(c - avg)
-
-
-def __angle(a: Point, b, c):
-    angle = ((math.atan2(c.y - b.y, c.x - b.x) - math.atan2(a.y - b.y, a.x - b.x)) + (2 * math.pi)) % (2 * math.pi) - math.pi
-    return angle
+            y = t_next + change * ((momentum - 1) / momentum_next)
+        t, momentum = t_next, momentum_next
+
+        if np.max(np.abs(change)) < tolerance:
+            break
+
+    return t
+
+
+def __second_difference(values: np.ndarray, closed: bool, pad: bool = True) -> np.ndarray:
+    # v_{i-1} - 2 v_i + v_{i+1} around the loop. For an open line the ends have no second difference, so they are
+    # zero, and when taking the difference of those differences (pad=False) the zeros stand in for the missing ends
+    difference = np.roll(values, 1, axis=0) - 2 * values + np.roll(values, -1, axis=0)
+    if not closed and pad:
+        difference[0] = 0
+        difference[-1] = 0
+    return difference
@@ -0,0 +1,136 @@
+import heapq
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+from fsai.path_planning.waypoint import Waypoint
+from fsai.path_planning.waypoint_array import WaypointArray
+
+
+def get_resolution_levels(
+        waypoints: List[Waypoint],
+        fractions: Sequence[float] = (0.125, 0.25, 0.5),
+        corner_share: float = 0.5
+) -> List[np.ndarray]:
+    """
+    Get the waypoints of each level of a coarse to fine optimisation, from the coarsest level to every waypoint.
+    Each coarse level keeps a fraction of the waypoints: every sticky waypoint, then the waypoints whose lines turn
+    the most, which are the corners, up to 'corner_share' of the level, then the rest spread out by repeatedly
+    splitting the largest gap between the waypoints kept. Each level includes every waypoint of the level before.
+
+    :param waypoints: Waypoints of the full resolution racing line
+    :param fractions: Fraction of the waypoints kept by each coarse level, from coarsest to finest
+    :param corner_share: Fraction of each level given to the corners
+    :return: List of sorted index arrays into the waypoints, the last level being every waypoint
+    """
+    count = len(waypoints)
+    if count == 0:
+        return [np.arange(0)]
+
+    array = WaypointArray.from_waypoints(waypoints)
+    # how far the line of each waypoint turns from its neighbours, as in 'decimate_waypoints'
+    angles = np.arctan2(array.lines[:, 3] - array.lines[:, 1], array.lines[:, 2] - array.lines[:, 0])
+    turning = np.abs((np.roll(angles, 1) - angles + np.pi) % (2 * np.pi) - np.pi)
+    turning += np.abs((np.roll(angles, -1) - angles + np.pi) % (2 * np.pi) - np.pi)
+    # most turning first, ties broken by position so the levels are always the same. Straight lines aren't corners
+    corners = np.argsort(-turning, kind="stable")
+    corners = corners[turning[corners] > 0]
+
+    levels = []
+    kept = np.zeros(count, dtype=bool)
+    kept[array.sticky] = True
+    for fraction in sorted(fractions):
+        size = int(np.ceil(fraction * count))
+        kept[corners[:int(corner_share * size)]] = True
+        __fill_largest_gaps(kept, size)
+
+        level = np.flatnonzero(kept)
+        if len(level) < count and (len(levels) == 0 or len(level) > len(levels[-1])):
+            levels.append(level)
+
+    levels.append(np.arange(count))
+    return levels
+
+
+def interpolate_optimums(
+        lines: np.ndarray,
+        indices: np.ndarray,
+        optimums: np.ndarray,
+        closed: bool = True
+) -> np.ndarray:
+    """
+    Spread the optimums of a subset of waypoints to every waypoint. The optimum of each waypoint between two of the
+    subset is interpolated linearly by the distance along the center of the track between them.
+
+    :param lines: (N, 4) array of every waypoint line
+    :param indices: (M,) sorted array of the indices of the subset of waypoints
+    :param optimums: (M,) array of the optimums of the subset of waypoints
+    :param closed: Whether the waypoints form a closed loop, otherwise the ends are held at the nearest optimum
+    :return: (N,) array of optimums of every waypoint
+    """
+    lines = np.asarray(lines, dtype=np.float64).reshape(-1, 4)
+    centers = (lines[:, 0:2] + lines[:, 2:4]) / 2
+
+    gaps = np.sqrt(np.sum(np.square(np.diff(centers, axis=0)), axis=1))
+    distances = np.concatenate([[0], np.cumsum(gaps)])
+
+    if closed:
+        period = distances[-1] + np.sqrt(np.sum(np.square(centers[0] - centers[-1])))
+        return np.interp(distances, distances[indices], optimums, period=period)
+    return np.interp(distances, distances[indices], optimums)
+
+
+def optimise_multi_resolution(
+        waypoints: List[Waypoint],
+        optimise: Callable[[WaypointArray], np.ndarray],
+        levels: List[np.ndarray] = None,
+        closed: bool = True
+) -> np.ndarray:
+    """
+    Run an optimiser from coarse to fine. The optimiser is run on the waypoints of the coarsest level, its optimums
+    are interpolated onto the next level and used as the starting point of the optimiser on that level, and so on
+    until every waypoint has been optimised. Most of the work is done on far fewer waypoints, and the full
+    resolution run starts close to the optimum.
+
+    :param waypoints: Waypoints of the full resolution racing line, their optimums are the initial racing line
+    :param optimise: Function optimising the racing line of a level, given the waypoints of the level with their
+    current optimums and returning the new optimums
+    :param levels: Levels from 'get_resolution_levels', defaults to the default levels of the waypoints
+    :param closed: Whether the waypoints form a closed loop
+    :return: (N,) array of optimums of every waypoint
+    """
+    array = WaypointArray.from_waypoints(waypoints)
+    if levels is None:
+        levels = get_resolution_levels(waypoints)
+
+    optimums = array.optimum.copy()
+    for level in levels:
+        level_optimums = optimise(WaypointArray(array.lines[level], optimums[level], array.sticky[level]))
+        optimums = np.clip(interpolate_optimums(array.lines, level, level_optimums, closed), 0, 1)
+        # sticky waypoints are in every level so never move
+        optimums[array.sticky] = array.optimum[array.sticky]
+
+    return optimums
+
+
+def __fill_largest_gaps(kept: np.ndarray, size: int):
+    # keep more waypoints until there are size of them, each one in the middle of the largest gap around the loop
+    indices = np.flatnonzero(kept)
+    if len(indices) == 0:
+        kept[0] = True
+        indices = np.zeros(1, dtype=np.int64)
+
+    count = len(kept)
+    gaps = np.diff(indices, append=indices[0] + count)
+    heap = [(-int(gap), int(start)) for start, gap in zip(indices, gaps) if gap > 1]
+    heapq.heapify(heap)
+    remaining = size - len(indices)
+    while remaining > 0 and len(heap) > 0:
+        gap, start = heapq.heappop(heap)
+        gap = -gap
+        middle = start + gap // 2
+        kept[middle % count] = True
+        remaining -= 1
+        for split_start, split_gap in [(start, gap // 2), (middle, gap - gap // 2)]:
+            if split_gap > 1:
+                heapq.heappush(heap, (-split_gap, split_start))
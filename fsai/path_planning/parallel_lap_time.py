@@ -0,0 +1,151 @@
+import multiprocessing
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+from fsai.path_planning.lap_time import evaluate_population, evaluate_population_bounded, get_minimum_segment_times, \
+    DEFAULT_MAX_ACCELERATION, DEFAULT_MAX_BRAKING
+from fsai.path_planning.ggv_lap_time import GGVLapTime
+from fsai.path_planning.waypoint_array import WaypointArray
+
+# state of each worker process, set once by _init_worker when the pool starts
+_worker_memory: Optional[shared_memory.SharedMemory] = None
+_worker_lines: Optional[np.ndarray] = None
+_worker_limits: Optional[tuple] = None
+_worker_minimum_times: Optional[np.ndarray] = None
+_worker_ggv: Optional[GGVLapTime] = None
+
+
+def _init_worker(memory_name: str, line_count: int, limits: tuple, ggv: Optional[GGVLapTime]):
+    global _worker_memory, _worker_lines, _worker_limits, _worker_minimum_times, _worker_ggv
+    # keep a reference to the shared memory so the lines stay valid for the lifetime of the worker
+    _worker_memory = shared_memory.SharedMemory(name=memory_name)
+    _worker_lines = np.ndarray((line_count, 4), dtype=np.float64, buffer=_worker_memory.buf)
+    _worker_limits = limits
+    _worker_minimum_times = get_minimum_segment_times(_worker_lines, limits[1])
+    _worker_ggv = ggv
+
+
+def _evaluate_chunk(optimums: np.ndarray) -> np.ndarray:
+    if _worker_ggv is not None:
+        return _worker_ggv.evaluate_population(_worker_lines, optimums)
+    return evaluate_population(_worker_lines, optimums, *_worker_limits)
+
+
+def _evaluate_bounded_chunk(chunk: tuple) -> tuple:
+    optimums, cutoff = chunk
+    return evaluate_population_bounded(
+        _worker_lines, optimums, cutoff, *_worker_limits, minimum_segment_times=_worker_minimum_times
+    )
+
+
+class ParallelLapTimeEvaluator:
+    def __init__(
+            self,
+            lines: np.ndarray,
+            max_frictional_force: float,
+            max_speed: float,
+            max_acceleration: float = DEFAULT_MAX_ACCELERATION,
+            max_braking: float = DEFAULT_MAX_BRAKING,
+            workers: Optional[int] = None,
+            ggv: Optional[GGVLapTime] = None
+    ):
+        """
+        Evaluate the lap times of a population of racing lines across a pool of worker processes. The waypoint lines
+        are the same for every racing line, so they are copied into shared memory once when the pool starts and only
+        the optimums of each racing line are sent to the workers, with only the lap times sent back. The population
+        is split into one contiguous chunk per worker and the chunks are evaluated with 'evaluate_population', so the
+        lap times are identical to evaluating the population in a single process regardless of the worker count.
+
+        With a single worker the population is evaluated in this process, so the evaluator can be used in place of
+        'evaluate_population' without a pool.
+
+        Given a GGV lap time simulation, racing lines are evaluated with it instead of the friction circle and
+        constant acceleration limits.
+
+        :param lines: (N, 4) array of waypoint lines, or a WaypointArray
+        :param max_frictional_force: Maximum lateral frictional force of the car
+        :param max_speed: Top speed of the car
+        :param max_acceleration: Maximum forward acceleration of the car (m/s^2)
+        :param max_braking: Maximum deceleration of the car under braking (m/s^2)
+        :param workers: Number of worker processes, defaults to the number of CPUs
+        :param ggv: GGV lap time simulation of a vehicle to evaluate the racing lines with
+        """
+        if isinstance(lines, WaypointArray):
+            lines = lines.lines
+        lines = np.ascontiguousarray(lines, dtype=np.float64).reshape(-1, 4)
+
+        self.workers: int = max(1, workers or multiprocessing.cpu_count())
+        self.limits: tuple = (max_frictional_force, max_speed, max_acceleration, max_braking)
+        self.lines: np.ndarray = lines
+        self.minimum_segment_times: np.ndarray = get_minimum_segment_times(lines, max_speed)
+        self.ggv: Optional[GGVLapTime] = ggv
+
+        self.__memory: Optional[shared_memory.SharedMemory] = None
+        self.__pool = None
+        if self.workers > 1:
+            self.__memory = shared_memory.SharedMemory(create=True, size=max(1, lines.nbytes))
+            np.ndarray(lines.shape, dtype=np.float64, buffer=self.__memory.buf)[:] = lines
+            self.__pool = multiprocessing.Pool(
+                self.workers,
+                initializer=_init_worker,
+                initargs=(self.__memory.name, len(lines), self.limits, ggv)
+            )
+
+    def evaluate(self, optimums: np.ndarray) -> np.ndarray:
+        """
+        Get the lap time of every racing line in the population.
+
+        :param optimums: (P, N) array of the optimums of each racing line
+        :return: (P,) array of lap times, inf for any racing line that comes to a stop
+        """
+        optimums = np.atleast_2d(np.asarray(optimums, dtype=np.float64))
+        if self.__pool is None or len(optimums) < 2:
+            if self.ggv is not None:
+                return self.ggv.evaluate_population(self.lines, optimums)
+            return evaluate_population(self.lines, optimums, *self.limits)
+
+        chunks = np.array_split(optimums, min(self.workers, len(optimums)))
+        return np.concatenate(self.__pool.map(_evaluate_chunk, chunks, chunksize=1))
+
+    def evaluate_bounded(self, optimums: np.ndarray, cutoff: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the lap time of every racing line in the population, pruning racing lines which are certainly slower
+        than the cutoff. See 'evaluate_population_bounded'. Only the friction circle lap time can be bounded.
+
+        :param optimums: (P, N) array of the optimums of each racing line
+        :param cutoff: Racing lines which are certainly slower than this time are pruned
+        :return: (P,) array of lap times, inf for pruned racing lines, and a (P,) array of whether each was pruned
+        """
+        if self.ggv is not None:
+            raise ValueError("GGV lap times can't be bounded")
+
+        optimums = np.atleast_2d(np.asarray(optimums, dtype=np.float64))
+        if self.__pool is None or len(optimums) < 2:
+            return evaluate_population_bounded(
+                self.lines, optimums, cutoff, *self.limits, minimum_segment_times=self.minimum_segment_times
+            )
+
+        chunks = [(chunk, cutoff) for chunk in np.array_split(optimums, min(self.workers, len(optimums)))]
+        results = self.__pool.map(_evaluate_bounded_chunk, chunks, chunksize=1)
+        return np.concatenate([times for times, _ in results]), np.concatenate([pruned for _, pruned in results])
+
+    def close(self):
+        """
+        Stop the worker processes and free the shared memory.
+        """
+        if self.__pool is not None:
+            self.__pool.close()
+            self.__pool.join()
+            self.__pool = None
+        if self.__memory is not None:
+            self.__memory.close()
+            self.__memory.unlink()
+            self.__memory = None
+
+    def __enter__(self) -> "ParallelLapTimeEvaluator":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,106 @@
+from typing import List, Optional, Union
+
+import numpy as np
+
+from fsai.path_planning.waypoint import Waypoint
+
+
+class WaypointArray:
+    def __init__(
+            self,
+            lines: np.ndarray,
+            optimum: Optional[np.ndarray] = None,
+            sticky: Optional[np.ndarray] = None,
+            velocity: Optional[np.ndarray] = None
+    ):
+        """
+        A list of waypoints stored as contiguous arrays rather than a list of Waypoint objects. Each row of the
+        arrays represents a single waypoint: lines (N, 4) [x1, y1, x2, y2], optimum (N,), sticky (N,) and
+        velocity (N,). Copies share the line geometry, which does not change once the waypoints are generated, so
+        copying a set of waypoints only copies the optimum, sticky and velocity arrays.
+
+        :param lines: (N, 4) array of waypoint lines
+        :param optimum: (N,) array of optimum positions along each line [0, 1], defaults to the middle of the line
+        :param sticky: (N,) array of whether each waypoint is sticky, defaults to False
+        :param velocity: (N,) array of velocities at each waypoint, defaults to 0
+        """
+        self.lines: np.ndarray = np.asarray(lines, dtype=np.float64).reshape(-1, 4)
+        count = len(self.lines)
+
+        self.optimum: np.ndarray = np.full(count, 0.5) if optimum is None else np.asarray(optimum, dtype=np.float64)
+        self.sticky: np.ndarray = np.zeros(count, dtype=bool) if sticky is None else np.asarray(sticky, dtype=bool)
+        self.velocity: np.ndarray = np.zeros(count) if velocity is None else np.asarray(velocity, dtype=np.float64)
+
+    @staticmethod
+    def from_waypoints(waypoints: List[Waypoint]) -> "WaypointArray":
+        """
+        Create a WaypointArray from a list of Waypoint objects. Velocities are taken from the 'v' attribute of each
+        waypoint where it has been set.
+
+        :param waypoints: List of waypoints to convert
+        :return: WaypointArray containing the waypoints
+        """
+        return WaypointArray(
+            lines=np.array([w.line[0:4] for w in waypoints], dtype=np.float64).reshape(-1, 4),
+            optimum=np.array([w.optimum for w in waypoints], dtype=np.float64),
+            sticky=np.array([w.sticky for w in waypoints], dtype=bool),
+            velocity=np.array([getattr(w, "v", 0) for w in waypoints], dtype=np.float64)
+        )
+
+    def to_waypoints(self) -> List[Waypoint]:
+        """
+        Convert the array back into a list of Waypoint objects, for use with functions that work on lists of
+        waypoints. The waypoints are new objects so altering them does not affect the array.
+
+        :return: List of waypoints
+        """
+        waypoints = []
+        for i in range(len(self)):
+            waypoint = Waypoint(line=self.lines[i].tolist(), sticky=bool(self.sticky[i]), optimum=float(self.optimum[i]))
+            waypoint.v = float(self.velocity[i])
+            waypoints.append(waypoint)
+        return waypoints
+
+    def get_optimum_points(self, optimum: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Get the optimum point of every waypoint. Alternative optimums can be given to calculate the points of
+        several sets of optimums at once, for example for a population of candidate racing lines.
+
+        :param optimum: Optional (..., N) array of optimums to use instead of the waypoints' own optimums
+        :return: (..., N, 2) array of optimum points
+        """
+        optimum = self.optimum if optimum is None else np.asarray(optimum, dtype=np.float64)
+        start = self.lines[:, 0:2]
+        return start + (self.lines[:, 2:4] - start) * optimum[..., np.newaxis]
+
+    def get_centers(self) -> np.ndarray:
+        """
+        :return: (N, 2) array of the center of each waypoint line
+        """
+        return (self.lines[:, 0:2] + self.lines[:, 2:4]) / 2
+
+    def copy(self) -> "WaypointArray":
+        """
+        Create a copy of the waypoints. The line geometry is shared with this array while the optimum, sticky and
+        velocity arrays are copied.
+
+        :return: New WaypointArray sharing the lines of this array
+        """
+        return WaypointArray(self.lines, self.optimum.copy(), self.sticky.copy(), self.velocity.copy())
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __getitem__(self, item: Union[int, slice, np.ndarray]) -> Union[Waypoint, "WaypointArray"]:
+        """
+        Indexing with an integer returns a new Waypoint object. Slicing returns a WaypointArray which, as with numpy,
+        is a view onto this array, while indexing with an array of indices or a mask returns a copy.
+        """
+        if isinstance(item, (int, np.integer)):
+            waypoint = Waypoint(line=self.lines[item].tolist(), sticky=bool(self.sticky[item]), optimum=float(self.optimum[item]))
+            waypoint.v = float(self.velocity[item])
+            return waypoint
+        return WaypointArray(self.lines[item], self.optimum[item], self.sticky[item], self.velocity[item])
+
+    def __str__(self):
+        return "WaypointArray: {} waypoints".format(len(self))
@@ -0,0 +1,223 @@
+import hashlib
+import inspect
+import numbers
+import os
+import tempfile
+import zipfile
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from fsai.mapping.segment_index import SegmentIndex
+from fsai.path_planning.waypoint import Waypoint
+from fsai.path_planning.waypoint_array import WaypointArray
+from fsai.path_planning.waypoints import gen_waypoints, Boundary
+
+# bump this when the waypoint generation changes so that old results are no longer used
+CACHE_VERSION = 2
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "fsai", "waypoints")
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024  # bytes
+
+# the default of every optional parameter of 'gen_waypoints', so leaving a parameter out gives the same key as passing
+# its default
+_gen_waypoints_defaults: Dict[str, object] = {
+    name: parameter.default for name, parameter in inspect.signature(gen_waypoints).parameters.items()
+    if parameter.default is not inspect.Parameter.empty
+}
+
+
+class WaypointCache:
+    def __init__(self, directory: str = DEFAULT_CACHE_DIRECTORY, max_size: int = DEFAULT_MAX_SIZE):
+        """
+        Persistent on-disk cache of full track waypoints. Generating the waypoints of a full track is the slowest part
+        of starting up an optimiser and the result is the same every time for the same track and parameters. Results
+        are stored as .npz files named by a hash of the boundaries and every generation parameter, so changing
+        either the track or the parameters results in a new entry. Files are written to a temporary file and then
+        moved into place so a crashed or concurrent run never leaves a partial file behind. Once the cache grows
+        larger than max_size the least recently used entries are removed.
+
+        :param directory: Folder to store the cached waypoints in
+        :param max_size: Maximum total size of the cache in bytes
+        """
+        self.directory: str = directory
+        self.max_size: int = max_size
+
+    def gen_waypoints(
+            self,
+            car_pos: List[float],
+            car_angle: float,
+            blue_boundary: Boundary,
+            yellow_boundary: Boundary,
+            orange_boundary: Boundary,
+            **kwargs
+    ) -> List[Waypoint]:
+        """
+        Cached version of 'gen_waypoints', taking the same parameters. Only full track waypoints are cached, local
+        waypoints change every frame so are passed straight through to 'gen_waypoints'.
+
+        :param car_pos: The initial point to generate the waypoints from
+        :param car_angle: Orientation of the car, this will help angle the waypoints initially
+        :param blue_boundary: Blue boundary of the track, either a list of lines or a SegmentIndex
+        :param yellow_boundary: Yellow boundary of the track, either a list of lines or a SegmentIndex
+        :param orange_boundary: Orange boundary of the track, either a list of lines or a SegmentIndex
+        :param kwargs: Any other parameters of 'gen_waypoints'
+        :return: Return the list of generated waypoints
+        """
+        if not kwargs.get("full_track", False):
+            return gen_waypoints(car_pos, car_angle, blue_boundary, yellow_boundary, orange_boundary, **kwargs)
+
+        path = os.path.join(self.directory, self.get_key(
+            car_pos, car_angle, blue_boundary, yellow_boundary, orange_boundary, **kwargs
+        ) + ".npz")
+
+        waypoints = self.__load(path)
+        if waypoints is None:
+            waypoints = gen_waypoints(car_pos, car_angle, blue_boundary, yellow_boundary, orange_boundary, **kwargs)
+            self.__save(path, waypoints)
+            self.evict()
+
+        return waypoints
+
+    @staticmethod
+    def get_key(
+            car_pos: List[float],
+            car_angle: float,
+            blue_boundary: Boundary,
+            yellow_boundary: Boundary,
+            orange_boundary: Boundary,
+            **kwargs
+    ) -> str:
+        """
+        Get the key of a set of waypoints. The key is a hash of the boundary lines, the starting pose and every
+        parameter of 'gen_waypoints'. Parameters which aren't given take their default and numbers are compared as
+        floats, so calls which generate the same waypoints share a key, e.g. leaving out 'spacing' or passing 2 or 2.0.
+
+        :return: Hex digest used as the name of the cache file
+        """
+        sha = hashlib.sha256()
+        sha.update("fsai-waypoints-v{}".format(CACHE_VERSION).encode())
+        sha.update(np.asarray([car_pos[0], car_pos[1], car_angle], dtype=np.float64).tobytes())
+
+        for boundary in [blue_boundary, yellow_boundary, orange_boundary]:
+            lines = boundary.lines if isinstance(boundary, SegmentIndex) else boundary
+            lines = np.asarray(lines, dtype=np.float64).reshape(-1, 4)
+            # include the length so that lines can't move from one boundary to the next without changing the key
+            sha.update(np.int64(len(lines)).tobytes())
+            sha.update(lines.tobytes())
+
+        parameters = dict(_gen_waypoints_defaults)
+        parameters.update(kwargs)
+        for name in sorted(parameters):
+            value = parameters[name]
+            if isinstance(value, numbers.Real) and not isinstance(value, (bool, np.bool_)):
+                value = float(value)
+            sha.update("{}={!r};".format(name, value).encode())
+
+        return sha.hexdigest()
+
+    def evict(self):
+        """
+        Remove the least recently used cache files until the cache is smaller than the maximum size. Every time an
+        entry is read its modification time is updated, so the modification time gives the order the files were
+        last used in.
+        """
+        if not os.path.isdir(self.directory):
+            return
+
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                    entries.append((stat.st_mtime, stat.st_size, name))
+                except OSError:
+                    pass  # removed by another process
+
+        total_size = sum(entry[1] for entry in entries)
+        for _, size, name in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total_size -= size
+
+    def clear(self):
+        """
+        Remove every entry from the cache.
+        """
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(".npz"):
+                    os.remove(os.path.join(self.directory, name))
+
+    @staticmethod
+    def __load(path: str) -> Optional[List[Waypoint]]:
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with np.load(path) as data:
+                waypoints = WaypointArray(data["lines"], data["optimum"], data["sticky"]).to_waypoints()
+            # mark the entry as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            # evicted by another process since it was found, so it is a miss
+            return None
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            # the file is corrupt, so remove it and generate the waypoints again
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+
+        return waypoints
+
+    def __save(self, path: str, waypoints: List[Waypoint]):
+        os.makedirs(self.directory, exist_ok=True)
+        array = WaypointArray.from_waypoints(waypoints)
+
+        handle, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(handle, "wb") as file:
+                np.savez_compressed(file, lines=array.lines, optimum=array.optimum, sticky=array.sticky)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+
+__default_cache: Optional[WaypointCache] = None
+
+
+def gen_waypoints_cached(
+        car_pos: List[float],
+        car_angle: float,
+        blue_boundary: Boundary,
+        yellow_boundary: Boundary,
+        orange_boundary: Boundary,
+        cache: Optional[WaypointCache] = None,
+        **kwargs
+) -> List[Waypoint]:
+    """
+    Drop in replacement for 'gen_waypoints' which stores full track waypoints in an on-disk cache. See WaypointCache.
+
+    :param car_pos: The initial point to generate the waypoints from
+    :param car_angle: Orientation of the car, this will help angle the waypoints initially
+    :param blue_boundary: Blue boundary of the track, either a list of lines or a SegmentIndex
+    :param yellow_boundary: Yellow boundary of the track, either a list of lines or a SegmentIndex
+    :param orange_boundary: Orange boundary of the track, either a list of lines or a SegmentIndex
+    :param cache: Cache to use, defaults to a cache in the user's cache folder
+    :param kwargs: Any other parameters of 'gen_waypoints'
+    :return: Return the list of generated waypoints
+    """
+    global __default_cache
+    if cache is None:
+        if __default_cache is None:
+            __default_cache = WaypointCache()
+        cache = __default_cache
+
+    return cache.gen_waypoints(car_pos, car_angle, blue_boundary, yellow_boundary, orange_boundary, **kwargs)
@@ -0,0 +1,490 @@
+from libc.math cimport atan2, sin, cos, pow, fabs, floor, pi
+from libc.stdlib cimport malloc, calloc, free, qsort
+from libc.string cimport memset
+import cython
+import numpy as np
+
+from fsai.geometry cimport prepare_segments, score_sub_lines, cdistance
+
+# Compiled version of the create_waypoint_lines -> get_next_waypoint -> __create_radar_lines ->
+# __get_most_perpendicular_line_to_boundary chain in waypoints.py. The python functions are the reference, every
+# step here follows the same arithmetic (including where the python version rounds to a C float) so both give the
+# same waypoints. See examples/waypoints/kernel_parity.py.
+
+
+cdef struct Grid:
+    # A uniform grid over a boundary, as a SegmentIndex, so that filtering the boundary around a point only looks at
+    # the lines in the surrounding cells. Each line is registered in every cell its bounding box covers, the lines of
+    # cell i being cell_lines[cell_start[i]:cell_start[i + 1]]. The candidates and stamps are buffers for queries.
+    double min_x
+    double min_y
+    double cell_size
+    Py_ssize_t width
+    Py_ssize_t height
+    Py_ssize_t count
+    Py_ssize_t* cell_start
+    Py_ssize_t* cell_lines
+    Py_ssize_t* candidates
+    unsigned int* stamps
+    unsigned int stamp
+
+
+cdef struct Boundaries:
+    # A left and right boundary prepared for intersection tests, along with the buffers to filter them into
+    double* left_lines
+    float* left_seg
+    float* left_near
+    Grid left_grid
+    Py_ssize_t left_count
+    double* right_lines
+    float* right_seg
+    float* right_near
+    Grid right_grid
+    Py_ssize_t right_count
+
+
+cdef int prepare_boundaries(Boundaries* boundaries, double[:, ::1] left_lines, double[:, ::1] right_lines,
+                            double cell_size) except -1:
+    # The line arrays are not copied, so they must outlive the prepared boundaries. The cell size of the grids
+    # should be around the distance the boundaries are filtered by.
+    boundaries.left_seg = boundaries.right_seg = boundaries.left_near = boundaries.right_near = NULL
+    clear_grid(&boundaries.left_grid)
+    clear_grid(&boundaries.right_grid)
+    boundaries.left_count = left_lines.shape[0]
+    boundaries.right_count = right_lines.shape[0]
+    boundaries.left_lines = &left_lines[0, 0] if boundaries.left_count > 0 else NULL
+    boundaries.right_lines = &right_lines[0, 0] if boundaries.right_count > 0 else NULL
+    try:
+        boundaries.left_seg = prepare_segments(left_lines.base, boundaries.left_count)
+        boundaries.right_seg = prepare_segments(right_lines.base, boundaries.right_count)
+        prepare_grid(&boundaries.left_grid, boundaries.left_lines, boundaries.left_count, cell_size)
+        prepare_grid(&boundaries.right_grid, boundaries.right_lines, boundaries.right_count, cell_size)
+    except:
+        free_boundaries(boundaries)
+        raise
+    boundaries.left_near = <float*> malloc(max(boundaries.left_count, 1) * 7 * sizeof(float))
+    boundaries.right_near = <float*> malloc(max(boundaries.right_count, 1) * 7 * sizeof(float))
+    if boundaries.left_near == NULL or boundaries.right_near == NULL:
+        free_boundaries(boundaries)
+        raise MemoryError()
+    return 0
+
+
+cdef void free_boundaries(Boundaries* boundaries):
+    free(boundaries.left_seg)
+    free(boundaries.right_seg)
+    free(boundaries.left_near)
+    free(boundaries.right_near)
+    boundaries.left_seg = boundaries.right_seg = boundaries.left_near = boundaries.right_near = NULL
+    free_grid(&boundaries.left_grid)
+    free_grid(&boundaries.right_grid)
+
+
+cdef void clear_grid(Grid* grid):
+    grid.cell_start = grid.cell_lines = grid.candidates = NULL
+    grid.stamps = NULL
+    grid.stamp = 0
+    grid.width = grid.height = grid.count = 0
+    grid.min_x = grid.min_y = 0
+    grid.cell_size = 1
+
+
+cdef void free_grid(Grid* grid):
+    free(grid.cell_start)
+    free(grid.cell_lines)
+    free(grid.candidates)
+    free(grid.stamps)
+    clear_grid(grid)
+
+
+cdef inline Py_ssize_t grid_cell(double value, double origin, double cell_size, Py_ssize_t size):
+    cdef Py_ssize_t cell = <Py_ssize_t> floor((value - origin) / cell_size)
+    return 0 if cell < 0 else (size - 1 if cell >= size else cell)
+
+
+cdef int prepare_grid(Grid* grid, double* lines, Py_ssize_t count, double cell_size) except -1:
+    clear_grid(grid)
+    if count == 0:
+        return 0
+
+    cdef double min_x = lines[0], min_y = lines[1], max_x = lines[0], max_y = lines[1]
+    cdef Py_ssize_t index, j
+    for index in range(count):
+        for j in range(0, 4, 2):
+            min_x, max_x = min(min_x, lines[index * 4 + j]), max(max_x, lines[index * 4 + j])
+            min_y, max_y = min(min_y, lines[index * 4 + j + 1]), max(max_y, lines[index * 4 + j + 1])
+
+    # a few cells per line at most, so the grid of a sparse boundary over a large area doesn't use a lot of memory
+    cell_size = max(cell_size, 1e-6)
+    while (floor((max_x - min_x) / cell_size) + 1) * (floor((max_y - min_y) / cell_size) + 1) > max(16 * count, 1024):
+        cell_size *= 2
+    grid.min_x, grid.min_y, grid.cell_size, grid.count = min_x, min_y, cell_size, count
+    grid.width = <Py_ssize_t> floor((max_x - min_x) / cell_size) + 1
+    grid.height = <Py_ssize_t> floor((max_y - min_y) / cell_size) + 1
+
+    cdef Py_ssize_t cell_count = grid.width * grid.height
+    grid.cell_start = <Py_ssize_t*> calloc(cell_count + 1, sizeof(Py_ssize_t))
+    grid.candidates = <Py_ssize_t*> malloc(count * sizeof(Py_ssize_t))
+    grid.stamps = <unsigned int*> calloc(count, sizeof(unsigned int))
+    cdef Py_ssize_t* fill = <Py_ssize_t*> malloc(cell_count * sizeof(Py_ssize_t))
+    if grid.cell_start == NULL or grid.candidates == NULL or grid.stamps == NULL or fill == NULL:
+        free(fill)
+        free_grid(grid)
+        raise MemoryError()
+
+    # count the lines of each cell, then register each line in its cells in the order of the boundary
+    cdef Py_ssize_t min_cx, min_cy, max_cx, max_cy, cx, cy, cell
+    for j in range(2):
+        for index in range(count):
+            min_cx = grid_cell(min(lines[index * 4], lines[index * 4 + 2]), min_x, cell_size, grid.width)
+            max_cx = grid_cell(max(lines[index * 4], lines[index * 4 + 2]), min_x, cell_size, grid.width)
+            min_cy = grid_cell(min(lines[index * 4 + 1], lines[index * 4 + 3]), min_y, cell_size, grid.height)
+            max_cy = grid_cell(max(lines[index * 4 + 1], lines[index * 4 + 3]), min_y, cell_size, grid.height)
+            for cy in range(min_cy, max_cy + 1):
+                for cx in range(min_cx, max_cx + 1):
+                    cell = cy * grid.width + cx
+                    if j == 0:
+                        grid.cell_start[cell + 1] += 1
+                    else:
+                        grid.cell_lines[fill[cell]] = index
+                        fill[cell] += 1
+
+        if j == 0:
+            for cell in range(cell_count):
+                grid.cell_start[cell + 1] += grid.cell_start[cell]
+                fill[cell] = grid.cell_start[cell]
+            grid.cell_lines = <Py_ssize_t*> malloc(max(grid.cell_start[cell_count], 1) * sizeof(Py_ssize_t))
+            if grid.cell_lines == NULL:
+                free(fill)
+                free_grid(grid)
+                raise MemoryError()
+    free(fill)
+    return 0
+
+
+cdef int compare_indices(const void* a, const void* b) noexcept nogil:
+    cdef Py_ssize_t first = (<Py_ssize_t*> a)[0]
+    cdef Py_ssize_t second = (<Py_ssize_t*> b)[0]
+    return (first > second) - (first < second)
+
+
+@cython.cdivision(True)
+cdef Py_ssize_t grid_candidates(Grid* grid, float px, float py, float distance):
+    # Write the indices of the lines in the cells around the square of the distance about the point into the grid's
+    # candidates, sorted into the order of the boundary. Returns the number of candidates.
+    if grid.cell_start == NULL:
+        return 0
+
+    # the distance tests are at single precision, so the square is widened slightly to catch every line they pass
+    cdef double pad = distance * 1.001 + 0.001
+    if floor((px + pad - grid.min_x) / grid.cell_size) < 0 or floor((py + pad - grid.min_y) / grid.cell_size) < 0 or \
+            floor((px - pad - grid.min_x) / grid.cell_size) >= grid.width or \
+            floor((py - pad - grid.min_y) / grid.cell_size) >= grid.height:
+        return 0
+    cdef Py_ssize_t min_cx = grid_cell(px - pad, grid.min_x, grid.cell_size, grid.width)
+    cdef Py_ssize_t max_cx = grid_cell(px + pad, grid.min_x, grid.cell_size, grid.width)
+    cdef Py_ssize_t min_cy = grid_cell(py - pad, grid.min_y, grid.cell_size, grid.height)
+    cdef Py_ssize_t max_cy = grid_cell(py + pad, grid.min_y, grid.cell_size, grid.height)
+
+    # a line registered in several of the cells is only added once, the stamps mark the lines added by this query
+    grid.stamp += 1
+    if grid.stamp == 0:
+        memset(grid.stamps, 0, grid.count * sizeof(unsigned int))
+        grid.stamp = 1
+
+    cdef Py_ssize_t count = 0
+    cdef Py_ssize_t cx, cy, cell, k, index
+    for cy in range(min_cy, max_cy + 1):
+        for cx in range(min_cx, max_cx + 1):
+            cell = cy * grid.width + cx
+            for k in range(grid.cell_start[cell], grid.cell_start[cell + 1]):
+                index = grid.cell_lines[k]
+                if grid.stamps[index] != grid.stamp:
+                    grid.stamps[index] = grid.stamp
+                    grid.candidates[count] = index
+                    count += 1
+
+    qsort(grid.candidates, count, sizeof(Py_ssize_t), compare_indices)
+    return count
+
+
+cdef Py_ssize_t filter_segments(double* lines, float* seg, Grid* grid, float px, float py, float distance,
+                                float* out):
+    # Copy the prepared segments with at least one end closer than the distance to the point into out, keeping the
+    # order of the boundary. This is the same test as geometry.filter_lines_by_distance, only made on the lines in
+    # the grid cells around the point, as SegmentIndex.filter_lines_by_distance does.
+    cdef Py_ssize_t count = grid_candidates(grid, px, py, distance)
+    cdef Py_ssize_t near_count = 0
+    cdef Py_ssize_t candidate, index, j
+    for candidate in range(count):
+        index = grid.candidates[candidate]
+        if cdistance(px, py, lines[index * 4], lines[index * 4 + 1]) < distance or \
+                cdistance(px, py, lines[index * 4 + 2], lines[index * 4 + 3]) < distance:
+            for j in range(7):
+                out[near_count * 7 + j] = seg[index * 7 + j]
+            near_count += 1
+    return near_count
+
+
+@cython.cdivision(True)
+cdef void create_fan_template(double* template, double spacing, int line_count, double angle_span, double length,
+                              bint reverse):
+    # The fan of radar lines around the origin at an angle of 0, see __get_radar_line_template. Each line is stored
+    # as its two sub-lines [x, y, cx, cy].
+    cdef double angle_change = angle_span / (line_count - 1)
+    cdef double half = length / 2
+    cdef double angle, cos_a, sin_a, sx, sy, lx, ly, rx, ry
+    cdef Py_ssize_t i
+    for i in range(line_count):
+        angle = -angle_span / 2 + angle_change * i
+        cos_a, sin_a = cos(angle), sin(angle)
+        sx, sy = spacing * cos_a, spacing * sin_a
+        lx, ly = sx + half * sin_a, sy + half * -cos_a
+        rx, ry = sx - half * sin_a, sy - half * -cos_a
+        if reverse:
+            lx, ly, rx, ry = rx, ry, lx, ly
+        template[i * 8], template[i * 8 + 1], template[i * 8 + 2], template[i * 8 + 3] = lx, ly, sx, sy
+        template[i * 8 + 4], template[i * 8 + 5], template[i * 8 + 6], template[i * 8 + 7] = rx, ry, sx, sy
+
+
+@cython.cdivision(True)
+cdef void create_around_template(double* template, int count, double length, double total_span):
+    # The lines passing through the origin at an angle of 0, see __get_radar_lines_around_point
+    cdef double angle_change = total_span / count
+    cdef double angle, px, py
+    cdef Py_ssize_t i
+    for i in range(count):
+        angle = (-pi / 2 - total_span / 2) + angle_change * i
+        px, py = (length / 2) * cos(angle), (length / 2) * sin(angle)
+        template[i * 8], template[i * 8 + 1], template[i * 8 + 2], template[i * 8 + 3] = px, py, 0, 0
+        template[i * 8 + 4], template[i * 8 + 5], template[i * 8 + 6], template[i * 8 + 7] = -px, -py, 0, 0
+
+
+@cython.cdivision(True)
+cdef void best_radar_line(double x, double y, double angle, double* template, int line_count, float distance,
+                          Boundaries* boundaries, double bias, double bias_strength, double* best_line,
+                          double* best_optimum, bint* best_sticky):
+    # Place the template at the point and heading, then find the narrowest line after the bias is applied as
+    # __get_most_perpendicular_line_to_boundary does
+    cdef Py_ssize_t left_near_count = filter_segments(boundaries.left_lines, boundaries.left_seg,
+                                                      &boundaries.left_grid, x, y, distance, boundaries.left_near)
+    cdef Py_ssize_t right_near_count = filter_segments(boundaries.right_lines, boundaries.right_seg,
+                                                       &boundaries.right_grid, x, y, distance, boundaries.right_near)
+
+    cdef double cos_a = cos(angle)
+    cdef double sin_a = sin(angle)
+    cdef float[8] sub
+    cdef double[4] line
+    cdef double optimum, width, best_width = 0, bias_angle, bias_value
+    cdef bint is_sticky
+    cdef Py_ssize_t i, j
+    for i in range(line_count):
+        for j in range(4):
+            sub[j * 2] = template[i * 8 + j * 2] * cos_a - template[i * 8 + j * 2 + 1] * sin_a + x
+            sub[j * 2 + 1] = template[i * 8 + j * 2] * sin_a + template[i * 8 + j * 2 + 1] * cos_a + y
+
+        width = score_sub_lines(sub, boundaries.left_near, left_near_count, boundaries.right_near, right_near_count,
+                                line, &optimum, &is_sticky)
+        bias_angle = ((i + 0.5) / line_count * 2 - 1)
+        bias_value = 1 - fabs(bias_angle - bias)
+        if bias_value < 0:
+            bias_value = 0
+        width -= width * bias_value * bias_strength
+
+        if i == 0 or width < best_width:
+            best_width = width
+            best_optimum[0] = optimum
+            best_sticky[0] = is_sticky
+            for j in range(4):
+                best_line[j] = line[j]
+
+
+cdef Py_ssize_t step_chain(double x, double y, double angle, Py_ssize_t count, double spacing, bint overlap,
+                           double* template, int radar_count, float distance, Boundaries* boundaries, double bias,
+                           double bias_strength, double* out_lines, double* out_optimums, unsigned char* out_sticky,
+                           Py_ssize_t stride):
+    # The stepping loop of create_waypoint_lines. Waypoint i is written to index i * stride of the outputs. Returns
+    # how many waypoints were created.
+    cdef double initial_x = x
+    cdef double initial_y = y
+    cdef double[4] line
+    cdef double optimum
+    cdef bint is_sticky
+    cdef float next_x, next_y
+    cdef double center_x, center_y
+    cdef Py_ssize_t step, j, created = 0
+    for step in range(count):
+        best_radar_line(x, y, angle, template, radar_count, distance, boundaries, bias, bias_strength, line,
+                        &optimum, &is_sticky)
+        for j in range(4):
+            out_lines[created * stride * 4 + j] = line[j]
+        out_optimums[created * stride] = optimum
+        out_sticky[created * stride] = is_sticky
+        created += 1
+
+        # calculate the next angle and origin point as Waypoint.get_optimum_point and geometry.angle_to do
+        next_x = <float> line[0] + (<float> line[2] - <float> line[0]) * <float> optimum
+        next_y = <float> line[1] + (<float> line[3] - <float> line[1]) * <float> optimum
+        angle = <float> atan2(next_y - y, next_x - x)
+        x, y = next_x, next_y
+
+        # stop once the waypoints have looped back around to the start, see create_waypoint_lines
+        if not overlap and step > 3:
+            center_x = line[0] + (line[2] - line[0]) * <float> 0.5
+            center_y = line[1] + (line[3] - line[1]) * <float> 0.5
+            if cdistance(center_x, center_y, initial_x, initial_y) < spacing * 1.4:
+                break
+    return created
+
+
+cdef float chain_distance(double spacing, double max_radar_length):
+    # the search distance of get_next_waypoint
+    return pow(pow(spacing, 2) + pow(max_radar_length / 2, 2), 1. / 2)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef step_waypoints(
+        initial_point,
+        double initial_angle,
+        int count,
+        double spacing,
+        left_boundary,
+        right_boundary,
+        bint overlap=False,
+        bint reverse=False,
+        double bias=0,
+        double bias_strength=0,
+        double max_radar_length=20,
+        int radar_count=13,
+        double radar_angle_span=3.141592653589793
+):
+    # Run the whole waypoint stepping loop of create_waypoint_lines. The left and right boundaries are (N, 4) arrays
+    # which already include the orange boundary. Returns the (K, 4) waypoint lines, (K,) optimums and (K,) sticky
+    # flags of the K <= count waypoints created.
+    if radar_count < 2:
+        raise ValueError("There must be at least two radar lines, got {}".format(radar_count))
+    count = max(count, 0)
+    waypoint_lines = np.empty((count, 4), dtype=np.float64)
+    optimums = np.empty(count, dtype=np.float64)
+    sticky = np.zeros(count, dtype=np.uint8)
+    cdef double[:, ::1] waypoint_lines_view = waypoint_lines
+    cdef double[::1] optimums_view = optimums
+    cdef unsigned char[::1] sticky_view = sticky
+    if count == 0:
+        return waypoint_lines, optimums, sticky.view(np.bool_)
+
+    left_lines = np.ascontiguousarray(left_boundary, dtype=np.float64).reshape(-1, 4)
+    right_lines = np.ascontiguousarray(right_boundary, dtype=np.float64).reshape(-1, 4)
+    cdef float distance = chain_distance(spacing, max_radar_length)
+    cdef Boundaries boundaries
+    prepare_boundaries(&boundaries, left_lines, right_lines, distance)
+    cdef double* template = <double*> malloc(radar_count * 8 * sizeof(double))
+    cdef Py_ssize_t created = 0
+    try:
+        if template == NULL:
+            raise MemoryError()
+        create_fan_template(template, spacing, radar_count, radar_angle_span, max_radar_length, reverse)
+        created = step_chain(
+            initial_point[0], initial_point[1], initial_angle, count, spacing, overlap, template, radar_count,
+            distance, &boundaries, bias, bias_strength,
+            &waypoint_lines_view[0, 0], &optimums_view[0], &sticky_view[0], 1
+        )
+    finally:
+        free(template)
+        free_boundaries(&boundaries)
+
+    return waypoint_lines[:created], optimums[:created], sticky[:created].view(np.bool_)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef batch_waypoints(
+        poses,
+        left_boundary,
+        right_boundary,
+        int foresight=20,
+        int negative_foresight=10,
+        double spacing=2,
+        double radar_length=25,
+        int radar_count=13,
+        double radar_span=2.855993321445266,
+        double bias=0,
+        double bias_strength=0.2
+):
+    # The local waypoints of gen_waypoints for K cars at once. Each (K, 3) pose is [x, y, heading]. The boundaries
+    # are prepared once and the radar fans are created once, then shared by every car. Returns (K, N, 4) waypoint
+    # lines, (K, N) optimums and (K, N) sticky flags, where N = negative_foresight + 1 + foresight and the waypoints
+    # are in order from behind the car to in front of the car.
+    if radar_count < 2:
+        raise ValueError("There must be at least two radar lines, got {}".format(radar_count))
+    cdef double[:, :] poses_view = np.asarray(poses, dtype=np.float64).reshape(-1, 3)
+    cdef Py_ssize_t car_count = poses_view.shape[0]
+    foresight = max(foresight, 0)
+    negative_foresight = max(negative_foresight, 0)
+    cdef Py_ssize_t waypoint_count = negative_foresight + 1 + foresight
+
+    waypoint_lines = np.empty((car_count, waypoint_count, 4), dtype=np.float64)
+    optimums = np.empty((car_count, waypoint_count), dtype=np.float64)
+    sticky = np.zeros((car_count, waypoint_count), dtype=np.uint8)
+    cdef double[:, :, ::1] waypoint_lines_view = waypoint_lines
+    cdef double[:, ::1] optimums_view = optimums
+    cdef unsigned char[:, ::1] sticky_view = sticky
+    if car_count == 0:
+        return waypoint_lines, optimums, sticky.view(np.bool_)
+
+    left_lines = np.ascontiguousarray(left_boundary, dtype=np.float64).reshape(-1, 4)
+    right_lines = np.ascontiguousarray(right_boundary, dtype=np.float64).reshape(-1, 4)
+    cdef float distance = chain_distance(spacing, radar_length)
+    cdef float around_distance = radar_length / 2
+    cdef Boundaries boundaries
+    prepare_boundaries(&boundaries, left_lines, right_lines, distance)
+    cdef double* forward_template = <double*> malloc(radar_count * 8 * sizeof(double))
+    cdef double* reverse_template = <double*> malloc(radar_count * 8 * sizeof(double))
+    # the initial waypoint around the car uses lines through the car, see create_waypoint_at_pos
+    cdef double* around_template = <double*> malloc(radar_count * 8 * sizeof(double))
+
+    cdef double[4] line
+    cdef double optimum
+    cdef bint is_sticky
+    cdef double x, y
+    cdef Py_ssize_t car, j
+    try:
+        if forward_template == NULL or reverse_template == NULL or around_template == NULL:
+            raise MemoryError()
+        create_fan_template(forward_template, spacing, radar_count, radar_span, radar_length, False)
+        create_fan_template(reverse_template, spacing, radar_count, radar_span, radar_length, True)
+        create_around_template(around_template, radar_count, radar_length, radar_span)
+
+        for car in range(car_count):
+            # the initial waypoint is not biased
+            best_radar_line(poses_view[car, 0], poses_view[car, 1], poses_view[car, 2], around_template,
+                            radar_count, around_distance, &boundaries, 0, 0, line, &optimum, &is_sticky)
+            for j in range(4):
+                waypoint_lines_view[car, negative_foresight, j] = line[j]
+            optimums_view[car, negative_foresight] = optimum
+            sticky_view[car, negative_foresight] = is_sticky
+
+            x = <float> line[0] + (<float> line[2] - <float> line[0]) * <float> optimum
+            y = <float> line[1] + (<float> line[3] - <float> line[1]) * <float> optimum
+
+            # the waypoints in front of the car fill forwards from the initial waypoint, those behind it backwards
+            if foresight > 0:
+                step_chain(
+                    x, y, poses_view[car, 2], foresight, spacing, True, forward_template, radar_count, distance,
+                    &boundaries, bias, bias_strength, &waypoint_lines_view[car, negative_foresight + 1, 0],
+                    &optimums_view[car, negative_foresight + 1], &sticky_view[car, negative_foresight + 1], 1
+                )
+            if negative_foresight > 0:
+                step_chain(
+                    x, y, poses_view[car, 2] + pi, negative_foresight, spacing, True, reverse_template, radar_count,
+                    distance, &boundaries, bias, bias_strength, &waypoint_lines_view[car, negative_foresight - 1, 0],
+                    &optimums_view[car, negative_foresight - 1], &sticky_view[car, negative_foresight - 1], -1
+                )
+    finally:
+        free(forward_template)
+        free(reverse_template)
+        free(around_template)
+        free_boundaries(&boundaries)
+
+    return waypoint_lines, optimums, sticky.view(np.bool_)
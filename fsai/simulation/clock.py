@@ -0,0 +1,147 @@
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from fsai.car.physics.fleet import FleetPhysics, SEMI_IMPLICIT_EULER, INTEGRATORS
+
+DEFAULT_TIME_STEP = 0.02  # seconds of simulation per step
+DEFAULT_SUBSTEPS = 4  # physics steps per step
+DEFAULT_MAX_STEPS = 10  # steps per call to 'advance' before the clock falls behind real time
+
+
+class SimulationClock:
+    def __init__(
+            self,
+            fleet: Optional[FleetPhysics] = None,
+            time_step: float = DEFAULT_TIME_STEP,
+            substeps: int = DEFAULT_SUBSTEPS,
+            integrator: str = SEMI_IMPLICIT_EULER,
+            max_steps: int = DEFAULT_MAX_STEPS
+    ):
+        """
+        Fixed time step clock for running a simulation. The simulation only ever moves forward in steps of exactly
+        'time_step', each split into 'substeps' physics steps of the fleet, so the outcome depends on the number of
+        steps taken rather than how long each frame took, and the physics stays stable however slow the frames are.
+
+        Real time is fed in with 'advance', which takes as many steps as have built up, up to 'max_steps', carrying the
+        remainder over to the next frame. The remainder is how far through the next step the real time is, so
+        rendering 'get_render_state' interpolates the cars between the last two steps rather than showing them
+        jumping from step to step. A simulation which doesn't need to keep to real time calls 'step' directly, as
+        fast as it can.
+
+        'on_step' is called once at the start of every step, to set the controls of the cars. A simulation which steps
+        physics of its own, such as cars outside the fleet, does so in 'on_substep', which is called for every
+        substep just as the fleet is stepped, so its physics is substepped in the same way as the fleet's.
+
+        :param fleet: Fleet of cars to step, optional if the simulation steps its own physics in 'on_substep'
+        :param time_step: Time of each step in seconds
+        :param substeps: Number of physics steps each step
+        :param integrator: Integrator of the fleet's physics, SEMI_IMPLICIT_EULER or RK4, only used with a fleet
+        :param max_steps: Maximum number of steps taken by each call to 'advance'
+        """
+        if time_step <= 0:
+            raise ValueError("Time step must be positive")
+        if substeps < 1:
+            raise ValueError("There must be at least one substep")
+        if integrator not in INTEGRATORS:
+            raise ValueError("Unknown integrator '{}', expected one of {}".format(integrator, INTEGRATORS))
+
+        self.fleet: Optional[FleetPhysics] = fleet
+        self.time_step: float = time_step
+        self.substeps: int = substeps
+        self.integrator: str = integrator
+        self.max_steps: int = max_steps
+
+        self.steps: int = 0
+        self.__accumulator: float = 0
+
+        # pose of the cars at the start of the last step, for interpolating the render state
+        self.__previous_pos: Optional[np.ndarray] = None if fleet is None else fleet.pos.copy()
+        self.__previous_heading: Optional[np.ndarray] = None if fleet is None else fleet.heading.copy()
+
+    @property
+    def time(self) -> float:
+        """
+        :return: Simulated time in seconds
+        """
+        return self.steps * self.time_step
+
+    @property
+    def alpha(self) -> float:
+        """
+        :return: Fraction of the next step which has passed in real time
+        """
+        return self.__accumulator / self.time_step
+
+    def step(
+            self,
+            on_step: Callable[[float], None] = None,
+            on_substep: Callable[[float], None] = None
+    ) -> Optional[np.ndarray]:
+        """
+        Take one step of the simulation.
+
+        :param on_step: Function called with the time step at the start of the step, to set the controls of the cars
+        :param on_substep: Function called with the time of each substep, to step physics which isn't in the fleet
+        :return: Array of the distance travelled by each car of the fleet over the step, None without a fleet
+        """
+        distances = None
+        if self.fleet is not None:
+            self.__previous_pos[:] = self.fleet.pos
+            self.__previous_heading[:] = self.fleet.heading
+            distances = np.zeros(self.fleet.count)
+
+        if on_step is not None:
+            on_step(self.time_step)
+
+        substep = self.time_step / self.substeps
+        for _ in range(self.substeps):
+            if on_substep is not None:
+                on_substep(substep)
+            if self.fleet is not None:
+                distances += self.fleet.step(substep, integrator=self.integrator)
+
+        self.steps += 1
+        return distances
+
+    def advance(
+            self,
+            elapsed: float,
+            on_step: Callable[[float], None] = None,
+            on_substep: Callable[[float], None] = None
+    ) -> int:
+        """
+        Take the steps which have built up after some real time has passed. If more than 'max_steps' have built up
+        the extra time is dropped, so the simulation runs slower than real time rather than falling further behind.
+
+        :param elapsed: Real time since the last call in seconds
+        :param on_step: Function called at the start of each step, see 'step'
+        :param on_substep: Function called at each substep, see 'step'
+        :return: Number of steps taken
+        """
+        self.__accumulator += max(0.0, elapsed)
+
+        steps = 0
+        while self.__accumulator >= self.time_step and steps < self.max_steps:
+            self.step(on_step, on_substep)
+            self.__accumulator -= self.time_step
+            steps += 1
+
+        if self.__accumulator >= self.time_step:
+            self.__accumulator %= self.time_step
+        return steps
+
+    def get_render_state(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the pose of each car of the fleet interpolated between the last two steps by how far through the next
+        step the real time is.
+
+        :return: (N, 2) array of positions and (N,) array of headings
+        """
+        if self.fleet is None:
+            raise ValueError("The clock has no fleet to render")
+
+        alpha = self.alpha
+        pos = self.__previous_pos + (self.fleet.pos - self.__previous_pos) * alpha
+        heading = self.__previous_heading + (self.fleet.heading - self.__previous_heading) * alpha
+        return pos, heading
@@ -0,0 +1,291 @@
+import time
+from typing import Callable, List, Optional, Union
+
+import numpy as np
+
+from fsai import geometry
+from fsai.car.car import Car
+from fsai.car.physics.advanced import CarPhysics
+from fsai.car.physics.fleet import FleetPhysics, SEMI_IMPLICIT_EULER
+from fsai.mapping.segment_index import SegmentIndex
+from fsai.objects.track import Track
+from fsai.simulation.clock import SimulationClock, DEFAULT_TIME_STEP, DEFAULT_SUBSTEPS
+
+DEFAULT_EPISODE_TIME = 60  # seconds of simulation before an episode ends
+DEFAULT_RENDER_EVERY = 10  # steps between calls to the render callback
+STALL_TIME = 5  # seconds over which a car must travel at least STALL_DISTANCE
+STALL_DISTANCE = 5  # meters
+
+
+class EpisodeResult:
+    def __init__(self, episode: int, distances: np.ndarray, crashed: np.ndarray, steps: int, time_step: float,
+                 wall_time: float):
+        """
+        The outcome of an episode of a headless run.
+
+        :param episode: Number of the episode, counting from 0
+        :param distances: (N,) array of the distance travelled by each car
+        :param crashed: (N,) array of whether each car hit the boundary or stalled
+        :param steps: Number of steps the episode took
+        :param time_step: Time of each step in seconds
+        :param wall_time: Real time taken by the episode in seconds
+        """
+        self.episode: int = episode
+        self.distances: np.ndarray = distances
+        self.crashed: np.ndarray = crashed
+        self.steps: int = steps
+        self.time: float = steps * time_step
+        self.wall_time: float = wall_time
+        self.steps_per_second: float = steps / wall_time if wall_time > 0 else float("inf")
+
+    def __repr__(self):
+        return "Episode {}: {:.1f}s in {:.2f}s ({:.0f} steps/s), furthest {:.1f}m, {} of {} cars crashed".format(
+            self.episode, self.time, self.wall_time, self.steps_per_second, np.max(self.distances, initial=0),
+            np.sum(self.crashed), len(self.crashed)
+        )
+
+
+class HeadlessRunner:
+    def __init__(
+            self,
+            track: Union[str, Track],
+            car_count: int,
+            controller: Callable[["HeadlessRunner"], None] = None,
+            render: Callable[["HeadlessRunner"], None] = None,
+            render_every: int = DEFAULT_RENDER_EVERY,
+            episode_time: float = DEFAULT_EPISODE_TIME,
+            time_step: float = DEFAULT_TIME_STEP,
+            substeps: int = DEFAULT_SUBSTEPS,
+            integrator: str = SEMI_IMPLICIT_EULER,
+            verbose: bool = False
+    ):
+        """
+        Run car simulations without a display, as fast as the physics allows. Each episode spawns 'car_count' cars
+        at the start of the track as one fleet and steps them through a SimulationClock: the controller sets the
+        controls of the cars, the fleet's physics moves them, then any car whose body crosses the track boundary,
+        found through a SegmentIndex, or which has stalled is stopped and plays no further part in the episode. The
+        episode ends once every car has stopped or the episode time has passed.
+
+        The controller is called with the runner at every step and sets 'fleet.steer', 'fleet.throttle' and
+        'fleet.brake', for example from 'fleet.pos' and 'fleet.heading'. The controls of cars which are no longer
+        alive are ignored. Drawing is optional and decimated, the render callback is only called every 'render_every'
+        steps, so it can draw to a window without holding back the simulation.
+
+        :param track: Track or path to a track json file, the cars start at the track's first car
+        :param car_count: Number of cars in each episode
+        :param controller: Function setting the controls of the fleet at each step
+        :param render: Function called with the runner every 'render_every' steps
+        :param render_every: Number of steps between renders
+        :param episode_time: Maximum simulated time of each episode in seconds
+        :param time_step: Time of each step in seconds
+        :param substeps: Number of physics steps each step
+        :param integrator: Integrator of the physics, SEMI_IMPLICIT_EULER or RK4
+        :param verbose: Print the result of each episode
+        """
+        if car_count < 1:
+            raise ValueError("There must be at least one car")
+
+        self.car_count: int = car_count
+        self.controller: Optional[Callable[["HeadlessRunner"], None]] = controller
+        self.render: Optional[Callable[["HeadlessRunner"], None]] = render
+        self.render_every: int = max(1, render_every)
+        self.episode_time: float = episode_time
+        self.time_step: float = time_step
+        self.substeps: int = substeps
+        self.integrator: str = integrator
+        self.verbose: bool = verbose
+
+        self.track: Optional[Track] = None
+        self.blue_boundary, self.yellow_boundary, self.orange_boundary = [], [], []
+        self.boundary_index: SegmentIndex = SegmentIndex([])
+        self.set_track(track)
+
+        # state of the current episode
+        self.episode: int = -1
+        self.fleet: Optional[FleetPhysics] = None
+        self.cars: List[Car] = []
+        self.clock: Optional[SimulationClock] = None
+        self.alive: np.ndarray = np.zeros(car_count, dtype=bool)
+        self.crashed: np.ndarray = np.zeros(car_count, dtype=bool)
+        self.__stall_distances: np.ndarray = np.zeros(car_count)
+        self.__stall_steps: int = 1
+        self.__body_x: np.ndarray = np.zeros((car_count, 4))
+        self.__body_y: np.ndarray = np.zeros((car_count, 4))
+
+        # steps and real time across every episode, for the steps per second
+        self.total_steps: int = 0
+        self.total_time: float = 0
+
+    @property
+    def steps_per_second(self) -> float:
+        """
+        :return: Steps taken per second of real time over every episode run
+        """
+        return self.total_steps / self.total_time if self.total_time > 0 else 0
+
+    def set_track(self, track: Union[str, Track]):
+        """
+        Change the track, taking effect from the next episode.
+
+        :param track: Track or path to a track json file
+        """
+        self.track = Track(track) if isinstance(track, str) else track
+        if len(self.track.cars) == 0:
+            raise ValueError("The track has no car to start from")
+
+        self.blue_boundary, self.yellow_boundary, self.orange_boundary = self.track.get_boundary()
+        boundary = [line for lines in [self.blue_boundary, self.yellow_boundary, self.orange_boundary] for line in lines]
+        self.boundary_index = SegmentIndex([list(line) for line in boundary])
+
+    def new_episode(self):
+        """
+        Spawn a new fleet of cars at the start of the track.
+        """
+        start = self.track.cars[0]
+        self.episode += 1
+        self.fleet = FleetPhysics(self.car_count)
+        self.cars = []
+        for index in range(self.car_count):
+            self.fleet.copy_row(index, start.fleet, start.index)
+            car = Car(fleet=self.fleet, index=index)
+            car.physics = CarPhysics(car)
+            car.width, car.wheel_width = start.width, start.wheel_width
+            car.cg_to_front, car.cg_to_rear = start.cg_to_front, start.cg_to_rear
+            self.cars.append(car)
+
+        self.clock = SimulationClock(self.fleet, self.time_step, self.substeps, self.integrator)
+        self.alive = np.ones(self.car_count, dtype=bool)
+        self.crashed = np.zeros(self.car_count, dtype=bool)
+        self.__stall_distances = np.zeros(self.car_count)
+        self.__stall_steps = max(1, round(STALL_TIME / self.time_step))
+
+        # corners of the body of each car about its centre of gravity, as in EvolutionarySimulation.has_intersected
+        front, rear = start.cg_to_front, start.cg_to_rear
+        half_width = (start.width + start.wheel_width) / 2
+        self.__body_x = np.tile([front, front, -rear, -rear], (self.car_count, 1))
+        self.__body_y = np.tile([-half_width, half_width, half_width, -half_width], (self.car_count, 1))
+
+    def step(self):
+        """
+        Take one step of the current episode.
+        """
+        self.clock.step(self.__control)
+        self.__check_collisions()
+
+        if self.clock.steps % self.__stall_steps == 0:
+            stalled = self.alive & (self.fleet.distance_travelled - self.__stall_distances < STALL_DISTANCE)
+            self.__stop_cars(stalled)
+            self.__stall_distances = self.fleet.distance_travelled.copy()
+
+        if self.render is not None and self.clock.steps % self.render_every == 0:
+            self.render(self)
+
+    def is_episode_running(self) -> bool:
+        """
+        :return: Whether any car is still alive and the episode time hasn't passed
+        """
+        return self.clock is not None and np.any(self.alive) and self.clock.time < self.episode_time
+
+    def run_episode(self) -> EpisodeResult:
+        """
+        Run a new episode to its end.
+
+        :return: Result of the episode
+        """
+        self.new_episode()
+        start = time.time()
+        while self.is_episode_running():
+            self.step()
+        wall_time = time.time() - start
+
+        self.total_steps += self.clock.steps
+        self.total_time += wall_time
+        result = EpisodeResult(
+            self.episode, self.fleet.distance_travelled.copy(), self.crashed.copy(), self.clock.steps,
+            self.time_step, wall_time
+        )
+        if self.verbose:
+            print(result)
+        return result
+
+    def run(
+            self,
+            episodes: Optional[int] = None,
+            time_budget: Optional[float] = None,
+            on_episode_start: Callable[["HeadlessRunner"], None] = None,
+            on_episode_end: Callable[["HeadlessRunner", EpisodeResult], None] = None
+    ) -> List[EpisodeResult]:
+        """
+        Run episodes back to back until the number of episodes have run or the time budget is spent. The budget is
+        soft: it is checked between episodes, so a started episode always runs to its end and the run can go over
+        the budget by up to one episode.
+
+        :param episodes: Number of episodes to run
+        :param time_budget: Real time in seconds after which no new episode is started
+        :param on_episode_start: Function called with the runner before each episode, e.g. to change the track
+        :param on_episode_end: Function called with the runner and the result after each episode
+        :return: Result of each episode
+        """
+        if episodes is None and time_budget is None:
+            raise ValueError("Either the number of episodes or a time budget is needed")
+
+        start = time.time()
+        results = []
+        while (episodes is None or len(results) < episodes) and \
+                (time_budget is None or time.time() - start < time_budget):
+            if on_episode_start is not None:
+                on_episode_start(self)
+            result = self.run_episode()
+            results.append(result)
+            if on_episode_end is not None:
+                on_episode_end(self, result)
+
+        if self.verbose:
+            print("Ran {} episodes in {:.2f}s, {:.0f} steps/s".format(
+                len(results), time.time() - start, self.steps_per_second
+            ))
+        return results
+
+    def __control(self, dt: float):
+        if self.controller is not None:
+            self.controller(self)
+
+        dead = ~self.alive
+        self.fleet.steer[dead] = 0
+        self.fleet.throttle[dead] = 0
+        self.fleet.brake[dead] = 0
+
+    def __check_collisions(self):
+        alive = np.flatnonzero(self.alive)
+        if len(alive) == 0 or len(self.boundary_index) == 0:
+            return
+
+        # corners of the body of each car, front right, front left, rear left, rear right
+        local_x, local_y = self.__body_x[alive], self.__body_y[alive]
+
+        heading = self.fleet.heading[alive, np.newaxis]
+        sn, cs = np.sin(heading), np.cos(heading)
+        corners = np.stack([cs * local_x - sn * local_y, sn * local_x + cs * local_y], axis=-1)
+        corners += self.fleet.pos[alive, np.newaxis]
+        minimums, maximums = np.min(corners, axis=1), np.max(corners, axis=1)
+        edges = np.concatenate([corners, np.roll(corners, -1, axis=1)], axis=-1)
+
+        crashed = np.zeros(self.car_count, dtype=bool)
+        for i, car_index in enumerate(alive):
+            lines = self.boundary_index.filter_lines_by_bbox(
+                minimums[i, 0], minimums[i, 1], maximums[i, 0], maximums[i, 1]
+            )
+            if len(lines) > 0:
+                _, hits = geometry.nearest_segment_intersections(edges[i], lines)
+                crashed[car_index] = np.any(hits)
+        self.__stop_cars(crashed)
+
+    def __stop_cars(self, cars: np.ndarray):
+        # stopped cars are held still, without throttle the fleet keeps them stopped
+        self.alive &= ~cars
+        self.crashed |= cars
+        self.fleet.velocity[cars] = 0
+        self.fleet.yaw_rate[cars] = 0
+        self.fleet.steer[cars] = 0
+        self.fleet.throttle[cars] = 0
+        self.fleet.brake[cars] = 0
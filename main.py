@@ -6,14 +6,15 @@ import cv2
 from fsai.mapping.boundary_estimation import get_delaunay_triangles
 from fsai.objects.track import Track
 from fsai.path_planning.waypoint import Waypoint
-from fsai.path_planning.waypoints import gen_waypoints, encode
+from fsai.path_planning.waypoints import encode
+from fsai.path_planning.waypoint_cache import gen_waypoints_cached
 from fsai.visualisation.draw_opencv import render, render_area
 from fsai import geometry
 from optimalTrackTester.geneticTestUtils import get_track_time
 
 
 def generate_waypoints(initial_car, left_boundary, right_boundary, orange_boundary):
-    waypoints = gen_waypoints(
+    waypoints = gen_waypoints_cached(
         car_pos=initial_car.pos,
         car_angle=initial_car.heading,
         blue_boundary=left_boundary,
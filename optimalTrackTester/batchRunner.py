@@ -0,0 +1,152 @@
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import traceback
+
+from fsai import geometry
+from optimalTrackTester.geneticTestUtils import get_track_result
+from optimalTrackTester.geneticTextStandard import OptimalPathStandardEvolver
+
+SERVER_TESTING_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server_testing")
+
+TRACKS_FOLDER = os.path.join(SERVER_TESTING_FOLDER, "tracks")
+RESULTS_FOLDER = os.path.join(SERVER_TESTING_FOLDER, "annotated")
+CHECKPOINTS_FOLDER = os.path.join(SERVER_TESTING_FOLDER, "checkpoints")
+
+MAX_ITERATIONS = 100
+TIME_BUDGET = 30 * 60  # seconds per track
+
+
+def list_jobs(tracks_folder=TRACKS_FOLDER):
+    """
+    Get the name of every track to optimise, each track being optimised in both directions.
+
+    :param tracks_folder: Folder of track files
+    :return: Sorted list of track names, reversed tracks end in '.reversed'
+    """
+    jobs = []
+    for track in sorted(os.listdir(tracks_folder)):
+        if track[0] != "." and track.endswith(".json"):
+            track_name = track.replace(".json", "")
+            jobs.append(track_name)
+            jobs.append(track_name + ".reversed")
+    return jobs
+
+
+def run_job(job):
+    """
+    Optimise the racing line of a single track and save the result in the same format as the server's 'save_track'.
+    The optimiser checkpoints as it runs, so a job that was interrupted continues from where it stopped. A job which
+    fails prints its error rather than raising it, so the rest of the batch carries on, and keeps its checkpoint so
+    it resumes the next time the batch is run.
+
+    :param job: Tuple of the track name, tracks folder, results folder, checkpoints folder, time budget and the
+    number of iterations
+    :return: The track name, lap time (None if the job failed) and the number of seconds the job ran for
+    """
+    name = job[0]
+    start = time.time()
+    try:
+        best_time = __optimise_track(*job)
+    except Exception:
+        print("{} failed:\n{}".format(name, traceback.format_exc().rstrip()), flush=True)
+        best_time = None
+    return name, best_time, time.time() - start
+
+
+def __optimise_track(name, tracks_folder, results_folder, checkpoints_folder, time_budget, intervals):
+    checkpoint_path = os.path.join(checkpoints_folder, name + ".npz")
+    evolver = OptimalPathStandardEvolver(
+        name,
+        checkpoint_path=checkpoint_path,
+        resume=True,
+        track_path=os.path.join(tracks_folder, "{}.json"),
+        intervals=intervals,
+        workers=1  # the batch runner already runs one job per process
+    )
+    best_time, waypoints = evolver.optimise(time_budget)
+
+    points = [w.get_optimum_point() for w in waypoints]
+    result = get_track_result(waypoints, best_time)
+    result["distance"] = sum(geometry.distance(points[i - 1], points[i]) for i in range(len(points)))
+    result["iterations"] = evolver.interval
+
+    __write_json(os.path.join(results_folder, name + ".json"), result)
+    # the result is saved, so the job won't run again
+    os.remove(checkpoint_path)
+
+    return best_time
+
+
+def run_batch(
+        tracks_folder=TRACKS_FOLDER,
+        results_folder=RESULTS_FOLDER,
+        checkpoints_folder=CHECKPOINTS_FOLDER,
+        workers=None,
+        time_budget=TIME_BUDGET,
+        intervals=MAX_ITERATIONS
+):
+    """
+    Optimise every track which doesn't have a result yet, running one track per worker process. Results are only
+    written once a track is finished, so the batch can be stopped and started again at any time: finished tracks are
+    skipped and unfinished tracks resume from their checkpoints.
+
+    :param tracks_folder: Folder of track files
+    :param results_folder: Folder to save the results to
+    :param checkpoints_folder: Folder to save the checkpoints of unfinished tracks to
+    :param workers: Number of tracks to optimise at once, defaults to the number of CPUs
+    :param time_budget: Maximum number of seconds to spend on each track
+    :param intervals: Number of iterations of the optimiser for each track
+    """
+    os.makedirs(results_folder, exist_ok=True)
+    os.makedirs(checkpoints_folder, exist_ok=True)
+
+    jobs = [
+        (name, tracks_folder, results_folder, checkpoints_folder, time_budget, intervals)
+        for name in list_jobs(tracks_folder)
+        if not os.path.exists(os.path.join(results_folder, name + ".json"))
+    ]
+    print("{} tracks to optimise".format(len(jobs)))
+
+    start = time.time()
+    failed = []
+    # a new process for each job so nothing is carried from one track to the next
+    with multiprocessing.Pool(workers or multiprocessing.cpu_count(), maxtasksperchild=1) as pool:
+        for completed, (name, best_time, seconds) in enumerate(pool.imap_unordered(run_job, jobs)):
+            if best_time is None:
+                failed.append(name)
+                print("[{}/{}] {}: failed after {:.0f}s".format(completed + 1, len(jobs), name, seconds))
+            else:
+                print("[{}/{}] {}: {} in {:.0f}s".format(completed + 1, len(jobs), name, best_time, seconds))
+
+    print("Finished {} tracks in {:.0f}s".format(len(jobs) - len(failed), time.time() - start))
+    if len(failed) > 0:
+        print("{} tracks failed: {}".format(len(failed), ", ".join(failed)))
+
+
+def __write_json(path, data):
+    # write to a temporary file first so a result is never partially written
+    handle, temp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(handle, "w") as file:
+            file.write(json.dumps(data))
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tracks", default=TRACKS_FOLDER, help="Folder of tracks to optimise")
+    parser.add_argument("--results", default=RESULTS_FOLDER, help="Folder to save results to")
+    parser.add_argument("--checkpoints", default=CHECKPOINTS_FOLDER, help="Folder for checkpoints of unfinished tracks")
+    parser.add_argument("--workers", type=int, default=None, help="Tracks to optimise at once, defaults to one per CPU")
+    parser.add_argument("--time-budget", type=float, default=TIME_BUDGET, help="Maximum seconds per track")
+    parser.add_argument("--iterations", type=int, default=MAX_ITERATIONS, help="Optimiser iterations per track")
+    args = parser.parse_args()
+
+    run_batch(args.tracks, args.results, args.checkpoints, args.workers, args.time_budget, args.iterations)
@@ -8,7 +8,8 @@ import numpy as np
 
 from fsai.objects.track import Track
 from fsai.visualisation.draw_opencv import render
-from fsai.path_planning.waypoints import gen_waypoints, encode
+from fsai.path_planning.waypoints import encode
+from fsai.path_planning.waypoint_cache import gen_waypoints_cached
 
 CAR_COUNT = 500
 FORESIGHT = 10
@@ -135,7 +136,7 @@ def print_episode_summary(track_name, track_reversed, track_time, track_distance
 
 
 def generate_target_line(initial_car, left_boundary, right_boundary, orange_boundary):
-    waypoints = gen_waypoints(
+    waypoints = gen_waypoints_cached(
         car_pos=initial_car.pos,
         car_angle=initial_car.heading,
         blue_boundary=left_boundary,
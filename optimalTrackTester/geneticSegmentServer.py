@@ -1,16 +1,16 @@
-import random
 import json
 import os
-import time
-import uuid
 
 from flask import Flask, escape, request, Response, abort
 
+from optimalTrackTester.jobStore import JobStore
+
 app = Flask(__name__)
 
 MAX_ITERATIONS = 100
+LEASE_SECONDS = 4 * 60 * 60  # time a client has to save a track before it is given to another client
 
-root_path = "/Users/samgarlick/Developer/GitHub/OS-FS-AI/server_testing/"
+root_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server_testing", "")
 
 completed_folder = root_path + "annotated/"
 tracks_folder = root_path + "tracks/"
@@ -47,48 +47,16 @@ overview_code = """
 </body>
 </html>"""
 
-def list_tracks():
-    tracks = {}
+def list_track_names():
+    track_names = []
     for track in os.listdir(tracks_folder):
         if track[0] != ".":
             track_name = track.replace(".json", "")
-            load_track_variants(tracks, track_name)
-    return tracks
-
-
-def load_track_variants(data, track_name):
-    data[track_name] = load_overview_data(track_name)
-    data[track_name + ".reversed"] = load_overview_data(track_name + ".reversed")
-    # data[track_name + ".tight"] = load_overview_data(track_name + ".tight")
-    # data[track_name + ".reversed.tight"] = load_overview_data(track_name + ".reversed.tight")
-
-
-def load_overview_data(track_name):
-    data = {
-        "time": -1,
-        "distance": 0,
-        "processing": False,
-        "processed": False,
-        "process_time": -1,
-        "iterations": 0
-    }
-
-    completed_path = completed_folder + track_name + ".json"
-    processing_path = processing_folder + track_name + ".json"
-
-    if os.path.exists(completed_path):
-        data["processed"] = True
-        processed_data = load_json(completed_path)
-        data["time"] = processed_data["time"]
-        data["distance"] = processed_data["distance"]
-        data["iterations"] = processed_data["iterations"]
-
-    elif os.path.exists(processing_path):
-        data["processing"] = True
-        processed_data = load_json(processing_path)
-        data["process_time"] = time.time() - processed_data["start"]
-
-    return data
+            track_names.append(track_name)
+            track_names.append(track_name + ".reversed")
+            # track_names.append(track_name + ".tight")
+            # track_names.append(track_name + ".reversed.tight")
+    return track_names
 
 
 def load_json(path):
@@ -96,37 +64,60 @@ def load_json(path):
         return json.loads(file.read())
 
 
-def get_random_unprocessed():
-    all_tracks = list_tracks()
+def create_job_store():
+    store = JobStore(root_path + "jobs.sqlite", lease=LEASE_SECONDS)
+    store.add_tracks(list_track_names())
+
+    # bring across any results and claims saved to the folders before the store was used, the folders are only
+    # read once here rather than on every request
+    for track_name in list_track_names():
+        job = store.get_job(track_name)
+        completed_path = completed_folder + track_name + ".json"
+        processing_path = processing_folder + track_name + ".json"
+
+        if not job["processed"] and os.path.exists(completed_path):
+            processed_data = load_json(completed_path)
+            store.complete(
+                track_name,
+                None,
+                processed_data["time"],
+                processed_data.get("distance", 0),
+                processed_data.get("iterations", 0)
+            )
+        elif not job["processing"] and not job["processed"] and os.path.exists(processing_path):
+            processing_data = load_json(processing_path)
+            store.restore_claim(track_name, processing_data["uuid"], processing_data["start"])
+    return store
 
-    unprocessed_tracks = [track_name for track_name in all_tracks.keys() if not all_tracks[track_name]["processing"] and not all_tracks[track_name]["processed"]]
 
-    if len(unprocessed_tracks) > 0:
-        return random.choice(unprocessed_tracks)
-    return None
+store = create_job_store()
 
 
 @app.route('/new/')
 def get_track():
-    current_track = get_random_unprocessed()
-    print(current_track)
-    if current_track is not None:
-        id = uuid.uuid1()
-        with open(processing_folder + current_track + ".json", "w+") as file:
-            file.write(json.dumps({
-                "start": time.time(),
-                "uuid": str(id)
-            }))
-
+    claim = store.claim()
+    print(claim)
+    if claim is not None:
+        current_track, id = claim
         return {
             "name": current_track,
             "data": load_json(tracks_folder + current_track.split(".")[0] + ".json"),
-            "uuid": str(id),
+            "uuid": id,
             "intervals": MAX_ITERATIONS
         }
     return abort(444)
 
 
+@app.route('/renew/', methods=["post"])
+def renew_track():
+    name = request.form.get("name", None)
+    uuid = request.form.get("uuid", None)
+
+    if name and uuid and store.renew(name, uuid):
+        return "cheers"
+    return "norty"
+
+
 @app.route('/save/', methods=["post"])
 def save_track():
     print(request.form)
@@ -136,14 +127,11 @@ def save_track():
     uuid = request.form.get("uuid", None)
 
     if name and data and uuid:
-        processing_path = processing_folder + name + ".json"
-        if os.path.exists(processing_path):
-            processing_data = load_json(processing_path)
-            if processing_data["uuid"] == uuid:
-                os.remove(processing_path)
-                with open(completed_folder + name + ".json", "w+") as file:
-                    file.write(data)
-                return "cheers"
+        result = json.loads(data)
+        if store.complete(name, uuid, result["time"], result.get("distance", 0), result.get("iterations", 0)):
+            with open(completed_folder + name + ".json", "w+") as file:
+                file.write(data)
+            return "cheers"
     return "norty"
 
 
@@ -151,7 +139,7 @@ def save_track():
 def hello_world():
     table_code = ""
 
-    tracks = list_tracks()
+    tracks = store.get_jobs()
     for track in tracks.keys():
         table_code += """
             <tr>
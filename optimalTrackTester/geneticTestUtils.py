@@ -1,5 +1,6 @@
 import json
 import math
+import os
 import time
 
 import pygame
@@ -7,13 +8,14 @@ import requests
 
 from fsai import geometry
 from fsai.objects.track import Track
+from fsai.path_planning.lap_time import solve_velocity_profile, DEFAULT_MAX_ACCELERATION, DEFAULT_MAX_BRAKING
 from fsai.visualisation.draw_pygame import render
 
 URL_NEW = "http://127.0.0.1:8080/new/"
 URL_POST = "http://127.0.0.1:8080/save/"
 
 
-TRACK_PATH = "/Users/samgarlick/Developer/GitHub/OS-FS-AI/examples/data/tracks/{}.json"
+TRACK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples", "data", "tracks", "{}.json")
 
 
 def get_track_from_server():
@@ -36,12 +38,12 @@ def get_track_from_server():
     return name, uuid, initial_car, left_boundary, right_boundary, orange_boundary, intervals
 
 
-def get_track_from_files(track_name):
+def get_track_from_files(track_name, track_path=TRACK_PATH):
     uuid = -1
     intervals = 50000
     print(track_name)
 
-    track = Track(TRACK_PATH.format(track_name.replace(".reversed", "")))
+    track = Track(track_path.format(track_name.replace(".reversed", "")))
     initial_car = track.cars[0]
 
     left_boundary, right_boundary, orange_boundary = track.get_boundary()
@@ -53,71 +55,44 @@ def get_track_from_files(track_name):
     return track_name, uuid, initial_car, left_boundary, right_boundary, orange_boundary, intervals
 
 
-def send_track_to_server(track_name, waypoints, best_time, uuid):
-    best_result = best_time
-
-    dict = {
-        "time": best_result,
+def get_track_result(waypoints, best_time):
+    return {
+        "time": best_time,
         "waypoints": [{
             "x1": waypoint.line[0],
             "y1": waypoint.line[1],
             "x2": waypoint.line[2],
             "y2": waypoint.line[3],
             "pos": waypoint.optimum,
-            "v": waypoint.optimum
+            "v": waypoint.optimum,
+            "velocity": getattr(waypoint, "v", 0)
         } for waypoint in waypoints]
     }
 
+
+def send_track_to_server(track_name, waypoints, best_time, uuid):
     x = requests.post(URL_POST, data={
         "name": track_name,
         "uuid": uuid,
-        "data": json.dumps(dict)
+        "data": json.dumps(get_track_result(waypoints, best_time))
     })
     print("Sending data to server: " + str(x.status_code))
 
 
-def get_track_time(waypoints, max_frictional_force, max_speed):
-    # get waypoint - waypoint angle
-    waypoint_length = len(waypoints)
-
+def get_track_time(waypoints, max_frictional_force, max_speed, max_acceleration=DEFAULT_MAX_ACCELERATION,
+                   max_braking=DEFAULT_MAX_BRAKING):
     optimum_points = [w.get_optimum_point() for w in waypoints]
     optimum_points = [optimum_points[-1]] + optimum_points + [optimum_points[0]]
 
     radii, lengths = geometry.get_corner_radii_for_points(optimum_points)
 
     velocities = geometry.get_max_velocities_from_corners(radii, max_frictional_force, max_speed)
-
-    for i in range(10):
-        velocities = smooth_velocity(velocities)
+    velocities, total_time = solve_velocity_profile(velocities, lengths, max_acceleration, max_braking)
 
     for i in range(len(velocities)):
-        waypoints[i].v = velocities[i]
-
-    total_time = 0
-    for i in range(waypoint_length):
-        if velocities[i] == 0:
-            return math.inf
-        total_time += lengths[i] / velocities[i]
-
-    return total_time
+        waypoints[i].v = float(velocities[i])
 
-
-def smooth_velocity(velocities):
-    vel_length = len(velocities)
-    new_velocities = []
-    for i in range(len(velocities)):
-        pv = velocities[i - 1]
-        cv = velocities[i]
-        nv = velocities[(i + 1) % vel_length]
-        v = cv
-        if nv < cv:
-            print("{} {}".format(nv, cv))
-            v = nv + (cv - nv) * 0.95  # higher value means better brakes
-            cv = v
-        if pv < cv:
-            v = pv + (cv - pv) * 0.3  # higher bias means faster acceleration
-        new_velocities.append(v)
-    return new_velocities
+    return float(total_time)
 
 
 def render_scene(screen, screen_size, waypoints_list, line_width=4):
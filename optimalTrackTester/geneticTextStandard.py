@@ -1,14 +1,20 @@
-import copy
-import random
+import argparse
+import os
 import time
 import math
 
+import numpy as np
 import pygame
 
-from fsai.path_planning.waypoints import gen_waypoints, encode, decimate_waypoints
+from fsai.car.physics.openVehicle import VehicleModel
+from fsai.path_planning.parallel_lap_time import ParallelLapTimeEvaluator
+from fsai.path_planning.ggv_lap_time import GGVLapTime
+from fsai.path_planning.waypoint_array import WaypointArray
+from fsai.path_planning.waypoints import encode, decimate_waypoints
+from fsai.path_planning.waypoint_cache import gen_waypoints_cached
+from optimalTrackTester.checkpoint import save_checkpoint, load_checkpoint
 from optimalTrackTester.geneticTestUtils import get_track_time, send_track_to_server, render_scene, \
-    get_track_from_server, get_track_from_files, printProgressBar
-from fsai import geometry
+    get_track_from_server, get_track_from_files, printProgressBar, TRACK_PATH
 
 WAYPOINT_VARIATION_COUNT = 100
 WAYPOINT_SELECTION = 25
@@ -16,16 +22,20 @@ WAYPOINT_OFFSPRING = 4
 STEP_SIZE = 0.0001
 RENDER = False
 SEGMENTS = 4
+# processes used to evaluate the population, None for one per CPU. Serial by default, the pool is opt-in until a
+# measured gain over the vectorised evaluator justifies the cost of starting it and sending the population across
+WORKERS = 1
+CHECKPOINT_SECONDS = 5
+# skip the rest of the evaluation of offspring which can't make the next selection. Off by default as at STEP_SIZE
+# the offspring are too close to their parents for any to be pruned, so it only pays off with large step sizes
+BOUNDED_EVALUATION = False
+# vehicle spec (.json) or saved vehicle model (.npz) to find lap times from its GGV map, None for the friction circle
+VEHICLE = None
 
 
 class OptimalPathStandardEvolver:
-    def __init__(self):
-        self.name, self.uuid, self.initial_car, left_boundary, right_boundary, orange_boundary, self.intervals = get_track_from_files("azure_circuit")
-        self.boundary = left_boundary + right_boundary + orange_boundary
-
-        self.initial_waypoints = generate_waypoints(self.initial_car, left_boundary, right_boundary, orange_boundary)
-        self.waypoint_count = len(self.initial_waypoints)
-
+    def __init__(self, track_name="azure_circuit", checkpoint_path=None, resume=False, track_path=TRACK_PATH,
+                 intervals=None, workers=WORKERS, vehicle=VEHICLE):
         car_mass = 0.74  # tonne
         gravity = 9.81
         frictional_force = 1.7
@@ -33,85 +43,184 @@ class OptimalPathStandardEvolver:
         self.max_lateral_frictional_force = frictional_force * gravity * car_mass
         self.max_speed = 104  # meters per second
 
-        random.seed(0)
-
-        self.time_a = 0
-        self.time_b = 0
-        self.time_c = 0
-        self.time_d = 0
-        self.time_e = 0
-        self.time_f = 0
-        self.count = 0
-
-        self.waypoint_variations = []
-        for i in range(WAYPOINT_VARIATION_COUNT):
-            new_waypoints = copy.deepcopy(self.initial_waypoints)
-            # for j in range(self.waypoint_count):
-            #     new_waypoints[j].optimum = random.random()
-            self.waypoint_variations.append({"track": new_waypoints, "time": -1})
-
-        self.segment_bounds = generate_segment_bounds(len(new_waypoints), SEGMENTS)
+        self.checkpoint_path = checkpoint_path or os.path.join("checkpoints", "{}.npz".format(track_name))
+        self.last_checkpoint = time.time()
+
+        checkpoint = load_checkpoint(self.checkpoint_path) if resume else None
+        if checkpoint is not None:
+            # everything needed to continue is in the checkpoint, so the track and waypoints aren't loaded again
+            print("Resuming {} from interval {}".format(checkpoint["name"], checkpoint["interval"]))
+            self.name, self.uuid, self.intervals = checkpoint["name"], checkpoint["uuid"], checkpoint["intervals"]
+            self.lines = checkpoint["lines"]
+            self.optimums = checkpoint["optimums"]
+            self.times = checkpoint["times"]
+            self.random = checkpoint["random"]
+            self.step_size = checkpoint["step_size"]
+            self.interval = checkpoint["interval"]
+            self.segment = checkpoint["segment"]
+            self.best_time = checkpoint["best_time"]
+            self.elapsed = checkpoint.get("elapsed", 0)
+        else:
+            self.name, self.uuid, self.initial_car, left_boundary, right_boundary, orange_boundary, self.intervals = get_track_from_files(track_name, track_path)
+            self.boundary = left_boundary + right_boundary + orange_boundary
+
+            initial_waypoints = generate_waypoints(self.initial_car, left_boundary, right_boundary, orange_boundary)
+
+            # the population is stored as one row of optimums per racing line, all sharing the same waypoint lines
+            self.lines = WaypointArray.from_waypoints(initial_waypoints).lines
+            self.optimums = np.tile(
+                np.array([w.optimum for w in initial_waypoints], dtype=np.float64),
+                (WAYPOINT_VARIATION_COUNT, 1)
+            )
+            self.times = np.full(WAYPOINT_VARIATION_COUNT, -1.0)
+            self.random = np.random.default_rng(0)
+            self.step_size = STEP_SIZE
+            self.interval = 0
+            self.segment = 0
+            self.best_time = math.inf
+            self.elapsed = 0
+
+        if intervals is not None:
+            self.intervals = intervals
+
+        self.waypoint_count = len(self.lines)
+        self.ggv = None if vehicle is None else GGVLapTime(load_vehicle(vehicle))
+        self.evaluator = ParallelLapTimeEvaluator(
+            self.lines, self.max_lateral_frictional_force, self.max_speed, workers=workers, ggv=self.ggv
+        )
+
+        self.segment_bounds = generate_segment_bounds(self.waypoint_count, SEGMENTS)
+        # time of the slowest survivor of the last selection, offspring slower than this can't be selected
+        self.cutoff = math.inf
 
     def run(self):
+        best_time, best_waypoints = self.optimise()
+        send_track_to_server(self.name, best_waypoints, best_time, self.uuid)
+
+    def optimise(self, time_budget=None):
+        """
+        Evolve the population until every interval has run or the time budget is used up. The state is checkpointed
+        as it goes, so an interrupted run can be resumed.
+
+        :param time_budget: Maximum number of seconds to run for including time before a resume, checked after every
+        interval. Defaults to no limit
+        :return: The best lap time and the waypoints of the best racing line
+        """
         if RENDER:
             pygame.init()
             screen_size = [800, 400]
             screen = pygame.display.set_mode(screen_size)
-            render_scene(screen, screen_size, [w["track"] for w in self.waypoint_variations], line_width=1)
+            render_scene(screen, screen_size, [self.get_waypoints(j) for j in range(len(self.optimums))], line_width=1)
+
+        # the evaluator's worker processes are closed however the run ends
+        with self.evaluator:
+            now = time.time()
+            # time spent before the run was resumed counts towards the budget
+            start = now - self.elapsed
+            while self.interval < self.intervals and (time_budget is None or self.elapsed < time_budget):
+                i = self.interval
+                for segment in range(self.segment, SEGMENTS):
+                    self.evaluate_waypoints()
+                    self.best_time = self.get_best_waypoints()
+                    self.populate_waypoints(self.segment_bounds[segment])
+
+                    self.segment = segment + 1
+                    self.elapsed = time.time() - start
+                    if time.time() - self.last_checkpoint >= CHECKPOINT_SECONDS:
+                        self.save_checkpoint()
+                self.segment = 0
+                self.interval += 1
+
+                if i % 100 == 0:
+                    if i % 100 == 0 and RENDER:
+                        render_scene(
+                            screen, screen_size, [self.get_waypoints(j) for j in range(len(self.optimums))],
+                            line_width=1
+                        )
+                    print("{}/{}: {}".format(i, self.intervals, self.best_time))
+
+            print("Finished in {} seconds.".format(time.time() - now))
+            self.save_checkpoint()
+            self.evaluate_waypoints()
+            best_time = self.get_best_waypoints()
+
+        return best_time, self.get_waypoints(0)
+
+    def save_checkpoint(self):
+        save_checkpoint(
+            self.checkpoint_path,
+            self.random,
+            name=self.name,
+            uuid=self.uuid,
+            intervals=self.intervals,
+            lines=self.lines,
+            optimums=self.optimums,
+            times=self.times,
+            step_size=self.step_size,
+            interval=self.interval,
+            segment=self.segment,
+            best_time=self.best_time,
+            elapsed=self.elapsed
+        )
+        self.last_checkpoint = time.time()
+
+    def evaluate_waypoints(self):
+        if not BOUNDED_EVALUATION or self.ggv is not None or math.isinf(self.cutoff):
+            self.times = self.evaluator.evaluate(self.optimums)
+            return
 
-        now = time.time()
-        for i in range(self.intervals):
-            for segment in range(SEGMENTS):
-                self.evaluate_waypoints()
-                best_time, waypoint_variations = self.get_best_waypoints()
-                self.populate_waypoints(self.segment_bounds[segment])
+        self.times, pruned = self.evaluator.evaluate_bounded(self.optimums, self.cutoff)
+        # pruned offspring are slower than the cutoff, so they only matter if too few offspring beat it
+        if np.count_nonzero(self.times <= self.cutoff) < WAYPOINT_SELECTION and np.any(pruned):
+            self.times[pruned] = self.evaluator.evaluate(self.optimums[pruned])
 
-            if i % 100 == 0:
-                if i % 100 == 0 and RENDER:
-                    render_scene(screen, screen_size, [w["track"] for w in waypoint_variations], line_width=1)
-                print("{}/{}: {}".format(i, self.intervals, best_time))
+    def get_best_waypoints(self):
+        # stable sort keeps equal times in their current order, as the sorted list did
+        order = np.argsort(self.times, kind="stable")[:WAYPOINT_SELECTION]
+        self.optimums = self.optimums[order]
+        self.times = self.times[order]
+        self.cutoff = self.times[-1]
 
-        print("Finished in {} seconds.".format(time.time() - now))
-        best_time, best_waypoints = self.get_best_waypoints()
+        return self.times[0]
 
-        send_track_to_server(self.name, best_waypoints[0], best_time, self.uuid)
+    def populate_waypoints(self, segment_bounds):
+        start_bound, end_bound = segment_bounds
 
-    def evaluate_waypoints(self):
-        for track in self.waypoint_variations:
-            track["time"] = get_track_time(track["track"], self.max_lateral_frictional_force, self.max_speed)
+        # each survivor has WAYPOINT_OFFSPRING offspring varied only within the segment bounds (inclusive)
+        new_optimums = np.repeat(self.optimums, WAYPOINT_OFFSPRING, axis=0)
+        segment = new_optimums[:, start_bound:end_bound + 1]
+        variation = (self.random.random(segment.shape) * 2 - 1) * self.step_size
+        new_optimums[:, start_bound:end_bound + 1] = np.clip(segment + variation, 0, 1)
 
-    def get_best_waypoints(self):
-        self.waypoint_variations = sorted(self.waypoint_variations, key=lambda k: k['time'])
-        self.waypoint_variations = self.waypoint_variations[:WAYPOINT_SELECTION]
+        self.optimums = new_optimums
+        self.times = np.full(len(new_optimums), -1.0)
 
-        return self.waypoint_variations[0]["time"], self.waypoint_variations
+    def get_waypoints(self, index):
+        """
+        Get a racing line of the population as a list of waypoints, with the velocity at each waypoint set.
 
-    def populate_waypoints(self, segment_bounds):
-        new_waypoints = []#copy.deepcopy(self.waypoint_variations)
+        :param index: Row of the population to get
+        :return: List of waypoints
+        """
+        if self.ggv is not None:
+            velocities, _ = self.ggv.solve_population(self.lines, self.optimums[index])
+            return WaypointArray(self.lines, self.optimums[index], velocity=velocities).to_waypoints()
 
-        # Average
-        # total_average = len(self.waypoint_variations)
-        # average = copy.deepcopy(self.waypoint_variations[0])
-        # for i in range(len(average)):
-        #     average["track"][i].optimum = 0
-        #     for w in self.waypoint_variations:
-        #         average["track"][i].optimum += w["track"][i].optimum / total_average
-        # new_waypoints.append(average)
+        waypoints = WaypointArray(self.lines, self.optimums[index]).to_waypoints()
+        get_track_time(waypoints, self.max_lateral_frictional_force, self.max_speed)
+        return waypoints
 
-        start_bound, end_bound = segment_bounds
-        # Variate
-        for w in self.waypoint_variations:
-            for _ in range(WAYPOINT_OFFSPRING):
-                new_waypoints.append({
-                    "track": geometry.variate_waypoints(w["track"], STEP_SIZE, start_bound, end_bound),
-                    "time": -1
-                })
 
-        self.waypoint_variations = new_waypoints
+def load_vehicle(path):
+    """
+    :param path: Path of a vehicle spec JSON file or a vehicle model saved as .npz
+    :return: The vehicle model
+    """
+    return VehicleModel.load(path) if path.endswith(".npz") else VehicleModel.from_json(path)
 
 
 def generate_waypoints(initial_car, left_boundary, right_boundary, orange_boundary):
-    waypoints = gen_waypoints(
+    waypoints = gen_waypoints_cached(
         car_pos=initial_car.pos,
         car_angle=initial_car.heading,
         blue_boundary=left_boundary,
@@ -151,4 +260,11 @@ def generate_segment_bounds(waypoint_count, bounds_count):
 
 
 if __name__ == "__main__":
-    OptimalPathStandardEvolver().run()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--track", default="azure_circuit", help="Name of the track to optimise")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file, defaults to checkpoints/<track>.npz")
+    parser.add_argument("--resume", action="store_true", help="Continue from the checkpoint if there is one")
+    parser.add_argument("--vehicle", default=VEHICLE, help="Vehicle spec or model to find lap times from its GGV map")
+    args = parser.parse_args()
+
+    OptimalPathStandardEvolver(args.track, args.checkpoint, args.resume, vehicle=args.vehicle).run()
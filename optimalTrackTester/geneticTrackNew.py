@@ -1,15 +1,25 @@
 import time
 import math
 
+import numpy as np
 import pygame
 
+from fsai.path_planning.lap_time import IncrementalLapTime, evaluate_population_bounded, get_minimum_segment_times
+from fsai.path_planning.multi_resolution import get_resolution_levels, interpolate_optimums
 from fsai.path_planning.waypoint import Waypoint
-from fsai.path_planning.waypoints import gen_waypoints, encode, decimate_waypoints
-from optimalTrackTester.geneticTestUtils import get_track_time, send_track_to_server, render_scene, get_track_from_server
+from fsai.path_planning.waypoint_array import WaypointArray
+from fsai.path_planning.waypoints import encode, decimate_waypoints
+from fsai.path_planning.waypoint_cache import gen_waypoints_cached
+from optimalTrackTester.geneticTestUtils import send_track_to_server, render_scene, get_track_from_server
 
 RUNS_PER_SEGMENTS = 20
 MAX_STEP_SIZE = 0.05
 DELTA_STEP_SIZE = 0.6
+LEVEL_FRACTIONS = [0.125, 0.25, 0.5]  # waypoints kept by each coarse level, the final level uses every waypoint
+# screen both trial optimums with the bounded population evaluator before the incremental lap time. Off by default as
+# the incremental lap time only recalculates the track around the moved waypoint, which is cheaper than any bound
+# over the whole track, so it only pays off if the lap time model is swapped for a slower one
+BOUNDED_EVALUATION = False
 
 
 class OptimalPathCreator:
@@ -17,12 +27,46 @@ class OptimalPathCreator:
         self.name, self.uuid, self.initial_car, left_boundary, right_boundary, orange_boundary, self.intervals = get_track_from_server()
         self.boundary = left_boundary + right_boundary + orange_boundary
 
-        self.waypoints = generate_waypoints(self.initial_car, left_boundary, right_boundary, orange_boundary)
-        self.waypoint_count = len(self.waypoints)
+        self.all_waypoints = generate_waypoints(self.initial_car, left_boundary, right_boundary, orange_boundary)
+
+        car_mass = 0.74  # tonne
+        gravity = 9.81
+        frictional_force = 1.7
+
+        self.max_lateral_frictional_force = frictional_force * gravity * car_mass
+        self.max_speed = 104  # meters per second
+
+        # optimise from coarse to fine, moving to the next level once an epoch gives no improvement
+        self.levels = get_resolution_levels(self.all_waypoints, fractions=LEVEL_FRACTIONS)
+        self.set_level(0)
 
+    def set_level(self, level):
+        if level > 0:
+            # warm start the new level from the optimums of the last
+            optimums = interpolate_optimums(
+                WaypointArray.from_waypoints(self.all_waypoints).lines,
+                self.levels[self.level],
+                [w.optimum for w in self.waypoints]
+            )
+            for waypoint, optimum in zip(self.all_waypoints, optimums):
+                waypoint.optimum = min(1, max(0, float(optimum)))
+
+        self.level = level
+        self.waypoints = [self.all_waypoints[i] for i in self.levels[level]]
+        self.waypoint_count = len(self.waypoints)
         self.current_index = 0
 
-        self.best_result = math.inf
+        self.lines = WaypointArray.from_waypoints(self.waypoints).lines
+        self.minimum_segment_times = get_minimum_segment_times(self.lines, self.max_speed)
+
+        # only the waypoint being tested moves, so the lap time is updated around it rather than recalculated
+        self.lap_time = IncrementalLapTime(
+            self.lines,
+            [w.optimum for w in self.waypoints],
+            self.max_lateral_frictional_force,
+            self.max_speed
+        )
+        self.best_result = self.lap_time.time
 
     def run(self):
         pygame.init()
@@ -33,18 +77,22 @@ class OptimalPathCreator:
 
         running = True
         epoch = 0
+        epoch_improved = False
 
         while running:
             new_best = False
             for i in range(RUNS_PER_SEGMENTS):
                 step_size = MAX_STEP_SIZE * (DELTA_STEP_SIZE ** i)
                 new_best = new_best or self.genetic_test(step_size)
+            epoch_improved = epoch_improved or new_best
 
             self.current_index += 1
             if self.current_index >= self.waypoint_count:
                 self.current_index = 0
 
-                print("{}".format(self.best_result))
+                print("{} ({} waypoints)".format(self.best_result, self.waypoint_count))
+                for waypoint, velocity in zip(self.waypoints, self.lap_time.velocities):
+                    waypoint.v = velocity
                 render_scene(screen, screen_size, self.waypoints)
 
                 now = time.time()
@@ -53,32 +101,44 @@ class OptimalPathCreator:
                 epoch += 1
                 if epoch >= self.intervals:
                     running = False
+                elif not epoch_improved and self.level < len(self.levels) - 1:
+                    self.set_level(self.level + 1)
+                epoch_improved = False
+
+        # spread the optimums to every waypoint if the run finished before reaching full resolution
+        if self.level < len(self.levels) - 1:
+            self.set_level(len(self.levels) - 1)
 
-        send_track_to_server(self.name, self.waypoints, self.best_result, self.uuid)
+        send_track_to_server(self.name, self.all_waypoints, self.best_result, self.uuid)
 
     def genetic_test(self, step_size):
         index = self.current_index
         initial_value = self.waypoints[index].optimum
-        best = False
-        self.waypoints[index].optimum = max(0, min(1, initial_value + step_size))
-        test_time = get_track_time(self.waypoints)
-        if test_time < self.best_result:
-            self.best_result = test_time
-            best = True
-        else:
-            self.waypoints[index].optimum = max(0, min(1, initial_value - step_size))
-            test_time = get_track_time(self.waypoints)
+        values = [max(0, min(1, initial_value + step_size)), max(0, min(1, initial_value - step_size))]
+
+        if BOUNDED_EVALUATION:
+            # the lap time is only updated with values which could beat the best, pruned values can't
+            optimums = np.tile(self.lap_time.optimums, (len(values), 1))
+            optimums[:, index] = values
+            _, pruned = evaluate_population_bounded(
+                self.lines, optimums, self.best_result, self.max_lateral_frictional_force, self.max_speed,
+                minimum_segment_times=self.minimum_segment_times
+            )
+            values = [value for value, skip in zip(values, pruned) if not skip]
+
+        for value in values:
+            test_time = self.lap_time.evaluate(index, [value])
             if test_time < self.best_result:
+                self.lap_time.accept()
+                self.waypoints[index].optimum = value
                 self.best_result = test_time
-                best = True
-            else:
-                self.waypoints[index].optimum = initial_value
+                return True
 
-        return best
+        return False
 
 
 def generate_waypoints(initial_car, left_boundary, right_boundary, orange_boundary):
-    waypoints = gen_waypoints(
+    waypoints = gen_waypoints_cached(
         car_pos=initial_car.pos,
         car_angle=initial_car.heading,
         blue_boundary=left_boundary,
@@ -0,0 +1,193 @@
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+PENDING = "pending"
+PROCESSING = "processing"
+PROCESSED = "processed"
+
+DEFAULT_LEASE = 4 * 60 * 60  # seconds a client has to finish a track before it is given to another client
+
+
+class JobStore:
+    def __init__(self, path: str, lease: float = DEFAULT_LEASE):
+        """
+        SQLite backed state of every track optimisation job, used by the segment server so that finding a track for a
+        client doesn't have to list and read the processing and annotated folders. Each track is a row which is
+        pending, processing or processed. Claiming a track gives it a lease: if the client doesn't save the track
+        before the lease expires, for example because it crashed, the track can be claimed by another client. Claims
+        are made in a single write transaction so two clients can never be given the same track, and every lookup
+        goes through an index rather than scanning the jobs.
+
+        :param path: Path of the SQLite database, created if it doesn't exist
+        :param lease: Number of seconds a client has to save a claimed track
+        """
+        self.path: str = path
+        self.lease: float = lease
+        # sqlite connections can't be shared between threads, so each server thread has its own
+        self.__local = threading.local()
+
+        with self.__connection() as connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    name TEXT PRIMARY KEY,
+                    state TEXT NOT NULL DEFAULT 'pending',
+                    uuid TEXT,
+                    start REAL,
+                    expires REAL,
+                    time REAL,
+                    distance REAL,
+                    iterations INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS jobs_claimable ON jobs (state, expires);
+                CREATE INDEX IF NOT EXISTS jobs_time ON jobs (state, time);
+            """)
+
+    def add_tracks(self, names: List[str]):
+        """
+        Add jobs for any tracks which aren't in the store yet. Existing jobs are left as they are.
+
+        :param names: Names of the tracks
+        """
+        with self.__connection() as connection:
+            connection.executemany("INSERT OR IGNORE INTO jobs (name) VALUES (?)", [(name,) for name in names])
+
+    def claim(self) -> Optional[Tuple[str, str]]:
+        """
+        Claim a track which is pending or whose lease has expired.
+
+        :return: The name of the track and the uuid of the claim, or None if there are no tracks left to process
+        """
+        now = time.time()
+        connection = self.__connection()
+        # an immediate transaction takes the write lock before reading, so no other claim can pick the same track
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT name FROM jobs WHERE state = ? OR (state = ? AND expires < ?) LIMIT 1",
+                (PENDING, PROCESSING, now)
+            ).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+
+            claim_id = str(uuid.uuid1())
+            connection.execute(
+                "UPDATE jobs SET state = ?, uuid = ?, start = ?, expires = ? WHERE name = ?",
+                (PROCESSING, claim_id, now, now + self.lease, row[0])
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        return row[0], claim_id
+
+    def renew(self, name: str, claim_id: str) -> bool:
+        """
+        Extend the lease of a claimed track, for clients that take longer than the lease to process a track.
+
+        :param name: Name of the track
+        :param claim_id: The uuid given when the track was claimed
+        :return: Whether the claim is still held and was renewed
+        """
+        with self.__connection() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET expires = ? WHERE name = ? AND uuid = ? AND state = ?",
+                (time.time() + self.lease, name, claim_id, PROCESSING)
+            )
+        return cursor.rowcount == 1
+
+    def complete(
+            self,
+            name: str,
+            claim_id: Optional[str],
+            lap_time: float,
+            distance: float = 0,
+            iterations: int = 0
+    ) -> bool:
+        """
+        Mark a claimed track as processed. A client whose lease expired can still save its result as long as no
+        other client has claimed the track since.
+
+        :param name: Name of the track
+        :param claim_id: The uuid given when the track was claimed, or None to complete the track without a claim
+        :param lap_time: Lap time of the optimised racing line
+        :param distance: Length of the optimised racing line
+        :param iterations: Number of optimiser iterations
+        :return: Whether the result was accepted
+        """
+        with self.__connection() as connection:
+            if claim_id is None:
+                cursor = connection.execute(
+                    "UPDATE jobs SET state = ?, uuid = NULL, expires = NULL, time = ?, distance = ?, iterations = ? "
+                    "WHERE name = ?",
+                    (PROCESSED, lap_time, distance, iterations, name)
+                )
+            else:
+                cursor = connection.execute(
+                    "UPDATE jobs SET state = ?, expires = NULL, time = ?, distance = ?, iterations = ? "
+                    "WHERE name = ? AND uuid = ? AND state = ?",
+                    (PROCESSED, lap_time, distance, iterations, name, claim_id, PROCESSING)
+                )
+        return cursor.rowcount == 1
+
+    def restore_claim(self, name: str, claim_id: str, start: float):
+        """
+        Record a claim that was made before the store existed, so that the client holding it can still save it.
+
+        :param name: Name of the track
+        :param claim_id: The uuid given to the client
+        :param start: Time the track was claimed
+        """
+        with self.__connection() as connection:
+            connection.execute(
+                "UPDATE jobs SET state = ?, uuid = ?, start = ?, expires = ? WHERE name = ? AND state = ?",
+                (PROCESSING, claim_id, start, start + self.lease, name, PENDING)
+            )
+
+    def get_job(self, name: str) -> Optional[Dict]:
+        """
+        :param name: Name of the track
+        :return: The state of a single job, in the same form as 'get_jobs', or None if there is no such track
+        """
+        row = self.__connection().execute(
+            "SELECT name, state, start, time, distance, iterations FROM jobs WHERE name = ?", (name,)
+        ).fetchone()
+        return None if row is None else self.__to_overview(row, time.time())
+
+    def get_jobs(self) -> Dict[str, Dict]:
+        """
+        Get the state of every job for the server overview.
+
+        :return: Dictionary of track name to the time, distance, processing, processed, process_time and iterations
+        of the track
+        """
+        now = time.time()
+        rows = self.__connection().execute(
+            "SELECT name, state, start, time, distance, iterations FROM jobs ORDER BY name"
+        ).fetchall()
+        return {row[0]: self.__to_overview(row, now) for row in rows}
+
+    @staticmethod
+    def __to_overview(row: tuple, now: float) -> Dict:
+        name, state, start, lap_time, distance, iterations = row
+        return {
+            "time": lap_time if state == PROCESSED else -1,
+            "distance": distance or 0,
+            "processing": state == PROCESSING,
+            "processed": state == PROCESSED,
+            "process_time": now - start if state == PROCESSING else -1,
+            "iterations": iterations or 0
+        }
+
+    def __connection(self) -> sqlite3.Connection:
+        connection = getattr(self.__local, "connection", None)
+        if connection is None:
+            # transactions are managed explicitly, and WAL lets the overview read while a claim is being written
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self.__local.connection = connection
+        return connection
@@ -1,9 +1,13 @@
 import numpy
-from setuptools import setup
+from setuptools import setup, Extension
 from Cython.Build import cythonize
 
 setup(
-    ext_modules=cythonize("fsai/geometry.pyx"),
+    ext_modules=cythonize([
+        Extension("fsai.geometry", ["fsai/geometry.pyx"]),
+        Extension("fsai.path_planning.waypoint_kernel", ["fsai/path_planning/waypoint_kernel.pyx"]),
+        Extension("fsai.path_planning.ggv_kernel", ["fsai/path_planning/ggv_kernel.pyx"])
+    ]),
     include_dirs=[numpy.get_include()]
 )
 